@@ -0,0 +1,119 @@
+import os, math, time, heapq, itertools, threading
+from contextlib import contextmanager
+
+# Rang de priorité : un slot libéré va d'abord aux requêtes interactives (/query)
+PRIORITIES = {"interactive": 0, "analysis": 1}
+_DEFAULT = object()
+
+
+class Saturated(Exception):
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    # Nombre max de requêtes DuckDB simultanées + file d'attente à priorité (FIFO par classe)
+    # Au-delà de max_queue ou après queue_timeout : Saturated -> 429 + Retry-After
+
+    def __init__(self, max_concurrent, max_queue=32, queue_timeout=5.0, memory_limit=None, threads=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._hold_time = None
+        self.admitted = {p: 0 for p in PRIORITIES}
+        self.rejected = {p: 0 for p in PRIORITIES}
+        self.timeouts = {p: 0 for p in PRIORITIES}
+
+    def _retry_after(self):
+        # Temps moyen d'occupation d'un slot x profondeur de file / slots
+        hold = self._hold_time or 1.0
+        return max(1, math.ceil(hold * (len(self._waiters) + 1) / self.max_concurrent))
+
+    # timeout : queue_timeout par défaut, None = attente sans limite (jobs)
+    def acquire(self, priority="interactive", timeout=_DEFAULT):
+        timeout = self.queue_timeout if timeout is _DEFAULT else timeout
+        with self._lock:
+            if self._running < self.max_concurrent and not self._waiters:
+                self._running += 1
+                self.admitted[priority] += 1
+                return
+            if timeout is not None and len(self._waiters) >= self.max_queue:
+                self.rejected[priority] += 1
+                raise Saturated(f"Backend saturated ({self._running} queries running, {len(self._waiters)} queued)", self._retry_after())
+            waiter = [threading.Event(), False]
+            heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), waiter))
+
+        if not waiter[0].wait(timeout):
+            with self._lock:
+                if not waiter[1]:
+                    self._waiters = [w for w in self._waiters if w[2] is not waiter]
+                    heapq.heapify(self._waiters)
+                    self.timeouts[priority] += 1
+                    raise Saturated(f"No query slot available after {timeout}s ({self._running} running)", self._retry_after())
+        with self._lock:
+            self.admitted[priority] += 1
+
+    def release(self, held_for=None):
+        with self._lock:
+            if held_for is not None:
+                self._hold_time = held_for if self._hold_time is None else 0.9 * self._hold_time + 0.1 * held_for
+            if self._waiters:
+                # Le slot passe directement au waiter prioritaire
+                _, _, waiter = heapq.heappop(self._waiters)
+                waiter[1] = True
+                waiter[0].set()
+            else:
+                self._running -= 1
+
+    @contextmanager
+    def slot(self, priority="interactive", timeout=_DEFAULT):
+        self.acquire(priority, timeout)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.release(time.time() - start)
+
+    def stats(self):
+        with self._lock:
+            queued = {p: sum(1 for rank, _, _ in self._waiters if rank == r) for p, r in PRIORITIES.items()}
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": self._running,
+                "queued": queued,
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "memory_limit": self.memory_limit,
+                "per_query_memory": self.memory_limit // self.max_concurrent if self.memory_limit else None,
+                "threads": self.threads,
+                "avg_slot_time": round(self._hold_time, 4) if self._hold_time is not None else None,
+                "admitted": dict(self.admitted),
+                "rejected": dict(self.rejected),
+                "timeouts": dict(self.timeouts),
+            }
+
+
+# Concurrence = min(threads, memory_limit / mémoire min par requête) : chaque requête admise garde au moins ce budget
+# (memory_limit / threads : options globales DuckDB fixées par capacity.configure_duckdb, partagées par les requêtes admises)
+def create_admission(budget):
+    memory_limit = budget["memory_limit"]
+    threads = budget["threads"]
+    min_query_memory = int(os.getenv("ADMISSION_MIN_QUERY_MEMORY", str(1024 ** 3)))
+    default_concurrent = max(1, min(threads, memory_limit // min_query_memory))
+    max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", str(default_concurrent)))
+    print(f"🚦 Admission: {max_concurrent} concurrent queries")
+
+    return AdmissionController(
+        max_concurrent=max_concurrent,
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5")),
+        memory_limit=memory_limit,
+        threads=threads,
+    )
@@ -1,6 +1,24 @@
-from fastapi import FastAPI
-from routers import query, query_analyzer, status, parquet
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from routers import query, query_analyzer, status, parquet, distributed, jobs, metrics, profiles, workload, autotune, rewrite, zone_maps, file_catalog
 from duckdb_conn import init_duckdb
+from cursor_pool import create_pool, PoolTimeout
+from capacity import duckdb_budget, configure_duckdb
+from admission import create_admission, Saturated
+from io_stats import create_io_accounting
+from pinned_instances import create_pinned_instances
+from thread_tuning import create_thread_tuning_store
+from cursor_store import create_cursor_store
+from result_cache import create_result_cache
+from metadata_cache import create_metadata_cache
+from file_stats import create_file_catalog, use_catalog
+from sketches import create_sketch_store
+from zone_maps import create_zone_map_index
+from query_profiles import create_profile_store
+from workload import create_workload_store
+from jobs import create_job_store
+from metrics import register_state_collector, observe_request
+import time
 
 app = FastAPI()
 
@@ -8,8 +26,95 @@ app = FastAPI()
 con = init_duckdb()
 app.state.con = con
 
+# threads / memory_limit / temp_directory depuis la capacité effective du conteneur (quota cgroup)
+app.state.duckdb_budget = duckdb_budget()
+configure_duckdb(con, app.state.duckdb_budget)
+
+# Admission : requêtes simultanées bornées selon ce budget
+app.state.admission = create_admission(app.state.duckdb_budget)
+
+# Comptage des requêtes HTTP object storage (log DuckDB), par requête et cumulé pour le noeud
+app.state.io = create_io_accounting(con)
+
+# Pool de curseurs partagé par les handlers (une base, un curseur par requête)
+app.state.pool = create_pool(con, app.state.duckdb_budget)
+
+# Requêtes à nombre de threads imposé (num_threads, autotune) : une base DuckDB dédiée par valeur
+app.state.pinned = create_pinned_instances(app.state.admission, app.state.duckdb_budget)
+
+# Nombre de threads retenu par empreinte (/query/autotune)
+app.state.thread_tuning = create_thread_tuning_store()
+
+# Curseurs serveur (pagination /query)
+app.state.cursors = create_cursor_store(app.state.pool, app.state.admission)
+
+# Cache de résultats /query (opt-in via use_cache)
+app.state.result_cache = create_result_cache()
+
+# Listings S3 cachés par préfixe, utilisés par tous les stat_files (endpoints, caches, /query)
+app.state.file_catalog = create_file_catalog()
+use_catalog(app.state.file_catalog)
+
+# Cache des footers parquet partagé par les endpoints d'analyse
+app.state.metadata_cache = create_metadata_cache()
+
+# Sketches HLL / top-k par fichier, persistés sur disque (suggest_partitions, filterability)
+app.state.sketches = create_sketch_store()
+
+# Zone maps min/max par row group des globs indexés, persistées sur disque (réécriture des globs dans /query)
+app.state.zone_maps = create_zone_map_index()
+
+# Profils de requêtes (profiling=true) par empreinte, persistés sur disque
+app.state.profiles = create_profile_store()
+
+# Agrégats par empreinte sur fenêtre glissante + journal des requêtes lentes (/workload)
+app.state.workload = create_workload_store()
+
+# Jobs asynchrones (/jobs) : workers bornés + file d'attente
+app.state.jobs = create_job_store(app.state.pool, app.state.admission, app.state.io)
+
+# Requêtes HTTP en cours, exposées dans /status pour le routeur
+app.state.in_flight = 0
+
+# Métriques Prometheus (/metrics) : état des pools / caches lu au scrape
+register_state_collector(app)
+
+# Latence jusqu'aux en-têtes de réponse (le flux Arrow / NDJSON est mesuré par /query)
+@app.middleware("http")
+async def count_in_flight(request: Request, call_next):
+    app.state.in_flight += 1
+    start = time.perf_counter()
+    status = 500
+    size = None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        size = response.headers.get("content-length")
+        return response
+    finally:
+        app.state.in_flight -= 1
+        observe_request(request, status, time.perf_counter() - start, int(size) if size else None)
+
+@app.exception_handler(PoolTimeout)
+def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# Noeud saturé : 429 pour que le routeur rejoue la requête ailleurs
+@app.exception_handler(Saturated)
+def saturated_handler(request: Request, exc: Saturated):
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
 # Inclure les routers
 app.include_router(query.router)
 app.include_router(query_analyzer.router)
 app.include_router(status.router)
 app.include_router(parquet.router)
+app.include_router(distributed.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
+app.include_router(workload.router)
+app.include_router(autotune.router)
+app.include_router(rewrite.router)
+app.include_router(zone_maps.router)
+app.include_router(file_catalog.router)
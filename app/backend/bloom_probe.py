@@ -0,0 +1,182 @@
+import time, random, statistics, datetime
+from metadata_cache import sql_list
+from profiler import quote_ident
+
+INTEGER_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT")
+FLOAT_TYPES = ("FLOAT", "DOUBLE")
+ABSENT_SUFFIX = "#bloom-probe"
+
+
+def _source(paths):
+    return f"read_parquet({sql_list(paths)}, union_by_name = true)"
+
+
+# Valeurs présentes : échantillon réservoir de la colonne (valeurs distinctes non nulles)
+def sample_present_values(con, paths, column, n, seed):
+    col = quote_ident(column)
+    rows = con.execute(
+        f"SELECT DISTINCT {col} FROM (SELECT {col} FROM {_source(paths)} WHERE {col} IS NOT NULL USING SAMPLE reservoir({n * 20} ROWS) REPEATABLE ({seed}))"
+    ).fetchall()
+    values = [row[0] for row in rows]
+    random.Random(seed).shuffle(values)
+    return values[:n]
+
+
+# Valeurs absentes tirées dans l'intervalle [min, max] de la colonne : le min/max ne les élimine pas,
+# seul le bloom filter peut le faire (sinon le test mesurerait le min/max)
+def sample_absent_values(con, paths, column, column_type, present, n, seed):
+    rng = random.Random(seed)
+    col = quote_ident(column)
+    if column_type == "VARCHAR":
+        candidates = [f"{v}{ABSENT_SUFFIX}" for v in present]
+    elif column_type in INTEGER_TYPES + FLOAT_TYPES:
+        low, high = con.execute(f"SELECT MIN({col}), MAX({col}) FROM {_source(paths)}").fetchone()
+        if low is None:
+            return []
+        draw = rng.randint if column_type in INTEGER_TYPES else rng.uniform
+        candidates = [draw(low, high) for _ in range(n * 4)]
+    elif column_type == "DATE":
+        low, high = con.execute(f"SELECT MIN({col}), MAX({col}) FROM {_source(paths)}").fetchone()
+        if low is None:
+            return []
+        candidates = [low + datetime.timedelta(days=rng.randint(0, (high - low).days)) for _ in range(n * 4)]
+    else:
+        return []
+    found = {row[0] for row in con.execute(f"SELECT DISTINCT {col} FROM {_source(paths)} WHERE {col} IN ?", [candidates]).fetchall()}
+    return [v for v in dict.fromkeys(candidates) if v not in found][:n]
+
+
+# Row groups d'une valeur : gardés par le min/max, puis gardés par le bloom filter
+def row_groups_for(con, paths, column, column_type, value, row_group_bytes, filter_bytes):
+    minmax = con.execute(f"""
+        SELECT file_name, row_group_id, bloom_filter_offset IS NOT NULL AND bloom_filter_length > 0
+        FROM parquet_meta
+        WHERE path_in_schema = ?
+          AND COALESCE(TRY_CAST(stats_min_value AS {column_type}) <= ?, true)
+          AND COALESCE(TRY_CAST(stats_max_value AS {column_type}) >= ?, true)
+    """, [column, value, value]).fetchall()
+    excluded = {
+        (row[0], row[1]) for row in con.execute(
+            f"SELECT file_name, row_group_id FROM parquet_bloom_probe({sql_list(paths)}, ?, ?) WHERE bloom_filter_excludes",
+            [column, value],
+        ).fetchall()
+    }
+    kept = [(f, rg) for f, rg, _ in minmax if (f, rg) not in excluded]
+    return {
+        "minmax_row_groups": len(minmax),
+        "with_bloom": sum(1 for _, _, has_bloom in minmax if has_bloom),
+        "bloom_row_groups": len(kept),
+        "minmax_bytes": sum(row_group_bytes[(f, rg)] for f, rg, _ in minmax),
+        "bloom_bytes": sum(row_group_bytes[k] for k in kept),
+        # Le lookup lit aussi le filtre de chaque row group gardé par le min/max
+        "filter_bytes": sum(filter_bytes[(f, rg)] for f, rg, _ in minmax),
+    }
+
+
+# Lookup chronométré : "col = v" utilise min/max + bloom, "col >= v AND col <= v" seulement le min/max
+def time_lookups(con, paths, column, value, repetitions):
+    col = quote_ident(column)
+    timings = {}
+    for name, predicate, params in (("bloom", f"{col} = ?", [value]), ("minmax", f"{col} >= ? AND {col} <= ?", [value, value])):
+        runs = []
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            con.execute(f"SELECT COUNT(*) FROM {_source(paths)} WHERE {predicate}", params).fetchone()
+            runs.append(time.perf_counter() - start)
+        timings[name] = statistics.median(runs)
+    return timings
+
+
+def probe_column(con, paths, column, column_type, values_per_column, repetitions, seed, row_group_bytes, filter_bytes):
+    present = sample_present_values(con, paths, column, values_per_column, seed)
+    absent = sample_absent_values(con, paths, column, column_type, present, values_per_column, seed)
+
+    totals = {"present": {}, "absent": {}}
+    latency = {"bloom": [], "minmax": []}
+    for kind, values in (("present", present), ("absent", absent)):
+        for value in values:
+            groups = row_groups_for(con, paths, column, column_type, value, row_group_bytes, filter_bytes)
+            timings = time_lookups(con, paths, column, value, repetitions)
+            for key, n in groups.items():
+                totals[kind][key] = totals[kind].get(key, 0) + n
+            for key, t in timings.items():
+                latency[key].append(t)
+
+    both = {key: totals["present"].get(key, 0) + totals["absent"].get(key, 0) for key in ("minmax_row_groups", "bloom_row_groups", "minmax_bytes", "bloom_bytes", "filter_bytes")}
+    absent_totals = totals["absent"]
+    # Faux positif : row group avec bloom filter, gardé par le min/max, sans la valeur, que le filtre n'écarte pas
+    # (les row groups sans filtre sont tous gardés, ils ne comptent pas)
+    fp_candidates = absent_totals.get("with_bloom", 0)
+    false_positives = fp_candidates - (absent_totals.get("minmax_row_groups", 0) - absent_totals.get("bloom_row_groups", 0))
+    lookups = len(present) + len(absent)
+    bytes_saved = both["minmax_bytes"] - both["bloom_bytes"]
+    latency_bloom = statistics.median(latency["bloom"]) if lookups else None
+    latency_minmax = statistics.median(latency["minmax"]) if lookups else None
+    return {
+        "column": column,
+        "type": column_type,
+        "present_lookups": len(present),
+        "absent_lookups": len(absent),
+        "row_groups_minmax": both["minmax_row_groups"],
+        "row_groups_read": both["bloom_row_groups"],
+        "row_groups_skipped_by_bloom": both["minmax_row_groups"] - both["bloom_row_groups"],
+        "false_positive_rate": round(false_positives / fp_candidates, 4) if fp_candidates else None,
+        "bytes_minmax": both["minmax_bytes"],
+        "bytes_read": both["bloom_bytes"],
+        "bytes_saved": bytes_saved,
+        "bloom_filter_bytes_read": both["filter_bytes"],
+        "median_latency_bloom": round(latency_bloom, 6) if latency_bloom is not None else None,
+        "median_latency_minmax": round(latency_minmax, 6) if latency_minmax is not None else None,
+        "latency_saved_percent": round((1 - latency_bloom / latency_minmax) * 100, 1) if latency_minmax else None,
+    }
+
+
+def verdict(result, has_filters):
+    if not has_filters:
+        return "❌ No bloom filter"
+    if not result["row_groups_minmax"]:
+        return "⚠️ No lookup reached the filters"
+    skipped = result["row_groups_skipped_by_bloom"] / result["row_groups_minmax"]
+    if skipped >= 0.5 and result["bytes_saved"] > result["bloom_filter_bytes_read"]:
+        return "✅ Worth it"
+    if skipped > 0:
+        return "🟡 Marginal"
+    return "⚠️ No row group skipped"
+
+
+# Sonde empirique : lookups ponctuels sur des valeurs présentes et absentes, colonnes avec bloom filter par défaut
+# les métadonnées (stats min/max, tailles, filtres) viennent de la vue parquet_meta (footers cachés)
+def probe_bloom_filters(con, paths, columns=None, values_per_column=5, repetitions=3, seed=None):
+    seed = seed if seed is not None else random.randrange(1 << 31)
+    types = dict(con.execute(f"SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM {_source(paths)})").fetchall())
+    meta = con.execute("""
+        SELECT path_in_schema, file_name, row_group_id, total_compressed_size,
+               CASE WHEN bloom_filter_offset IS NOT NULL AND bloom_filter_length > 0 THEN bloom_filter_length ELSE 0 END
+        FROM parquet_meta
+    """).fetchall()
+
+    with_filters = {row[0] for row in meta if row[4]}
+    if columns:
+        unknown = [c for c in columns if c not in types]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    else:
+        columns = [c for c in types if c in with_filters]
+
+    results = []
+    for column in columns:
+        chunks = [row for row in meta if row[0] == column]
+        if not chunks:
+            results.append({"column": column, "type": types[column], "error": "Not a top-level parquet column (hive partition or nested field)"})
+            continue
+        row_group_bytes = {(row[1], row[2]): row[3] for row in chunks}
+        filter_bytes = {(row[1], row[2]): row[4] for row in chunks}
+        result = probe_column(con, paths, column, types[column], values_per_column, repetitions, seed, row_group_bytes, filter_bytes)
+        column_bytes = sum(row_group_bytes.values())
+        result["bloom_coverage_percent"] = round(sum(1 for b in filter_bytes.values() if b) * 100 / len(filter_bytes), 1)
+        result["bloom_filter_size_bytes"] = sum(filter_bytes.values())
+        result["bloom_filter_overhead_percent"] = round(result["bloom_filter_size_bytes"] * 100 / column_bytes, 2) if column_bytes else None
+        result["verdict"] = verdict(result, column in with_filters)
+        results.append(result)
+        print(f"🌸 Bloom probe {column}: {result['row_groups_skipped_by_bloom']}/{result['row_groups_minmax']} row groups skipped")
+    return {"seed": seed, "columns": results}
@@ -0,0 +1,154 @@
+import os, math
+import psutil
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+PROC_CGROUP = "/proc/self/cgroup"
+# Valeurs cgroup v1 "sans limite" (proches de 2^63)
+UNLIMITED = 1 << 60
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+# /proc/self/cgroup : "0::/chemin" (v2) ou "N:cpu,cpuacct:/chemin" (v1), par contrôleur
+def _self_cgroups():
+    paths = {}
+    for line in (_read(PROC_CGROUP) or "").splitlines():
+        _, controllers, path = line.split(":", 2)
+        for controller in controllers.split(","):
+            paths[controller] = path
+    return paths
+
+
+# Répertoires du cgroup du process jusqu'à la racine montée : la limite effective est la plus basse de la hiérarchie
+# (sans cgroup namespace, le chemin peut ne pas exister sous le montage du conteneur : seuls les existants comptent)
+def _hierarchy(base, path):
+    parts = [p for p in (path or "/").strip("/").split("/") if p]
+    dirs = []
+    for i in range(len(parts), -1, -1):
+        d = os.path.join(base, *parts[:i])
+        if os.path.isdir(d) and d not in dirs:
+            dirs.append(d)
+    return dirs
+
+
+def _is_v2():
+    return os.path.exists(f"{CGROUP_ROOT}/cgroup.controllers")
+
+
+def _v1_base(controller):
+    for name in (controller, f"{controller},cpuacct", f"cpuacct,{controller}"):
+        if os.path.isdir(f"{CGROUP_ROOT}/{name}"):
+            return f"{CGROUP_ROOT}/{name}"
+    return None
+
+
+# cgroup v2 : cpu.max = "<quota> <period>" ou "max <period>"
+# cgroup v1 : cpu.cfs_quota_us (-1 = illimité) / cpu.cfs_period_us
+def cgroup_cpu_limit():
+    cgroups = _self_cgroups()
+    limits = []
+    if _is_v2():
+        for d in _hierarchy(CGROUP_ROOT, cgroups.get("")):
+            quota, _, period = (_read(f"{d}/cpu.max") or "max").partition(" ")
+            if quota != "max":
+                limits.append(int(quota) / int(period or 100000))
+        return (min(limits) if limits else None), "cgroup v2"
+
+    base = _v1_base("cpu")
+    if base is None:
+        return None, None
+    for d in _hierarchy(base, cgroups.get("cpu")):
+        quota = _read(f"{d}/cpu.cfs_quota_us")
+        period = _read(f"{d}/cpu.cfs_period_us")
+        if quota and period and int(quota) > 0:
+            limits.append(int(quota) / int(period))
+    return (min(limits) if limits else None), "cgroup v1"
+
+
+def cgroup_memory_limit():
+    cgroups = _self_cgroups()
+    limits = []
+    if _is_v2():
+        for d in _hierarchy(CGROUP_ROOT, cgroups.get("")):
+            mem_max = _read(f"{d}/memory.max")
+            if mem_max and mem_max != "max":
+                limits.append(int(mem_max))
+        return (min(limits) if limits else None), "cgroup v2"
+
+    base = _v1_base("memory")
+    if base is None:
+        return None, None
+    for d in _hierarchy(base, cgroups.get("memory")):
+        limit = _read(f"{d}/memory.limit_in_bytes")
+        if limit and int(limit) < UNLIMITED:
+            limits.append(int(limit))
+    return (min(limits) if limits else None), "cgroup v1"
+
+
+# Mémoire consommée par le cgroup du process (page cache compris), None hors cgroup
+def cgroup_memory_usage():
+    cgroups = _self_cgroups()
+    if _is_v2():
+        dirs = _hierarchy(CGROUP_ROOT, cgroups.get(""))
+        usage = _read(f"{dirs[0]}/memory.current") if dirs else None
+    else:
+        base = _v1_base("memory")
+        dirs = _hierarchy(base, cgroups.get("memory")) if base else []
+        usage = _read(f"{dirs[0]}/memory.usage_in_bytes") if dirs else None
+    return int(usage) if usage else None
+
+
+# Capacité effective du noeud : limite cgroup si présente, sinon CPU / RAM de l'hôte
+def node_capacity():
+    host_cpus = psutil.cpu_count(logical=True) or 1
+    if hasattr(os, "sched_getaffinity"):
+        host_cpus = len(os.sched_getaffinity(0))
+    host_memory = psutil.virtual_memory().total
+
+    cpu_limit, cpu_source = cgroup_cpu_limit()
+    memory_limit, memory_source = cgroup_memory_limit()
+    return {
+        "cpu_limit": min(cpu_limit, host_cpus) if cpu_limit else host_cpus,
+        "memory_limit": min(memory_limit, host_memory) if memory_limit else host_memory,
+        "memory_used": cgroup_memory_usage() if memory_limit else host_memory - psutil.virtual_memory().available,
+        "cpu_source": cpu_source if cpu_limit else "host",
+        "memory_source": memory_source if memory_limit else "host",
+    }
+
+
+# Réglages DuckDB déduits de la capacité : memory_limit = fraction de la mémoire (le reste : Python, Arrow, page cache),
+# threads = quota CPU arrondi au-dessus, temp_directory pour le spill des opérateurs au-delà de memory_limit
+def duckdb_budget(capacity=None):
+    capacity = capacity or node_capacity()
+    fraction = float(os.getenv("DUCKDB_MEMORY_FRACTION", "0.8"))
+    return {
+        "threads": max(1, math.ceil(capacity["cpu_limit"])),
+        "memory_limit": int(capacity["memory_limit"] * fraction),
+        "temp_directory": os.getenv("DUCKDB_TEMP_DIRECTORY", "/tmp/duckdb_spill"),
+        "max_temp_directory_size": os.getenv("DUCKDB_MAX_TEMP_DIRECTORY_SIZE"),
+    }
+
+
+# Options globales : appliquées à la base, héritées par tous les curseurs
+def configure_duckdb(con, budget):
+    os.makedirs(budget["temp_directory"], exist_ok=True)
+    con.execute(f"SET GLOBAL threads = {budget['threads']}")
+    con.execute(f"SET GLOBAL memory_limit = '{budget['memory_limit'] // (1024 * 1024)}MiB'")
+    con.execute("SET GLOBAL temp_directory = ?", [budget["temp_directory"]])
+    if budget["max_temp_directory_size"]:
+        con.execute("SET GLOBAL max_temp_directory_size = ?", [budget["max_temp_directory_size"]])
+    print(f"⚙️ DuckDB: {budget['threads']} threads, memory_limit {budget['memory_limit'] // (1024 * 1024)} MiB, spill to {budget['temp_directory']}")
+
+
+# Valeurs effectives lues dans DuckDB (après init.sql et configure_duckdb)
+def duckdb_settings(con):
+    names = ("threads", "memory_limit", "temp_directory", "max_temp_directory_size")
+    with con.cursor() as cur:
+        rows = cur.execute("SELECT name, value FROM duckdb_settings() WHERE name IN ?", [list(names)]).fetchall()
+    return dict(rows)
@@ -0,0 +1,115 @@
+import os, threading
+from collections import deque
+from contextlib import contextmanager
+from fastapi import Request
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _sql_literal(val):
+    if isinstance(val, bool):
+        return "true" if val else "false"
+    if isinstance(val, (int, float)):
+        return str(val)
+    return "'" + str(val).replace("'", "''") + "'"
+
+
+class CursorPool:
+    # Pool de curseurs (con.cursor()) partageant la même base DuckDB.
+    # Checkout FIFO : un curseur libéré est remis directement au plus ancien waiter.
+
+    def __init__(self, con, size=8, timeout=30.0):
+        self.con = con
+        self.size = size
+        self.timeout = timeout
+        self._idle = deque(con.cursor() for _ in range(size))
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._total_checkouts = 0
+        self._total_timeouts = 0
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self._idle and not self._waiters:
+                self._in_use += 1
+                self._total_checkouts += 1
+                return self._idle.popleft()
+            waiter = [threading.Event(), None]
+            self._waiters.append(waiter)
+
+        if not waiter[0].wait(timeout):
+            with self._lock:
+                if waiter[1] is None:
+                    self._waiters.remove(waiter)
+                    self._total_timeouts += 1
+                    raise PoolTimeout(f"No DuckDB cursor available after {timeout}s ({self.size} in use)")
+        return waiter[1]
+
+    def release(self, cur):
+        with self._lock:
+            if self._waiters:
+                self._total_checkouts += 1
+                waiter = self._waiters.popleft()
+                waiter[1] = cur
+                waiter[0].set()
+            else:
+                self._in_use -= 1
+                self._idle.append(cur)
+
+    # Curseur gardé hors du pool avec un résultat en cours (curseur serveur) : fermé, un neuf prend sa place
+    def discard(self, cur):
+        try:
+            cur.close()
+        except Exception as e:
+            print(f"⚠️ Failed to close pooled cursor: {e}")
+        self.release(self.con.cursor())
+
+    @contextmanager
+    def cursor(self, settings=None, timeout=None):
+        cur = self.acquire(timeout)
+        applied = []
+        try:
+            for name, val in (settings or {}).items():
+                cur.execute(f"SET {name} = {_sql_literal(val)}")
+                applied.append(name)
+            yield cur
+        finally:
+            for name in applied:
+                try:
+                    cur.execute(f"RESET {name}")
+                except Exception as e:
+                    print(f"⚠️ Failed to reset {name} on pooled cursor: {e}")
+            self.release(cur)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": len(self._waiters),
+                "total_checkouts": self._total_checkouts,
+                "total_timeouts": self._total_timeouts,
+            }
+
+
+def create_pool(con, budget):
+    size = int(os.getenv("DUCKDB_POOL_SIZE", str(max(4, budget["threads"]))))
+    timeout = float(os.getenv("DUCKDB_POOL_TIMEOUT", "30"))
+    return CursorPool(con, size=size, timeout=timeout)
+
+
+# Dépendance FastAPI (endpoints d'analyse) : slot d'admission "analysis" puis un curseur du pool
+# Fenêtre I/O ouverte sur le curseur (request.state.io), fermée au plus tard à sa libération
+def pooled_cursor(request: Request):
+    with request.app.state.admission.slot("analysis"), request.app.state.pool.cursor() as cur:
+        window = request.state.io = request.app.state.io.begin(cur)
+        try:
+            yield cur
+        finally:
+            if window:
+                window.close()
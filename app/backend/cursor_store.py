@@ -0,0 +1,172 @@
+import os, sys, socket, threading, time, uuid
+from collections import OrderedDict
+
+
+class CursorNotFound(Exception):
+    pass
+
+
+def estimate_rows_bytes(rows):
+    return sum(sys.getsizeof(val) for row in rows for val in row)
+
+
+class ServerCursor:
+    # cur : curseur DuckDB tenu jusqu'à la fermeture (curseur du pool ou d'une instance dédiée), rendu par on_close
+
+    def __init__(self, cursor_id, cur, columns, page_size, on_close):
+        self.cursor_id = cursor_id
+        self.cur = cur
+        self.columns = columns
+        self.page_size = page_size
+        self.on_close = on_close
+        self.rows_fetched = 0
+        self.exhausted = False
+        self.closed = False
+        self.last_access = time.time()
+        self.lock = threading.Lock()
+        self._lookahead = []
+        self._page_bytes = 0
+
+    # Empreinte côté Python : ligne d'avance tenue entre deux pages + taille de la dernière page (ce que la suivante
+    # matérialisera). Le reste du résultat est dans DuckDB, borné par memory_limit (spill)
+    @property
+    def held_bytes(self):
+        return estimate_rows_bytes(self._lookahead) + self._page_bytes
+
+    # fetchmany(n + 1) : la ligne en trop sert à savoir s'il reste des données
+    def fetch_page(self, page_size=None):
+        page_size = page_size or self.page_size
+        with self.lock:
+            if self.closed:
+                raise CursorNotFound(f"Cursor {self.cursor_id} not found or expired")
+            rows = self._lookahead + self.cur.fetchmany(page_size + 1 - len(self._lookahead))
+            self._lookahead = rows[page_size:]
+            rows = rows[:page_size]
+            self.exhausted = not self._lookahead
+            self.rows_fetched += len(rows)
+            self._page_bytes = estimate_rows_bytes(rows)
+            self.last_access = time.time()
+            return rows
+
+    # Attend une page en cours de lecture avant de rendre le curseur
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._lookahead = []
+            self._page_bytes = 0
+            try:
+                self.on_close()
+            except Exception as e:
+                print(f"⚠️ Failed to close cursor {self.cursor_id}: {e}")
+
+
+class CursorStore:
+    # Curseurs serveur ouverts par /query sur son curseur (pool ou instance dédiée), gardé jusqu'à la fermeture :
+    # au plus max_open à la fois et max_bytes d'empreinte cumulée (éviction LRU), expirés au-delà du TTL d'inactivité
+    # Les pages suivantes sont lues sous un slot d'admission, comme une requête interactive
+
+    def __init__(self, admission, ttl=300.0, max_open=4, max_bytes=256 * 1024 * 1024):
+        self.admission = admission
+        self.ttl = ttl
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+        self._expired = 0
+        self._evicted = 0
+        self._evicted_bytes = 0
+
+    # Exécute la requête sur cur et lit la première page ; le curseur serveur devient ensuite propriétaire de cur,
+    # rendu par on_close (pool, instance). En cas d'erreur (exécution ou première page), cur reste à l'appelant
+    def open(self, cur, query, page_size, on_close):
+        # Préfixe hostname : permet au proxy de router les pages suivantes vers le bon noeud
+        cursor_id = f"{socket.gethostname()}-{uuid.uuid4().hex}"
+        cur.execute(query)
+        columns = [desc[0] for desc in cur.description] if cur.description else []
+        entry = ServerCursor(cursor_id, cur, columns, page_size, on_close)
+        rows = entry.fetch_page()
+        with self._lock:
+            self._cursors[cursor_id] = entry
+        self.expire()
+        return entry, rows
+
+    def fetch(self, entry, page_size=None):
+        with self.admission.slot("interactive"):
+            rows = entry.fetch_page(page_size)
+        self.release_if_exhausted(entry)
+        # La page lue peut faire passer l'empreinte cumulée au-dessus de max_bytes
+        self.expire()
+        return rows
+
+    def get(self, cursor_id):
+        self.expire()
+        with self._lock:
+            entry = self._cursors.get(cursor_id)
+            if entry is None:
+                raise CursorNotFound(f"Cursor {cursor_id} not found or expired")
+            self._cursors.move_to_end(cursor_id)
+            return entry
+
+    def close(self, cursor_id):
+        with self._lock:
+            entry = self._cursors.pop(cursor_id, None)
+        if entry is None:
+            raise CursorNotFound(f"Cursor {cursor_id} not found or expired")
+        entry.close()
+
+    def remove(self, entry):
+        with self._lock:
+            self._cursors.pop(entry.cursor_id, None)
+        entry.close()
+
+    def release_if_exhausted(self, entry):
+        if entry.exhausted:
+            self.remove(entry)
+
+    def expire(self):
+        now = time.time()
+        to_close = []
+        with self._lock:
+            for cursor_id, entry in list(self._cursors.items()):
+                if now - entry.last_access > self.ttl:
+                    to_close.append(self._cursors.pop(cursor_id))
+                    self._expired += 1
+            # Éviction LRU (les plus anciens en tête de l'OrderedDict)
+            while len(self._cursors) > self.max_open:
+                _, entry = self._cursors.popitem(last=False)
+                to_close.append(entry)
+                self._evicted += 1
+            # Budget mémoire : le curseur le plus récent est gardé même s'il dépasse seul le budget
+            held = sum(e.held_bytes for e in self._cursors.values())
+            while held > self.max_bytes and len(self._cursors) > 1:
+                _, entry = self._cursors.popitem(last=False)
+                held -= entry.held_bytes
+                to_close.append(entry)
+                self._evicted_bytes += 1
+        for entry in to_close:
+            entry.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open_cursors": len(self._cursors),
+                "max_open": self.max_open,
+                "held_bytes": sum(e.held_bytes for e in self._cursors.values()),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "expired": self._expired,
+                "evicted": self._evicted,
+                "evicted_over_budget": self._evicted_bytes,
+            }
+
+
+# max_open par défaut : la moitié du pool, le reste reste disponible pour les autres requêtes
+def create_cursor_store(pool, admission):
+    return CursorStore(
+        admission,
+        ttl=float(os.getenv("CURSOR_TTL_SECONDS", "300")),
+        max_open=int(os.getenv("CURSOR_MAX_OPEN", str(max(1, pool.size // 2)))),
+        max_bytes=int(os.getenv("CURSOR_MAX_BYTES", str(256 * 1024 * 1024))),
+    )
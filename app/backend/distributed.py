@@ -0,0 +1,354 @@
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import duckdb
+import requests
+import pyarrow as pa
+from sqlglot import exp
+from sql_fingerprint import parse_sql, PARQUET_FUNCTIONS
+from file_stats import stat_files
+
+PARTIALS_TABLE = "partials"
+FRAGMENT_TIMEOUT = float(os.getenv("DBGRID_FRAGMENT_TIMEOUT", "600"))
+
+
+class NotDistributable(ValueError):
+    pass
+
+
+class FragmentFailed(RuntimeError):
+    pass
+
+
+# DBGRID_NODES="http://backend1:8000=2,http://backend2:8000=10" : url[=poids], poids = part relative des octets
+def parse_nodes(spec: str):
+    nodes = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        url, _, weight = item.partition("=")
+        nodes.append((url.rstrip("/"), float(weight or 1)))
+    return nodes
+
+
+def cluster_nodes():
+    return parse_nodes(os.getenv("DBGRID_NODES", "http://127.0.0.1:8000"))
+
+
+# Agrégats connus de DuckDB : sqlglot en parse beaucoup en Anonymous (histogram, fsum, bit_or...) ou en Func ordinaire (list)
+@lru_cache(maxsize=1)
+def _builtin_aggregates():
+    return frozenset(_list_aggregates(duckdb.connect()))
+
+
+def _list_aggregates(con):
+    rows = con.execute("SELECT DISTINCT lower(function_name) FROM duckdb_functions() WHERE function_type = 'aggregate'").fetchall()
+    return {name for name, in rows}
+
+
+# Avec une connexion, les agrégats des extensions chargées sont aussi reconnus
+def aggregate_functions(con=None):
+    if con is None:
+        return _builtin_aggregates()
+    return _builtin_aggregates() | _list_aggregates(con)
+
+
+def _is_aggregate(node, aggregates):
+    if isinstance(node, exp.AggFunc):
+        return True
+    if isinstance(node, exp.Anonymous):
+        return node.name.lower() in aggregates
+    return isinstance(node, exp.Func) and node.sql_name().lower() in aggregates
+
+
+def _find_aggregate(tree, aggregates):
+    return next((node for node in tree.walk() if _is_aggregate(node, aggregates)), None)
+
+
+class DistributedPlan:
+    # Requête d'origine découpée en fragment (exécuté par chaque noeud sur ses fichiers)
+    # et requête finale (exécutée par le coordinateur sur la table "partials")
+
+    def __init__(self, source, source_args, fragment, final):
+        self.source = source
+        self.source_args = source_args
+        self.fragment = fragment
+        self.final = final
+
+    def fragment_sql(self, files):
+        fragment = self.fragment.copy()
+        paths = exp.Array(expressions=[exp.Literal.string(f) for f in files])
+        fragment.set("from", exp.From(this=exp.Table(this=exp.Anonymous(this="read_parquet", expressions=[paths] + [a.copy() for a in self.source_args]))))
+        return fragment.sql(dialect="duckdb")
+
+    def describe(self):
+        return {"fragment_query": self.fragment_sql([self.source]), "final_query": self.final.sql(dialect="duckdb")}
+
+
+def _source(tree):
+    from_ = tree.args.get("from")
+    table = from_.this if from_ else None
+    fn = table.this if isinstance(table, exp.Table) else None
+    if isinstance(fn, exp.Anonymous) and fn.name.lower() in PARQUET_FUNCTIONS and fn.expressions and isinstance(fn.expressions[0], exp.Literal):
+        return fn.expressions[0].name, fn.expressions[1:]
+    if isinstance(fn, exp.Identifier) and fn.name.endswith(".parquet"):
+        return fn.name, []
+    raise NotDistributable("FROM must be a single read_parquet('<path or glob>') source")
+
+
+def _group_expressions(tree, aggregates):
+    group = tree.args.get("group")
+    if not group:
+        return []
+    selects = tree.expressions
+    aliases = {s.alias: s.this for s in selects if isinstance(s, exp.Alias)}
+    if group.args.get("all"):
+        return [s.unalias() for s in selects if not _find_aggregate(s, aggregates)]
+
+    exprs = []
+    for g in group.expressions:
+        if isinstance(g, exp.Literal) and g.is_int:
+            # GROUP BY 1 : position dans le SELECT
+            exprs.append(selects[int(g.name) - 1].unalias())
+        elif isinstance(g, exp.Column) and not g.table and g.name in aliases:
+            exprs.append(aliases[g.name])
+        else:
+            exprs.append(g)
+    return exprs
+
+
+def _check_supported(tree):
+    if not isinstance(tree, exp.Select):
+        raise NotDistributable("Only a single SELECT can be distributed")
+    for arg in ("with", "joins", "distinct", "qualify"):
+        if tree.args.get(arg):
+            raise NotDistributable(f"{arg.upper()} is not supported in distributed queries")
+    if tree.find(exp.Window):
+        raise NotDistributable("Window functions are not supported in distributed queries")
+    if any(isinstance(node, (exp.Subquery, exp.Select)) for node in tree.walk() if node is not tree):
+        raise NotDistributable("Subqueries are not supported in distributed queries")
+    group = tree.args.get("group")
+    for arg in ("rollup", "cube", "grouping_sets"):
+        if group and group.args.get(arg):
+            raise NotDistributable(f"GROUP BY {arg.upper().replace('_', ' ')} is not supported in distributed queries")
+    # Échantillon en pourcentage tiré par chaque noeud sur ses fichiers (même fraction au total) ;
+    # un nombre de lignes serait tiré N fois
+    for sample in tree.find_all(exp.TableSample):
+        if sample.args.get("size") or sample.args.get("rows"):
+            raise NotDistributable("Row-count samples are not supported in distributed queries, use a percentage")
+
+
+# Nom de colonne tel que DuckDB le produirait pour l'expression non aliasée
+def _output_name(e):
+    if isinstance(e, exp.Column):
+        return e.name
+    if isinstance(e, exp.Count) and isinstance(e.this, exp.Star):
+        return "count_star()"
+    return e.sql(dialect="duckdb", normalize_functions="lower")
+
+
+# Agrégats partiels : COUNT -> SUM des comptes, AVG -> SUM / COUNT, SUM / MIN / MAX -> eux-mêmes
+# Liste blanche : tout autre agrégat (y compris ceux que sqlglot ne type pas) est refusé
+# FILTER (WHERE ...) est appliqué par les fragments, sur chacun des partiels de l'agrégat
+def _aggregate_plan(tree, group_exprs, aggregates):
+    partials = {}
+
+    def partial(expr, where=None):
+        if where is not None:
+            expr = exp.Filter(this=expr, expression=where.copy())
+        key = expr.sql(dialect="duckdb")
+        if key not in partials:
+            partials[key] = (f"_p{len(partials)}", expr)
+        return exp.column(partials[key][0])
+
+    def merge(node, where=None):
+        if isinstance(node.this, exp.Distinct):
+            raise NotDistributable(f"{node.sql(dialect='duckdb')} cannot be merged from partials")
+        if isinstance(node, exp.Count):
+            return exp.cast(exp.Sum(this=partial(node.copy(), where)), "BIGINT")
+        if isinstance(node, exp.Sum):
+            return exp.Sum(this=partial(node.copy(), where))
+        if isinstance(node, (exp.Min, exp.Max)):
+            return node.__class__(this=partial(node.copy(), where))
+        if isinstance(node, exp.Avg):
+            total = partial(exp.Sum(this=node.this.copy()), where)
+            count = partial(exp.Count(this=node.this.copy()), where)
+            return exp.Div(this=exp.Sum(this=total), expression=exp.Sum(this=count))
+        raise NotDistributable(f"Aggregate {node.sql(dialect='duckdb')} cannot be merged from partials")
+
+    def finalize(node):
+        if isinstance(node, exp.Filter):
+            return merge(node.this, node.expression)
+        if _is_aggregate(node, aggregates):
+            return merge(node)
+        for i, g in enumerate(group_exprs):
+            if node == g:
+                return exp.column(f"_g{i}")
+        return node
+
+    # Le nom de sortie des expressions non aliasées est conservé (k, et non _g0)
+    def output(e):
+        new = e.transform(finalize)
+        if isinstance(e, exp.Alias) or new == e:
+            return new
+        return exp.alias_(new, _output_name(e), quoted=True)
+
+    final = tree.copy()
+    final.set("expressions", [output(e) for e in final.expressions])
+    for arg in ("having", "order"):
+        if final.args.get(arg):
+            final.set(arg, final.args[arg].transform(finalize))
+    final.set("where", None)
+    final.set("group", exp.Group(expressions=[exp.column(f"_g{i}") for i in range(len(group_exprs))]) if group_exprs else None)
+    final.set("from", exp.From(this=exp.to_table(PARTIALS_TABLE)))
+
+    fragment = exp.select(
+        *[exp.alias_(g.copy(), f"_g{i}") for i, g in enumerate(group_exprs)],
+        *[exp.alias_(expr, alias) for alias, expr in partials.values()],
+    )
+    if tree.args.get("where"):
+        fragment.set("where", tree.args["where"].copy())
+    if group_exprs:
+        fragment.set("group", exp.Group(expressions=[g.copy() for g in group_exprs]))
+    return fragment, final
+
+
+# Scan / filtre : chaque noeud applique ORDER BY + LIMIT, le coordinateur les ré-applique sur l'union
+def _scan_plan(tree, max_rows):
+    outputs = {}
+    for s in tree.expressions:
+        if not isinstance(s, exp.Star):
+            outputs[s.unalias().sql(dialect="duckdb")] = s.alias_or_name
+    has_star = any(isinstance(s, exp.Star) for s in tree.expressions)
+
+    final = exp.select("*").from_(PARTIALS_TABLE)
+    order = tree.args.get("order")
+    if order:
+        ordered = []
+        for o in order.expressions:
+            key = o.this.sql(dialect="duckdb")
+            if key in outputs:
+                name = outputs[key]
+            elif isinstance(o.this, exp.Column) and (o.this.name in outputs.values() or has_star):
+                name = o.this.name
+            else:
+                raise NotDistributable(f"ORDER BY {key} must reference a selected column")
+            item = o.copy()
+            item.set("this", exp.column(name, quoted=True))
+            ordered.append(item)
+        final.set("order", exp.Order(expressions=ordered))
+
+    limit = tree.args.get("limit")
+    offset = tree.args.get("offset")
+    n = int(limit.expression.name) if limit else max_rows
+    skip = int(offset.expression.name) if offset else 0
+    final = final.limit(n)
+    if skip:
+        final = final.offset(skip)
+
+    fragment = tree.copy()
+    fragment.set("offset", None)
+    fragment = fragment.limit(n + skip)
+    return fragment, final
+
+
+def plan_query(query: str, max_rows: int, aggregates=None):
+    tree = parse_sql(query)
+    _check_supported(tree)
+    source, source_args = _source(tree)
+
+    aggregates = aggregates if aggregates is not None else aggregate_functions()
+    group_exprs = _group_expressions(tree, aggregates)
+    if group_exprs or _find_aggregate(tree, aggregates):
+        fragment, final = _aggregate_plan(tree, group_exprs, aggregates)
+        if not final.args.get("limit"):
+            final = final.limit(max_rows)
+    else:
+        fragment, final = _scan_plan(tree, max_rows)
+
+    # USING SAMPLE / TABLESAMPLE : tiré par chaque noeud sur ses fichiers, jamais sur les partiels
+    sample = tree.args.get("sample") or tree.args["from"].this.args.get("sample")
+    fragment.set("sample", sample.copy() if sample else None)
+    final.set("sample", None)
+    return DistributedPlan(source, source_args, fragment, final)
+
+
+# Répartition des fichiers : le plus gros d'abord, vers le noeud le moins chargé relativement à son poids
+def assign_splits(files, nodes):
+    splits = {url: [] for url, _ in nodes}
+    loads = {url: 0 for url, _ in nodes}
+    weights = dict(nodes)
+    for f in sorted(files, key=lambda f: f["size"], reverse=True):
+        url = min(loads, key=lambda u: (loads[u] + f["size"]) / weights[u])
+        splits[url].append(f)
+        loads[url] += f["size"]
+    return {url: split for url, split in splits.items() if split}
+
+
+def run_fragment(url, sql):
+    t0 = time.time()
+    resp = requests.post(
+        f"{url}/distributed/fragment",
+        json={"query": sql},
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+        stream=True,
+        timeout=FRAGMENT_TIMEOUT,
+    )
+    if not resp.ok:
+        raise RuntimeError(f"{url} returned {resp.status_code}: {resp.text[:500]}")
+    with pa.ipc.open_stream(resp.raw) as reader:
+        table = reader.read_all()
+    return table, resp.headers.get("X-Hostname"), time.time() - t0
+
+
+# Un échec de noeud est rejoué sur les noeuds suivants avant d'abandonner la requête
+def _run_split(plan, url, files, nodes):
+    sql = plan.fragment_sql([f["path"] for f in files])
+    candidates = [url] + [u for u, _ in nodes if u != url]
+    errors = []
+    for attempt, node in enumerate(candidates, start=1):
+        try:
+            table, hostname, elapsed = run_fragment(node, sql)
+            return table, {
+                "node": node,
+                "hostname": hostname,
+                "files": len(files),
+                "bytes": sum(f["size"] for f in files),
+                "rows": table.num_rows,
+                "execution_time": round(elapsed, 4),
+                "attempts": attempt,
+            }
+        except Exception as e:
+            print(f"⚠️ Fragment failed on {node}: {e}")
+            errors.append(f"{node}: {e}")
+    raise FragmentFailed("Fragment failed on every node: " + "; ".join(errors))
+
+
+# HUGEINT (SUM d'entiers) revient des noeuds en decimal128(38, 0) : on le recaste pour garder les types de /query
+def partials_select(schema):
+    cols = []
+    for field in schema:
+        name = exp.to_identifier(field.name, quoted=True).sql(dialect="duckdb")
+        if pa.types.is_decimal(field.type) and field.type.precision == 38 and field.type.scale == 0:
+            cols.append(f"CAST({name} AS HUGEINT) AS {name}")
+        else:
+            cols.append(name)
+    return ", ".join(cols)
+
+
+def list_source(con, plan):
+    files = stat_files(con, plan.source)
+    if files is None:
+        raise NotDistributable(f"Cannot list files for {plan.source} (s3:// or local paths only)")
+    if not files:
+        raise FileNotFoundError(f"No files found that match the pattern \"{plan.source}\"")
+    return files
+
+
+# Le coordinateur ne garde pas de curseur pendant le scatter : il peut être lui-même l'un des noeuds
+def scatter(plan, files, nodes):
+    splits = assign_splits(files, nodes)
+    with ThreadPoolExecutor(max_workers=len(splits)) as pool:
+        futures = [pool.submit(_run_split, plan, url, split, nodes) for url, split in splits.items()]
+        results = [f.result() for f in futures]
+
+    tables = [table for table, _ in results]
+    return pa.concat_tables(tables, promote_options="permissive"), [info for _, info in results]
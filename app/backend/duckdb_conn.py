@@ -1,9 +1,27 @@
 import duckdb, os
 
-def init_duckdb():
-    con = duckdb.connect()
+# config : options fixées à la création de la base (ex: threads pour une instance dédiée)
+def init_duckdb(config=None):
+    con = duckdb.connect(config=config or {})
     init_script = os.getenv("INIT_SQL_PATH", "./init.sql")
     if os.path.isfile(init_script):
         with open(init_script) as f:
             con.execute(f.read())
+        promote_session_settings(con)
+    # /query et les endpoints passent des listes de fichiers issues du catalogue (file_stats) : sans ce cache,
+    # DuckDB fait un HEAD par fichier ouvert au lieu de réutiliser taille / ETag (clés parquet jamais réécrites)
+    if os.getenv("HTTP_METADATA_CACHE", "true") == "true":
+        con.execute("SET GLOBAL enable_http_metadata_cache = true")
     return con
+
+# Les SET de init.sql (ex: s3_*) sont locaux à la connexion : on les passe en GLOBAL
+# pour que les curseurs du pool (con.cursor()) en héritent
+def promote_session_settings(con):
+    defaults = dict(con.cursor().execute("SELECT name, value FROM duckdb_settings()").fetchall())
+    for name, value in con.execute("SELECT name, value FROM duckdb_settings()").fetchall():
+        if defaults.get(name) == value:
+            continue
+        try:
+            con.execute(f"SET GLOBAL {name} = ?", [value])
+        except Exception:
+            pass  # option non globale (ex: enable_progress_bar)
@@ -0,0 +1,277 @@
+import os, re, glob, time, threading
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config
+
+S3_SETTINGS = ("s3_endpoint", "s3_region", "s3_access_key_id", "s3_secret_access_key", "s3_session_token", "s3_use_ssl", "s3_url_style")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Catalogue de listings S3 installé par le backend (use_catalog) ; sans catalogue, chaque appel liste S3
+_catalog = None
+
+
+def has_glob(path: str) -> bool:
+    return any(c in path for c in "*?[")
+
+
+# Sémantique des globs DuckDB : '**' traverse les répertoires, '*' et '?' restent dans un segment
+def glob_to_regex(pattern: str):
+    out, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            out += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            out += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            out += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            j = pattern.index("]", i + 1)
+            body = pattern[i + 1:j]
+            out += "[" + ("^" + body[1:] if body.startswith("!") else body) + "]"
+            i = j + 1
+        else:
+            out += re.escape(pattern[i])
+            i += 1
+    return re.compile(out + "$")
+
+
+def split_s3_path(path: str):
+    bucket, _, key = path[len("s3://"):].partition("/")
+    return bucket, key
+
+
+# Client boto3 construit à partir des réglages s3_* de DuckDB (init.sql), mis en cache par configuration
+def s3_client(con):
+    rows = con.execute(
+        f"SELECT name, value FROM duckdb_settings() WHERE name IN ({', '.join(repr(s) for s in S3_SETTINGS)})"
+    ).fetchall()
+    settings = dict(rows)
+    cache_key = tuple(sorted(settings.items()))
+
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is not None:
+            return client
+
+        kwargs = {"region_name": settings.get("s3_region") or None}
+        endpoint = settings.get("s3_endpoint")
+        if endpoint and endpoint != "s3.amazonaws.com":
+            scheme = "https" if settings.get("s3_use_ssl", "true") == "true" else "http"
+            kwargs["endpoint_url"] = f"{scheme}://{endpoint}"
+        if settings.get("s3_access_key_id"):
+            kwargs["aws_access_key_id"] = settings["s3_access_key_id"]
+            kwargs["aws_secret_access_key"] = settings.get("s3_secret_access_key")
+            kwargs["aws_session_token"] = settings.get("s3_session_token") or None
+        addressing = "path" if settings.get("s3_url_style") == "path" else "virtual"
+
+        client = boto3.client("s3", config=Config(s3={"addressing_style": addressing}), **kwargs)
+        _clients[cache_key] = client
+        return client
+
+
+def _key_prefix(key_pattern: str):
+    first_glob = min((key_pattern.find(c) for c in "*?[" if c in key_pattern), default=len(key_pattern))
+    return key_pattern[:first_glob]
+
+
+def _object(o):
+    return (o["Key"], o["Size"], o["ETag"].strip('"'), o["LastModified"].timestamp())
+
+
+# Objets (clé, size, etag, mtime) et sous-préfixes (avec délimiteur) sous un préfixe, et nombre de pages LIST
+def _list_objects(client, bucket, prefix, delimiter=None):
+    objects, prefixes, pages = [], [], 0
+    kwargs = {"Bucket": bucket, "Prefix": prefix}
+    if delimiter:
+        kwargs["Delimiter"] = delimiter
+    for page in client.get_paginator("list_objects_v2").paginate(**kwargs):
+        pages += 1
+        objects += [_object(o) for o in page.get("Contents", [])]
+        prefixes += [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+    return objects, prefixes, pages
+
+
+def _file_entry(bucket, obj):
+    return {"path": f"s3://{bucket}/{obj[0]}", "size": obj[1], "etag": obj[2], "last_modified": obj[3]}
+
+
+def _list_s3(con, pattern: str):
+    bucket, key_pattern = split_s3_path(pattern)
+    regex = glob_to_regex(key_pattern)
+    objects, _, _ = _list_objects(s3_client(con), bucket, _key_prefix(key_pattern))
+    return [_file_entry(bucket, o) for o in objects if regex.match(o[0])]
+
+
+class FileCatalog:
+    # Listings S3 en mémoire par (bucket, préfixe littéral du glob), objets triés par clé, servis sans LIST
+    # pendant ttl secondes ; un préfixe listé sert aussi tous les globs plus profonds.
+    # LRU borné en nombre d'objets ; invalidate() après les écritures du backend (compaction, repartitionnement)
+
+    def __init__(self, ttl=60.0, max_objects=1_000_000, list_workers=8, fanout_pages=5):
+        self.ttl = ttl
+        self.max_objects = max_objects
+        self.list_workers = list_workers
+        self.fanout_pages = fanout_pages
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._objects = 0
+        self.hits = 0
+        self.misses = 0
+        self.list_requests = 0
+        self.list_time = 0.0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # Entrée fraîche la plus précise couvrant le préfixe
+    def _covering(self, bucket, prefix):
+        now = time.time()
+        best = None
+        for (b, p), entry in self._entries.items():
+            if b == bucket and prefix.startswith(p) and now - entry[1] <= self.ttl and (best is None or len(p) > len(best[0])):
+                best = (p, entry)
+        if best is None:
+            return None
+        self._entries.move_to_end((bucket, best[0]))
+        return best[1][0]
+
+    # Listing à plat ; au-delà de fanout_pages pages (gros préfixe), repris par premier niveau avec délimiteur
+    # puis chaque sous-répertoire (partitions hive) listé en parallèle
+    def _list(self, con, bucket, prefix):
+        client = s3_client(con)
+        start = time.perf_counter()
+        objects, pages = [], 0
+        for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            pages += 1
+            objects += [_object(o) for o in page.get("Contents", [])]
+            if page.get("IsTruncated") and pages >= self.fanout_pages:
+                objects, prefixes, level_pages = _list_objects(client, bucket, prefix, delimiter="/")
+                pages += level_pages
+                with ThreadPoolExecutor(max_workers=max(1, min(self.list_workers, len(prefixes)))) as pool:
+                    for sub_objects, _, sub_pages in pool.map(lambda p: _list_objects(client, bucket, p), prefixes):
+                        objects += sub_objects
+                        pages += sub_pages
+                break
+        objects.sort()
+        with self._lock:
+            self.list_requests += pages
+            self.list_time += time.perf_counter() - start
+        return objects
+
+    def _put(self, bucket, prefix, objects):
+        with self._lock:
+            # Les entrées plus profondes sont remplacées par ce listing
+            for key in [k for k in self._entries if k[0] == bucket and k[1].startswith(prefix)]:
+                self._objects -= len(self._entries.pop(key)[0])
+            self._entries[(bucket, prefix)] = (objects, time.time())
+            self._objects += len(objects)
+            while self._objects > self.max_objects and len(self._entries) > 1:
+                _, (old, _) = self._entries.popitem(last=False)
+                self._objects -= len(old)
+                self.evictions += 1
+
+    # fresh : relit S3 (et met à jour le catalogue), pour les vérifications avant écriture
+    def files(self, con, pattern, fresh=False):
+        bucket, key_pattern = split_s3_path(pattern)
+        prefix = _key_prefix(key_pattern)
+        with self._lock:
+            objects = None if fresh else self._covering(bucket, prefix)
+            if objects is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if objects is None:
+            objects = self._list(con, bucket, prefix)
+            self._put(bucket, prefix, objects)
+
+        regex = glob_to_regex(key_pattern)
+        files = []
+        for obj in objects[bisect_left(objects, (prefix,)):]:
+            if not obj[0].startswith(prefix):
+                break
+            if regex.match(obj[0]):
+                files.append(_file_entry(bucket, obj))
+        return files
+
+    def invalidate(self, path):
+        bucket, key = split_s3_path(path)
+        with self._lock:
+            for k in [k for k in self._entries if k[0] == bucket and (k[1].startswith(key) or key.startswith(k[1]))]:
+                self._objects -= len(self._entries.pop(k)[0])
+                self.invalidations += 1
+
+    def entries(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {"s3_prefix": f"s3://{b}/{p}", "objects": len(objects), "age_seconds": round(now - listed_at, 1), "fresh": now - listed_at <= self.ttl}
+                for (b, p), (objects, listed_at) in self._entries.items()
+            ]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "prefixes": len(self._entries),
+                "objects": self._objects,
+                "max_objects": self.max_objects,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "list_requests": self.list_requests,
+                "list_time": round(self.list_time, 4),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def create_file_catalog():
+    return FileCatalog(
+        ttl=float(os.getenv("FILE_CATALOG_TTL_SECONDS", "60")),
+        max_objects=int(os.getenv("FILE_CATALOG_MAX_OBJECTS", "1000000")),
+        list_workers=int(os.getenv("FILE_CATALOG_LIST_WORKERS", "8")),
+        fanout_pages=int(os.getenv("FILE_CATALOG_FANOUT_PAGES", "5")),
+    )
+
+
+def use_catalog(catalog):
+    global _catalog
+    _catalog = catalog
+
+
+# Listing S3 modifié par le backend : les entrées du catalogue qui le recouvrent sont oubliées
+def invalidate(path: str):
+    if _catalog is not None and path.startswith("s3://"):
+        _catalog.invalidate(path)
+
+
+def _list_local(pattern: str):
+    paths = glob.glob(pattern, recursive=True) if has_glob(pattern) else [pattern]
+    files = []
+    for path in sorted(paths):
+        if os.path.isfile(path):
+            st = os.stat(path)
+            files.append({"path": path, "size": st.st_size, "etag": None, "last_modified": st.st_mtime})
+    return files
+
+
+# Liste (path, size, etag, mtime) des fichiers d'un chemin / glob. None si le schéma n'est pas supporté.
+# S3 : listing du catalogue (fresh=True : relu sur S3)
+def stat_files(con, pattern: str, fresh=False):
+    if pattern.startswith("s3://"):
+        if _catalog is not None:
+            return _catalog.files(con, pattern, fresh)
+        return _list_s3(con, pattern)
+    if "://" in pattern:
+        return None
+    return _list_local(pattern)
@@ -0,0 +1,167 @@
+import os, time, threading
+
+# Log DuckDB des requêtes HTTP (httpfs / S3, niveau DEBUG) : une entrée par requête, rattachée au curseur et à la requête
+LOG_SETTINGS = {
+    "logging_level": "DEBUG",
+    "logging_mode": "ENABLE_SELECTED",
+    "enabled_log_types": "HTTP",
+    "enable_logging": True,
+}
+
+# Option (DUCKDB_IO_TRACE_READS) : lectures du système de fichiers en plus (locaux ou distants, niveau TRACE),
+# une entrée par lecture : bytes_read mesuré, mais log bien plus volumineux
+TRACE_LOG_SETTINGS = {**LOG_SETTINGS, "logging_level": "TRACE", "enabled_log_types": "HTTP,FileSystem"}
+
+# GET : corps de réponse (données, listing) ; HEAD : Content-Length = taille de l'objet, pas d'octets transférés
+IO_QUERY = """
+    SELECT
+        COUNT(*) AS requests,
+        COUNT(*) FILTER (request.type = 'GET' AND request.headers['Range'] IS NOT NULL) AS range_requests,
+        COUNT(*) FILTER (request.type = 'HEAD') AS head_requests,
+        COUNT(*) FILTER (request.type = 'GET' AND request.url LIKE '%list-type=2%') AS list_requests,
+        COUNT(*) FILTER (NOT starts_with(response.status, 'OK_') AND NOT starts_with(response.status, 'PartialContent_')) AS errors,
+        COALESCE(SUM(TRY_CAST(COALESCE(response.headers['Content-Length'], response.headers['content-length']) AS BIGINT))
+            FILTER (request.type = 'GET'), 0) AS bytes_fetched,
+        MAX(epoch_ms(timestamp)) / 1000.0 AS last_response
+    FROM duckdb_logs_parsed('HTTP')
+    WHERE connection_id = $1 AND query_id > $2
+"""
+
+READS_QUERY = """
+    SELECT COALESCE(SUM(bytes), 0) FROM duckdb_logs_parsed('FileSystem')
+    WHERE op = 'READ' AND connection_id = $1 AND query_id > $2
+"""
+
+# bytes_read : octets servis par le système de fichiers DuckDB (fichiers locaux ou objets distants), None sans trace_reads
+HTTP_COUNTERS = ("requests", "range_requests", "head_requests", "list_requests", "errors", "bytes_fetched")
+COUNTERS = HTTP_COUNTERS + ("bytes_read",)
+
+
+class IOWindow:
+    # Fenêtre de mesure sur un curseur : toutes les requêtes exécutées après begin(), jusqu'à close()
+
+    def __init__(self, accounting, connection_id, query_id, nested=False):
+        self.accounting = accounting
+        self.connection_id = connection_id
+        self.query_id = query_id
+        self.nested = nested
+        self.start = time.time()
+        self.metrics = None
+
+    # Idempotent : la réponse et le cleanup du curseur peuvent tous deux fermer la fenêtre
+    def close(self):
+        if self.metrics is None:
+            self.metrics = self.accounting.collect(self)
+        return self.metrics
+
+
+class IOAccounting:
+    # Compteurs I/O object storage par requête (fenêtres) et cumulés pour le noeud
+    # Fenêtres ouvertes indexées par (connection_id, query_id) ; chacune est lue dans le log sur un curseur à elle,
+    # hors verrou (qui ne protège que ce registre, les totaux et le vidage).
+    # Le log DuckDB est en mémoire et ne peut être vidé qu'entièrement : seulement quand plus aucune fenêtre n'est ouverte.
+    # Au-delà de max_entries, les nouvelles requêtes ne sont plus mesurées le temps que les fenêtres ouvertes se ferment
+
+    def __init__(self, con, enabled=True, max_entries=10000, trace_reads=False):
+        self.enabled = enabled
+        self.trace_reads = trace_reads
+        self.max_entries = max_entries
+        self._con = con if enabled else None
+        # Curseur du vidage, utilisé seulement sous le verrou
+        self._cursor = con.cursor() if enabled else None
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._draining = False
+        self.windows = 0
+        self.unmeasured = 0
+        self.io_wait_time = 0.0
+        self.totals = dict.fromkeys(COUNTERS if trace_reads else HTTP_COUNTERS, 0)
+
+    # nested : mesure d'une partie d'une fenêtre déjà ouverte sur le curseur, hors totaux du noeud (déjà comptée)
+    def begin(self, cur, nested=False):
+        if not self.enabled:
+            return None
+        # Un vidage entre cette lecture et l'enregistrement ne retire que des entrées antérieures à la fenêtre
+        connection_id, query_id = cur.execute("SELECT current_connection_id(), current_query_id()").fetchone()
+        with self._lock:
+            if self._draining:
+                self.unmeasured += 1
+                return None
+            window = IOWindow(self, connection_id, query_id, nested)
+            self._windows[(connection_id, query_id)] = window
+        return window
+
+    def _read(self, window):
+        cur = self._con.cursor()
+        try:
+            params = [window.connection_id, window.query_id]
+            row = cur.execute(IO_QUERY, params).fetchone()
+            metrics = dict(zip(HTTP_COUNTERS, row[:-1]))
+            metrics["bytes_read"] = cur.execute(READS_QUERY, params).fetchone()[0] if self.trace_reads else None
+            last_response = row[-1]
+            # Pas de durée par requête dans le log : borne haute = début de fenêtre -> dernière réponse
+            metrics["io_wait_time"] = round(max(0.0, last_response - window.start), 4) if last_response else 0.0
+            return metrics
+        finally:
+            cur.close()
+
+    def collect(self, window):
+        # Lecture hors verrou : la fenêtre reste enregistrée, le log ne peut pas être vidé pendant ce temps
+        try:
+            metrics = self._read(window)
+        except Exception as e:
+            print(f"⚠️ I/O accounting failed: {e}")
+            metrics = None
+        with self._lock:
+            self._windows.pop((window.connection_id, window.query_id), None)
+            if metrics is not None and not window.nested:
+                self.windows += 1
+                self.io_wait_time += metrics["io_wait_time"]
+                for key in self.totals:
+                    self.totals[key] += metrics[key]
+            self._trim()
+        return metrics
+
+    # Sous le verrou : les entrées des fenêtres encore ouvertes sont dans le log, on ne vide qu'une fois la dernière fermée
+    def _trim(self):
+        try:
+            if not self._windows:
+                self._cursor.execute("PRAGMA truncate_duckdb_logs")
+                self._draining = False
+            elif not self._draining:
+                entries = self._cursor.execute("SELECT COUNT(*) FROM duckdb_logs").fetchone()[0]
+                self._draining = entries > self.max_entries
+        except Exception as e:
+            print(f"⚠️ I/O log truncation failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "windows": self.windows,
+                "trace_reads": self.trace_reads,
+                "open_windows": len(self._windows),
+                "unmeasured": self.unmeasured,
+                **self.totals,
+                "io_wait_time": round(self.io_wait_time, 4),
+            }
+
+
+def create_io_accounting(con):
+    enabled = os.getenv("DUCKDB_IO_ACCOUNTING", "true").lower() in ("1", "true", "yes")
+    trace_reads = os.getenv("DUCKDB_IO_TRACE_READS", "false").lower() in ("1", "true", "yes")
+    if enabled:
+        for name, val in (TRACE_LOG_SETTINGS if trace_reads else LOG_SETTINGS).items():
+            con.execute(f"SET GLOBAL {name} = ?", [val])
+    return IOAccounting(
+        con,
+        enabled=enabled,
+        max_entries=int(os.getenv("DUCKDB_IO_LOG_MAX_ENTRIES", "10000")),
+        trace_reads=trace_reads,
+    )
+
+
+# Métriques I/O de la fenêtre ouverte par pooled_cursor pour cette requête HTTP
+def request_io(request):
+    window = getattr(request.state, "io", None)
+    return window.close() if window else None
@@ -0,0 +1,226 @@
+import os, time, uuid, socket, threading
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+from routers.query import ARROW_BATCH_SIZE
+
+# Barre de progression (réglage de session) : nécessaire pour query_progress(), sans affichage
+PROGRESS_SETTINGS = {"enable_progress_bar": True, "enable_progress_bar_print": False}
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    # kind "query" : résultat Arrow ; autres kinds (compaction, ...) : task(con, job) renvoie un rapport JSON
+    def __init__(self, job_id, query, kind="query", task=None):
+        self.job_id = job_id
+        self.query = query
+        self.kind = kind
+        self.task = task
+        self.report = None
+        self.status = "queued"
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.cancel_requested = False
+        self.con = None
+        self.io = None
+        self.future = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def progress(self):
+        if self.status == "succeeded":
+            return 100.0
+        with self._lock:
+            con = self.con
+        if con is None:
+            return None
+        try:
+            value = con.query_progress()
+        except Exception:
+            return None
+        return round(value, 1) if value >= 0 else None
+
+    def info(self):
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress(),
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "queued_time": round((self.started_at or end) - self.submitted_at, 4),
+            "execution_time": round(end - self.started_at, 4) if self.started_at else None,
+            "columns": self.result.column_names if self.result is not None else None,
+            "total_rows": self.result.num_rows if self.result is not None else None,
+            "result_bytes": self.result.nbytes if self.result is not None else None,
+            "io": self.io,
+            "report": self.report,
+        }
+
+
+class JobStore:
+    # Pool de workers borné + file d'attente de profondeur max (au-delà : JobQueueFull -> 429)
+    # Résultats gardés en mémoire (Arrow) jusqu'à ttl secondes après la fin du job, dans la limite de
+    # max_finished jobs terminés et max_retained_bytes de résultats (les plus anciens retirés d'abord)
+
+    def __init__(self, pool, admission, io, workers=2, queue_depth=16, ttl=3600.0, max_result_bytes=256 * 1024 * 1024,
+                 max_finished=100, max_retained_bytes=1024 * 1024 * 1024):
+        self.pool = pool
+        self.admission = admission
+        self.io = io
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.ttl = ttl
+        self.max_result_bytes = max_result_bytes
+        self.max_finished = max_finished
+        self.max_retained_bytes = max_retained_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.total_submitted = 0
+        self.total_rejected = 0
+        self.total_evicted = 0
+
+    def _active(self):
+        return sum(1 for j in self._jobs.values() if not j.finished)
+
+    # query : requête SQL, ou description du travail pour les jobs à task
+    def submit(self, query, kind="query", task=None):
+        self.expire()
+        with self._lock:
+            if self._active() >= self.workers + self.queue_depth:
+                self.total_rejected += 1
+                raise JobQueueFull(f"Job queue full ({self.workers} running, {self.queue_depth} queued)")
+            job = Job(f"{socket.gethostname()}-{uuid.uuid4().hex}", query, kind, task)
+            self._jobs[job.job_id] = job
+            self.total_submitted += 1
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        try:
+            # Les jobs passent après les requêtes interactives et attendent leur slot sans limite
+            with self.admission.slot("analysis", timeout=None), self.pool.cursor(settings=PROGRESS_SETTINGS) as con:
+                with job._lock:
+                    if job.cancel_requested:
+                        job.status = "cancelled"
+                        return
+                    job.con = con
+                    job.status = "running"
+                    job.started_at = time.time()
+                print(f"🏃 Job {job.job_id} started")
+                window = self.io.begin(con)
+                try:
+                    if job.task is not None:
+                        job.report = job.task(con, job)
+                        job.status = "succeeded"
+                        return
+                    reader = con.execute(job.query).fetch_record_batch(ARROW_BATCH_SIZE)
+                    batches, size = [], 0
+                    for batch in reader:
+                        if job.cancel_requested:
+                            raise InterruptedError("Job cancelled")
+                        size += batch.nbytes
+                        if size > self.max_result_bytes:
+                            raise ValueError(f"Result exceeds {self.max_result_bytes} bytes, add a LIMIT or an aggregation")
+                        batches.append(batch)
+                    job.result = pa.Table.from_batches(batches, schema=reader.schema)
+                    job.status = "succeeded"
+                finally:
+                    with job._lock:
+                        job.con = None
+                    if window:
+                        job.io = window.close()
+        except Exception as e:
+            job.status = "cancelled" if job.cancel_requested else "failed"
+            job.error = None if job.cancel_requested else str(e)
+        finally:
+            job.finished_at = time.time()
+            print(f"🏁 Job {job.job_id} {job.status} in {job.finished_at - job.submitted_at:.4f} seconds")
+            self.expire()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFound(f"Job {job_id} not found (unknown, expired or on another node)")
+        return job
+
+    # Annulation : retrait de la file si pas démarré, sinon interrupt() du curseur en cours
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        with job._lock:
+            if job.finished:
+                return job
+            job.cancel_requested = True
+            if job.con is not None:
+                job.con.interrupt()
+        if job.future.cancel():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+        return job
+
+    def delete(self, job_id):
+        job = self.cancel(job_id)
+        if job.finished:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+        return job
+
+    def expire(self):
+        now = time.time()
+        with self._lock:
+            # finished_at peut manquer un instant (statut posé avant la fin de _run)
+            for job_id in [j.job_id for j in self._jobs.values() if j.finished and now - (j.finished_at or now) > self.ttl]:
+                del self._jobs[job_id]
+            finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at or now)
+            retained = sum(j.result.nbytes for j in finished if j.result is not None)
+            while finished and (len(finished) > self.max_finished or retained > self.max_retained_bytes):
+                job = finished.pop(0)
+                retained -= job.result.nbytes if job.result is not None else 0
+                del self._jobs[job.job_id]
+                self.total_evicted += 1
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "queued": sum(1 for j in jobs if j.status == "queued"),
+                "running": sum(1 for j in jobs if j.status == "running"),
+                "finished": sum(1 for j in jobs if j.finished),
+                "result_bytes": sum(j.result.nbytes for j in jobs if j.result is not None),
+                "max_finished": self.max_finished,
+                "max_retained_bytes": self.max_retained_bytes,
+                "total_submitted": self.total_submitted,
+                "total_rejected": self.total_rejected,
+                "total_evicted": self.total_evicted,
+            }
+
+
+def create_job_store(pool, admission, io):
+    return JobStore(
+        pool,
+        admission,
+        io,
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        queue_depth=int(os.getenv("JOB_QUEUE_DEPTH", "16")),
+        ttl=float(os.getenv("JOB_TTL_SECONDS", "3600")),
+        max_result_bytes=int(os.getenv("JOB_RESULT_MAX_BYTES", str(256 * 1024 * 1024))),
+        max_finished=int(os.getenv("JOB_MAX_FINISHED", "100")),
+        max_retained_bytes=int(os.getenv("JOB_RETAINED_MAX_BYTES", str(1024 * 1024 * 1024))),
+    )
@@ -0,0 +1,122 @@
+import os, time, threading
+from contextlib import contextmanager
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.compute as pc
+from file_stats import stat_files, has_glob
+
+
+def sql_list(paths):
+    return "[" + ", ".join("'" + p.replace("'", "''") + "'" for p in paths) + "]"
+
+
+class MetadataCache:
+    # Footers parquet (résultat de parquet_metadata) par fichier, clé = (path, etag ou mtime, size)
+    # LRU borné en octets + TTL
+
+    def __init__(self, max_bytes=128 * 1024 * 1024, ttl=600.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached_lookups = 0
+
+    @staticmethod
+    def file_key(f):
+        return (f["path"], f["etag"] or f["last_modified"], f["size"])
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, key, table):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[0].nbytes
+            self._entries[key] = (table, time.time())
+            self._bytes += table.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, (old, _) = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+                self.evictions += 1
+
+    def metadata(self, con, s3_path):
+        files = stat_files(con, s3_path)
+        if files is None:
+            # Schéma non listable (http...) : lecture directe sans cache
+            with self._lock:
+                self.uncached_lookups += 1
+            return con.execute(f"SELECT * FROM parquet_metadata('{s3_path}')").fetch_arrow_table()
+        if not files:
+            raise FileNotFoundError(f"No files found that match the pattern \"{s3_path}\"")
+
+        tables, missing = [], []
+        for f in files:
+            table = self._get(self.file_key(f))
+            if table is None:
+                missing.append(f)
+            else:
+                tables.append(table)
+
+        # Un seul appel parquet_metadata pour tous les footers manquants
+        if missing:
+            fetched = con.execute(
+                f"SELECT * FROM parquet_metadata({sql_list([f['path'] for f in missing])})"
+            ).fetch_arrow_table()
+            for f in missing:
+                table = fetched.filter(pc.equal(fetched["file_name"], f["path"]))
+                self._put(self.file_key(f), table)
+                tables.append(table)
+
+        return pa.concat_tables(tables)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "uncached_lookups": self.uncached_lookups,
+            }
+
+
+def create_metadata_cache():
+    return MetadataCache(
+        max_bytes=int(os.getenv("METADATA_CACHE_MAX_BYTES", str(128 * 1024 * 1024))),
+        ttl=float(os.getenv("METADATA_CACHE_TTL_SECONDS", "600")),
+    )
+
+
+# Expose les footers (cachés) du chemin comme vue "parquet_meta" sur le curseur, le temps du bloc :
+# retirée à la sortie pour que le curseur rendu au pool ne garde pas la table Arrow référencée
+@contextmanager
+def register_metadata(request, con, s3_path):
+    con.register("parquet_meta", request.app.state.metadata_cache.metadata(con, s3_path))
+    try:
+        yield
+    finally:
+        con.unregister("parquet_meta")
+
+
+# Source parquet_scan d'un chemin : glob S3 remplacé par la liste des fichiers du catalogue (pas de LIST S3 par DuckDB)
+def parquet_source(con, s3_path):
+    files = stat_files(con, s3_path) if s3_path.startswith("s3://") and has_glob(s3_path) else None
+    if not files:
+        return "parquet_scan('" + s3_path.replace("'", "''") + "')"
+    return f"parquet_scan({sql_list([f['path'] for f in files])})"
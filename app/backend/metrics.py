@@ -0,0 +1,136 @@
+import os, threading
+from prometheus_client import CollectorRegistry, Histogram, Counter
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from sql_fingerprint import fingerprint_sql
+
+# Registre dédié : pas de métriques process/GC par défaut, pas de doublons au --reload
+REGISTRY = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Nombre max d'empreintes en label (cardinalité bornée), au-delà : "other"
+MAX_FINGERPRINTS = int(os.getenv("METRICS_MAX_FINGERPRINTS", "200"))
+
+HTTP_DURATION = Histogram(
+    "dbgrid_http_request_duration_seconds", "HTTP request latency until response headers, by route",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+QUERY_DURATION = Histogram(
+    "dbgrid_query_duration_seconds", "Query latency by query fingerprint (literals stripped), until the last row is sent",
+    ["fingerprint", "format"], buckets=LATENCY_BUCKETS, registry=REGISTRY,
+)
+ROWS_RETURNED = Counter("dbgrid_rows_returned_total", "Rows returned to clients", ["endpoint", "format"], registry=REGISTRY)
+BYTES_SERIALIZED = Counter("dbgrid_response_bytes_total", "Response bytes serialized", ["endpoint", "format"], registry=REGISTRY)
+
+_fingerprints = set()
+_fingerprints_lock = threading.Lock()
+
+
+def fingerprint_label(query):
+    fingerprint, _ = fingerprint_sql(query)
+    if fingerprint in _fingerprints:
+        return fingerprint
+    with _fingerprints_lock:
+        if len(_fingerprints) < MAX_FINGERPRINTS:
+            _fingerprints.add(fingerprint)
+            return fingerprint
+    return "other"
+
+
+def observe_query(query, fmt, elapsed, rows):
+    QUERY_DURATION.labels(fingerprint_label(query), fmt).observe(elapsed)
+    ROWS_RETURNED.labels("/query", fmt).inc(rows)
+
+
+def observe_bytes(endpoint, fmt, size):
+    BYTES_SERIALIZED.labels(endpoint, fmt).inc(size)
+
+
+# Route déclarée (/jobs/{job_id}) plutôt que le chemin réel : cardinalité bornée
+def observe_request(request, status, elapsed, size=None):
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    HTTP_DURATION.labels(endpoint, request.method, str(status)).observe(elapsed)
+    if size is not None:
+        observe_bytes(endpoint, "json", size)
+
+
+def _gauge(name, doc, value, labels=None, label_values=None):
+    family = GaugeMetricFamily(name, doc, labels=labels)
+    if labels:
+        for values, val in label_values:
+            family.add_metric(values, val or 0)
+    else:
+        family.add_metric([], value or 0)
+    return family
+
+
+def _counter(name, doc, labels, label_values):
+    family = CounterMetricFamily(name, doc, labels=labels)
+    for values, val in label_values:
+        family.add_metric(values, val or 0)
+    return family
+
+
+class StateCollector:
+    # Lu à chaque scrape depuis les stats() existantes : aucun coût sur le chemin des requêtes
+
+    def __init__(self, app):
+        self.app = app
+        self._cursor = None
+        self._lock = threading.Lock()
+
+    def _duckdb_memory(self):
+        with self._lock:
+            if self._cursor is None:
+                self._cursor = self.app.state.con.cursor()
+            memory = self._cursor.execute("SELECT tag, memory_usage_bytes, temporary_storage_bytes FROM duckdb_memory()").fetchall()
+            temp_files = self._cursor.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM duckdb_temporary_files()").fetchone()
+        return memory, temp_files
+
+    def collect(self):
+        state = self.app.state
+        yield _gauge("dbgrid_in_flight_requests", "HTTP requests in flight", state.in_flight)
+
+        admission = state.admission.stats()
+        yield _gauge("dbgrid_admission_running_queries", "Queries holding an admission slot", admission["running"])
+        yield _gauge("dbgrid_admission_max_concurrent", "Admission slots", admission["max_concurrent"])
+        yield _gauge("dbgrid_admission_queued", "Requests waiting for an admission slot", None, ["priority"], [([p], n) for p, n in admission["queued"].items()])
+        yield _counter("dbgrid_admission_rejected", "Requests rejected with 429 (queue full)", ["priority"], [([p], n) for p, n in admission["rejected"].items()])
+        yield _counter("dbgrid_admission_timeouts", "Requests rejected with 429 after waiting", ["priority"], [([p], n) for p, n in admission["timeouts"].items()])
+
+        pool = state.pool.stats()
+        yield _gauge("dbgrid_cursor_pool_in_use", "Pooled cursors in use", pool["in_use"])
+        yield _gauge("dbgrid_cursor_pool_waiting", "Requests waiting for a pooled cursor", pool["waiting"])
+
+        jobs = state.jobs.stats()
+        yield _gauge("dbgrid_jobs", "Background jobs by status", None, ["status"], [(["queued"], jobs["queued"]), (["running"], jobs["running"]), (["finished"], jobs["finished"])])
+        yield _gauge("dbgrid_job_result_bytes", "Bytes held by finished job results", jobs["result_bytes"])
+
+        cursors = state.cursors.stats()
+        yield _gauge("dbgrid_server_cursors_open", "Open server cursors", cursors["open_cursors"])
+
+        caches = {"result_cache": state.result_cache.stats(), "metadata_cache": state.metadata_cache.stats()}
+        yield _counter("dbgrid_cache_hits", "Cache hits", ["cache"], [([c], s["hits"]) for c, s in caches.items()])
+        yield _counter("dbgrid_cache_misses", "Cache misses", ["cache"], [([c], s["misses"]) for c, s in caches.items()])
+        yield _gauge("dbgrid_cache_hit_ratio", "Cache hit ratio since start", None, ["cache"], [([c], s["hit_ratio"]) for c, s in caches.items()])
+        yield _gauge("dbgrid_cache_bytes", "Bytes held by the cache", None, ["cache"], [([c], s["bytes"]) for c, s in caches.items()])
+
+        sketches = state.sketches.stats()
+        yield _counter("dbgrid_sketch_files", "Per-file sketches scanned or reused from the store", ["outcome"], [(["scanned"], sketches["files_scanned"]), (["reused"], sketches["files_reused"])])
+
+        io = state.io.stats()
+        yield _counter("dbgrid_object_storage_requests", "Object storage HTTP requests", ["type"], [([k.replace("_requests", "")], io[k]) for k in ("range_requests", "head_requests", "list_requests")])
+        yield _counter("dbgrid_object_storage_bytes", "Bytes fetched from object storage", [], [([], io["bytes_fetched"])])
+        yield _counter("dbgrid_object_storage_errors", "Failed object storage requests", [], [([], io["errors"])])
+
+        memory, (temp_files, temp_bytes) = self._duckdb_memory()
+        yield _gauge("dbgrid_duckdb_memory_bytes", "DuckDB buffer manager memory by tag", None, ["tag"], [([tag], used) for tag, used, _ in memory])
+        yield _gauge("dbgrid_duckdb_spill_bytes", "DuckDB data spilled to temporary storage, by tag", None, ["tag"], [([tag], spilled) for tag, _, spilled in memory])
+        yield _gauge("dbgrid_duckdb_temp_files", "DuckDB temporary files", temp_files)
+        yield _gauge("dbgrid_duckdb_temp_file_bytes", "Size of DuckDB temporary files", temp_bytes)
+        if admission["memory_limit"]:
+            yield _gauge("dbgrid_duckdb_memory_limit_bytes", "DuckDB memory_limit", admission["memory_limit"])
+
+
+def register_state_collector(app):
+    REGISTRY.register(StateCollector(app))
@@ -1,22 +1,93 @@
 from pydantic import BaseModel
+from typing import Literal
 
 class SQLRequest(BaseModel):
     query: str
     profiling: bool = False
     max_rows: int = 50
     num_threads: int = -1
+    cursor: bool = False
+    use_cache: bool = False
+    # Globs indexés (/zone_maps) remplacés par les seuls fichiers compatibles avec le WHERE
+    use_zone_maps: bool = False
+    # Globs S3 remplacés par la liste des fichiers du catalogue (listing caché FILE_CATALOG_TTL_SECONDS) :
+    # un fichier écrit depuis le listing n'est pas lu avant son expiration
+    use_file_catalog: bool = False
+
+class AutotuneRequest(BaseModel):
+    query: str
+    # Par défaut : puissances de 2 jusqu'au budget threads du noeud
+    thread_counts: list[int] | None = None
+    warmup: int = 1
+    repetitions: int = 3
+    remember: bool = True
+
+class JobRequest(BaseModel):
+    query: str
+
+class DistributedQueryRequest(BaseModel):
+    query: str
+    max_rows: int = 50
+
+class FragmentRequest(BaseModel):
+    query: str
 
 class S3PathRequest(BaseModel):
     s3_path: str
 
+class SampleSpec(BaseModel):
+    # percent : 0-100, rows : nombre de lignes (lus dans des row groups tirés), row_groups / files : nombre tiré au hasard
+    method: Literal["percent", "rows", "row_groups", "files"]
+    value: float
+    seed: int | None = None
+
+class FilterabilityRequest(BaseModel):
+    s3_path: str
+    sample: SampleSpec | None = None
+    use_sketches: bool = False
+
+class BloomProbeRequest(BaseModel):
+    s3_path: str
+    # Par défaut : colonnes ayant au moins un bloom filter
+    columns: list[str] | None = None
+    values_per_column: int = 5
+    repetitions: int = 3
+    seed: int | None = None
+
 class SuggestPartitionRequest(BaseModel):
     s3_path: str
     threshold: int = 10
+    sample: SampleSpec | None = None
+    use_sketches: bool = False
 
 class PartitionValueCountRequest(BaseModel):
     s3_path: str
     column: str
+    sample: SampleSpec | None = None
 
 
 class SQLAnalyzerRequest(BaseModel):
     sql: str
+
+class ZoneMapRequest(BaseModel):
+    s3_path: str
+    # Par défaut : colonnes déjà indexées, ou toutes les colonnes parquet à la création
+    columns: list[str] | None = None
+
+class CompactionRequest(BaseModel):
+    s3_path: str
+    # None : remplacement du dataset d'origine (le glob doit couvrir tout son répertoire racine)
+    output_path: str | None = None
+    target_file_size_mb: int = 256
+    row_group_size: int = 122880
+    compression: Literal["zstd", "snappy", "gzip", "lz4_raw", "uncompressed"] = "zstd"
+    sort_by: list[str] | None = None
+    bloom_filters: bool = False
+    bloom_filter_fpp: float = 0.01
+    # Scan complet avant / après : benchmark et vérification par checksum (sinon nombre de lignes)
+    benchmark: bool = True
+
+class RepartitionRequest(CompactionRequest):
+    partition_by: list[str]
+    # Garde-fou : une partition = au moins un fichier par valeur
+    max_partitions: int = 1000
@@ -0,0 +1,94 @@
+import os, time, threading
+from duckdb_conn import init_duckdb
+from io_stats import create_io_accounting
+from admission import Saturated
+
+
+class PinnedInstance:
+    # Base DuckDB dédiée à un nombre de threads : threads est une option globale (pas de portée curseur),
+    # une base par valeur évite tout SET threads sur la base partagée
+    # même init.sql, memory_limit = budget mémoire d'une requête admise
+
+    def __init__(self, threads, memory_limit=None, temp_directory=None):
+        config = {"threads": threads}
+        if memory_limit:
+            config["memory_limit"] = f"{memory_limit // (1024 * 1024)}MiB"
+        if temp_directory:
+            # Un sous-répertoire par instance : les fichiers de spill de deux bases ne se mélangent pas
+            config["temp_directory"] = os.path.join(temp_directory, f"threads_{threads}")
+        self.threads = threads
+        self.con = init_duckdb(config)
+        self.io = create_io_accounting(self.con)
+        self.active = 0
+        self.queries = 0
+        self.last_used = time.time()
+
+    def cursor(self):
+        return self.con.cursor()
+
+
+class PinnedInstances:
+    # Instances créées à la demande, au plus max_instances ; la moins récemment utilisée (inactive) est fermée
+
+    def __init__(self, max_instances=4, memory_limit=None, max_threads=None, temp_directory=None):
+        self.max_instances = max_instances
+        self.memory_limit = memory_limit
+        self.temp_directory = temp_directory
+        self.max_threads = max_threads
+        self._instances = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def clamp(self, threads):
+        return max(1, min(threads, self.max_threads) if self.max_threads else threads)
+
+    def acquire(self, threads):
+        threads = self.clamp(threads)
+        with self._lock:
+            instance = self._instances.get(threads)
+            if instance is None:
+                if len(self._instances) >= self.max_instances:
+                    idle = [i for i in self._instances.values() if i.active == 0]
+                    if not idle:
+                        raise Saturated(f"All {self.max_instances} thread-pinned instances are busy")
+                    oldest = min(idle, key=lambda i: i.last_used)
+                    del self._instances[oldest.threads]
+                    oldest.con.close()
+                    self.evicted += 1
+                    print(f"🧹 Closed thread-pinned instance ({oldest.threads} threads)")
+                instance = self._instances[threads] = PinnedInstance(threads, self.memory_limit, self.temp_directory)
+                self.created += 1
+                print(f"🧵 Created thread-pinned instance ({threads} threads)")
+            instance.active += 1
+            instance.queries += 1
+            instance.last_used = time.time()
+            return instance
+
+    def release(self, instance):
+        with self._lock:
+            instance.active -= 1
+            instance.last_used = time.time()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_instances": self.max_instances,
+                "memory_limit": self.memory_limit,
+                "created": self.created,
+                "evicted": self.evicted,
+                "instances": [
+                    {"threads": i.threads, "active": i.active, "queries": i.queries, "io": i.io.stats()}
+                    for i in sorted(self._instances.values(), key=lambda i: i.threads)
+                ],
+            }
+
+
+def create_pinned_instances(admission, budget):
+    per_query_memory = admission.stats()["per_query_memory"]
+    return PinnedInstances(
+        max_instances=int(os.getenv("PINNED_MAX_INSTANCES", "4")),
+        memory_limit=int(os.getenv("PINNED_MEMORY_LIMIT", str(per_query_memory or 0))) or None,
+        max_threads=admission.threads,
+        temp_directory=budget["temp_directory"],
+    )
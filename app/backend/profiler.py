@@ -0,0 +1,79 @@
+import os, time
+
+PROFILE_BATCH_COLUMNS = int(os.getenv("PROFILE_BATCH_COLUMNS", "16"))
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Un seul scan pour un lot de colonnes, agrégats spillables (histogram() construit une MAP par colonne qui ne spille pas)
+# GROUPING SETS, un ensemble par colonne : comptes par valeur -> distinct, fréquence max, singletons ;
+# total, non-NULL, min et max relus sur ces groupes
+def _profile_batch(con, source, columns):
+    idents = [quote_ident(col) for col in columns]
+    inner = idents + [f"GROUPING({q}) AS __profile_g{i}" for i, q in enumerate(idents)] + ["COUNT(*) AS __profile_count"]
+    outer = ["COALESCE(SUM(__profile_count) FILTER (__profile_g0 = 0), 0)"]
+    for i, q in enumerate(idents):
+        group = f"__profile_g{i} = 0"
+        outer += [
+            f"COALESCE(SUM(__profile_count) FILTER ({group} AND {q} IS NOT NULL), 0)",
+            f"MIN({q}) FILTER ({group})",
+            f"MAX({q}) FILTER ({group})",
+            f"COUNT({q}) FILTER ({group})",
+            # Même sémantique que GROUP BY col : les NULL forment un groupe
+            f"COALESCE(MAX(__profile_count) FILTER ({group}), 0)",
+            f"COUNT(*) FILTER ({group} AND {q} IS NOT NULL AND __profile_count = 1)",
+        ]
+    sets = ", ".join(f"({q})" for q in idents)
+    row = con.execute(f"""
+        SELECT {', '.join(outer)}
+        FROM (SELECT {', '.join(inner)} FROM {source} GROUP BY GROUPING SETS ({sets}))
+    """).fetchone()
+
+    total = row[0]
+    stats = {}
+    for i, col in enumerate(columns):
+        non_null, min_val, max_val, distinct, top, singletons = row[1 + i * 6: 7 + i * 6]
+        stats[col] = {
+            "distinct_values": distinct,
+            "top_value_ratio": top / total if total else 0.0,
+            "null_ratio": (total - non_null) / total if total else 0.0,
+            "singletons": singletons,
+            "min": min_val,
+            "max": max_val,
+        }
+    return total, stats
+
+
+# Octets lus mesurés sur le curseur (fenêtre I/O : log FileSystem DuckDB), None sans comptage I/O
+def profile_columns(con, source, columns, batch_size=PROFILE_BATCH_COLUMNS, io=None):
+    window = io.begin(con, nested=True) if io else None
+    result = {"columns": {}, "total_rows": None, "scans": 0, "scan_time": 0.0, "bytes_read": None}
+
+    try:
+        for start in range(0, len(columns), batch_size):
+            batch = columns[start:start + batch_size]
+            t0 = time.time()
+            try:
+                total, stats = _profile_batch(con, source, batch)
+                result["scans"] += 1
+            except Exception:
+                # Type non groupable dans le lot : on isole colonne par colonne
+                total, stats = result["total_rows"], {}
+                for col in batch:
+                    try:
+                        total, col_stats = _profile_batch(con, source, [col])
+                        stats.update(col_stats)
+                    except Exception as e:
+                        stats[col] = {"error": str(e)}
+                    result["scans"] += 1
+            result["scan_time"] += time.time() - t0
+            result["total_rows"] = total
+            result["columns"].update(stats)
+    finally:
+        metrics = window.close() if window else None
+        result["bytes_read"] = metrics["bytes_read"] if metrics else None
+
+    result["scan_time"] = round(result["scan_time"], 4)
+    return result
@@ -0,0 +1,278 @@
+import re
+import pyarrow as pa
+from sqlglot import parse_one, exp
+from file_stats import stat_files, has_glob
+from metadata_cache import sql_list
+from sql_fingerprint import NON_DETERMINISTIC, NON_DETERMINISTIC_NAMES
+
+SCAN_FUNCTIONS = ("read_parquet", "parquet_scan")
+
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+# Scans parquet d'une requête : read_parquet / parquet_scan ('chemin' ou liste) et FROM 'fichier.parquet'
+# column_aliases : colonnes renommées par l'alias (t(a, b)), les noms de la requête ne sont plus ceux des stats
+def parquet_scans(tree):
+    scans = []
+    for table in tree.find_all(exp.Table):
+        node = table.this
+        alias = table.args.get("alias")
+        column_aliases = [c.name for c in alias.columns] if alias else []
+        if isinstance(node, exp.Anonymous) and node.name.lower() in SCAN_FUNCTIONS and node.expressions:
+            first = node.expressions[0]
+            items = first.expressions if isinstance(first, exp.Array) else [first]
+            if all(isinstance(i, exp.Literal) and i.is_string for i in items):
+                scans.append({"table": table, "paths": [i.this for i in items], "source": node.sql(dialect="duckdb"), "alias": table.alias or node.name, "column_aliases": column_aliases})
+        elif isinstance(node, exp.Identifier) and node.quoted and ".parquet" in node.name:
+            scans.append({"table": table, "paths": [node.name], "source": f"read_parquet({sql_literal(node.name)})", "alias": table.alias or node.name, "column_aliases": column_aliases})
+    return scans
+
+
+# Remplace le chemin d'un scan (read_parquet / parquet_scan('chemin') ou FROM 'chemin') par une liste de fichiers,
+# sur le texte de la requête : le reste du SQL reste tel qu'écrit
+def replace_scan_path(query, path, files):
+    listing = sql_list(files)
+    literal = re.escape(sql_literal(path))
+    query = re.sub(rf"(?i)\b(read_parquet|parquet_scan)(\s*\(\s*){literal}", lambda m: f"{m.group(1)}{m.group(2)}{listing}", query)
+    return re.sub(rf"(?i)\b(FROM|JOIN)(\s+){literal}", lambda m: f"{m.group(1)}{m.group(2)}read_parquet({listing})", query)
+
+
+# Globs S3 des scans remplacés par les fichiers du catalogue : DuckDB ne relance pas de LIST S3
+# Renvoie (requête, nombre de globs remplacés) ; un glob sans fichier reste tel quel (erreur DuckDB d'origine)
+def expand_globs(con, query):
+    if "s3://" not in query:
+        return query, 0
+    scans = parquet_scans(parse_one(query, read="duckdb"))
+    patterns = sorted({s["paths"][0] for s in scans if len(s["paths"]) == 1 and s["paths"][0].startswith("s3://") and has_glob(s["paths"][0])})
+    expanded = 0
+    for pattern in patterns:
+        files = stat_files(con, pattern)
+        if files:
+            query = replace_scan_path(query, pattern, [f["path"] for f in files])
+            expanded += 1
+    return query, expanded
+
+
+def conjuncts(node):
+    if isinstance(node, exp.Paren):
+        return conjuncts(node.this)
+    if isinstance(node, exp.And):
+        return conjuncts(node.this) + conjuncts(node.expression)
+    return [node]
+
+
+# Valeur connue avant exécution et identique pour toutes les lignes (random(), now()... exclus)
+def is_constant(node):
+    if node.find(exp.Column, exp.Select, exp.Placeholder, exp.Parameter, *NON_DETERMINISTIC) is not None:
+        return False
+    return not any(fn.name.lower() in NON_DETERMINISTIC_NAMES for fn in node.find_all(exp.Anonymous))
+
+
+class ScanStats:
+    # Colonnes d'un scan vues comme statistiques par row group :
+    # colonne parquet -> stats min/max/null_count du footer, colonne hive -> valeur lue dans le chemin du fichier
+
+    # hive : colonnes lues dans les chemins (None : toute colonne sans stats parquet)
+    def __init__(self, alias, schema, physical, hive=None):
+        self.alias = alias
+        self.schema = schema
+        self.physical = physical
+        self.hive = hive
+        self.used = {}
+
+    def owns(self, column, others):
+        name = self.schema_name(column.name)
+        if name is None:
+            return False
+        if column.table:
+            return column.table == self.alias
+        return not any(o.schema_name(column.name) for o in others)
+
+    def schema_name(self, name):
+        return next((c for c in self.schema if c.lower() == name.lower()), None)
+
+    # (min, max, nulls) : expressions SQL sur la table de stats pivotée, None si la colonne n'a pas de stats
+    def column(self, name):
+        name = self.schema_name(name)
+        if name not in self.physical and self.hive is not None and name not in self.hive:
+            return None
+        i = self.used.setdefault(name, len(self.used))
+        return f"min_{i}", f"max_{i}", f"nulls_{i}"
+
+    def pivot_columns(self):
+        cols = []
+        for name, i in self.used.items():
+            column_type = self.schema[name]
+            if name in self.physical:
+                match = f"FILTER (WHERE path_in_schema = {sql_literal(name)})"
+                cols += [
+                    f"MIN(TRY_CAST(stats_min_value AS {column_type})) {match} AS min_{i}",
+                    f"MAX(TRY_CAST(stats_max_value AS {column_type})) {match} AS max_{i}",
+                    f"SUM(stats_null_count) {match} AS nulls_{i}",
+                ]
+            else:
+                # Partition hive : une seule valeur par fichier ("NULL" = valeur nulle)
+                value = f"NULLIF(url_decode(regexp_extract(file_name, {sql_literal('(^|/)' + name + '=([^/]*)')}, 2)), 'NULL')"
+                cols += [
+                    f"TRY_CAST(ANY_VALUE({value}) AS {column_type}) AS min_{i}",
+                    f"TRY_CAST(ANY_VALUE({value}) AS {column_type}) AS max_{i}",
+                    f"CASE WHEN ANY_VALUE({value}) IS NULL THEN ANY_VALUE(row_group_num_rows) ELSE 0 END AS nulls_{i}",
+                ]
+        return cols
+
+
+# Prédicat -> condition SQL "le row group peut contenir des lignes qui passent", None si non évaluable
+# (stats absentes : COALESCE(..., true), le row group est gardé)
+def translate(node, stats):
+    if isinstance(node, exp.Paren):
+        return translate(node.this, stats)
+    if isinstance(node, exp.And):
+        left, right = translate(node.this, stats), translate(node.expression, stats)
+        if left is None or right is None:
+            return left or right
+        return f"({left} AND {right})"
+    if isinstance(node, exp.Or):
+        left, right = translate(node.this, stats), translate(node.expression, stats)
+        return f"({left} OR {right})" if left and right else None
+
+    if isinstance(node, exp.Not) and isinstance(node.this, exp.Is) and isinstance(node.this.expression, exp.Null):
+        column = stats.column(node.this.this.name) if isinstance(node.this.this, exp.Column) else None
+        return f"COALESCE({column[2]} < row_group_num_rows, true)" if column else None
+    if isinstance(node, exp.Is) and isinstance(node.expression, exp.Null) and isinstance(node.this, exp.Column):
+        column = stats.column(node.this.name)
+        return f"COALESCE({column[2]} > 0, true)" if column else None
+
+    if isinstance(node, exp.Between) and isinstance(node.this, exp.Column) and is_constant(node.args["low"]) and is_constant(node.args["high"]):
+        column = stats.column(node.this.name)
+        if column is None:
+            return None
+        low, high, _ = column
+        return f"COALESCE({high} >= {node.args['low'].sql(dialect='duckdb')} AND {low} <= {node.args['high'].sql(dialect='duckdb')}, true)"
+    if isinstance(node, exp.In) and isinstance(node.this, exp.Column) and node.expressions and all(is_constant(e) for e in node.expressions):
+        column = stats.column(node.this.name)
+        if column is None:
+            return None
+        low, high, _ = column
+        return "(" + " OR ".join(f"COALESCE({low} <= {v} AND {high} >= {v}, true)" for v in (e.sql(dialect="duckdb") for e in node.expressions)) + ")"
+
+    comparisons = {exp.EQ: "=", exp.NEQ: "!=", exp.LT: "<", exp.LTE: "<=", exp.GT: ">", exp.GTE: ">="}
+    flipped = {"=": "=", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+    op = comparisons.get(type(node))
+    if op is None:
+        return None
+    column, value = node.this, node.expression
+    if not isinstance(column, exp.Column):
+        column, value, op = value, column, flipped[op]
+    if not isinstance(column, exp.Column) or not is_constant(value) or stats.column(column.name) is None:
+        return None
+    low, high, _ = stats.column(column.name)
+    v = value.sql(dialect="duckdb")
+    condition = {
+        "=": f"{low} <= {v} AND {high} >= {v}",
+        "!=": f"NOT ({low} = {v} AND {high} = {v})",
+        "<": f"{low} < {v}",
+        "<=": f"{low} <= {v}",
+        ">": f"{high} > {v}",
+        ">=": f"{high} >= {v}",
+    }[op]
+    return f"COALESCE({condition}, true)"
+
+
+def scan_metadata(con, metadata_cache, paths):
+    return pa.concat_tables([metadata_cache.metadata(con, p) for p in paths])
+
+
+def describe_scans(con, scans):
+    for scan in scans:
+        scan["schema"] = dict(con.execute(f"SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM {scan['source']})").fetchall())
+
+
+# Conjoncts du WHERE du SELECT du scan qui ne portent que sur ses colonnes, avec leur condition sur les stats
+# Colonnes renommées par l'alias : aucun prédicat (un nom de la requête peut désigner une autre colonne du fichier)
+def scan_predicates(scan, scans, stats):
+    if scan.get("column_aliases"):
+        return []
+    select = scan["table"].find_ancestor(exp.Select)
+    where = select.args.get("where") if select else None
+    others = [
+        ScanStats(o["alias"], o["schema"], set()) for o in scans
+        if o is not scan and select is not None and o["table"].find_ancestor(exp.Select) is select
+    ]
+    predicates = []
+    for conjunct in conjuncts(where.this) if where else []:
+        columns = list(conjunct.find_all(exp.Column))
+        if not columns or not all(stats.owns(c, others) for c in columns):
+            continue
+        predicates.append({"predicate": conjunct.sql(dialect="duckdb"), "condition": translate(conjunct, stats)})
+    return predicates
+
+
+# Row groups gardés par les prédicats, sur une table au format parquet_metadata
+# (file_name, row_group_id, row_group_num_rows, path_in_schema, stats_*, total_compressed_size)
+def evaluate_row_groups(con, meta, stats, predicates):
+    con.register("pruning_meta", meta)
+    pivot = "".join(f", {c}" for c in stats.pivot_columns())
+    try:
+        row_groups = con.execute(f"""
+            SELECT file_name, row_group_id, ANY_VALUE(row_group_num_rows) AS row_group_num_rows,
+                   SUM(total_compressed_size) AS bytes{pivot}
+            FROM pruning_meta
+            GROUP BY file_name, row_group_id
+        """).fetch_arrow_table()
+    finally:
+        con.unregister("pruning_meta")
+    con.register("pruning_row_groups", row_groups)
+
+    try:
+        # Chaque prédicat évalué seul : row groups gardés, ou non supporté (expression ou types non comparables)
+        for p in predicates:
+            condition = p.pop("condition")
+            p["supported"] = False
+            p["row_groups_kept"] = row_groups.num_rows
+            if condition is None:
+                continue
+            try:
+                p["row_groups_kept"] = con.execute(f"SELECT COUNT(*) FILTER (WHERE {condition}) FROM pruning_row_groups").fetchone()[0]
+                p["supported"] = True
+                p["condition"] = condition
+            except Exception as e:
+                p["error"] = str(e).splitlines()[0]
+
+        keep = " AND ".join(p.pop("condition") for p in predicates if p["supported"]) or "true"
+        files, total_rows, total_bytes, kept_row_groups, kept_rows, kept_bytes = con.execute(f"""
+            SELECT COUNT(DISTINCT file_name), COALESCE(SUM(row_group_num_rows), 0), COALESCE(SUM(bytes), 0),
+                   COUNT(*) FILTER (WHERE {keep}),
+                   COALESCE(SUM(row_group_num_rows) FILTER (WHERE {keep}), 0), COALESCE(SUM(bytes) FILTER (WHERE {keep}), 0)
+            FROM pruning_row_groups
+        """).fetchone()
+        kept_files = [row[0] for row in con.execute(f"SELECT DISTINCT file_name FROM pruning_row_groups WHERE {keep} ORDER BY file_name").fetchall()]
+    finally:
+        con.unregister("pruning_row_groups")
+
+    summary = {
+        "predicates": predicates,
+        "files": {"total": files, "scanned": len(kept_files)},
+        "row_groups": {"total": row_groups.num_rows, "scanned": kept_row_groups},
+        "rows": {"total": int(total_rows), "scanned": int(kept_rows)},
+        "bytes": {"total": int(total_bytes), "scanned": int(kept_bytes)},
+        "skipped_percent": round((1 - kept_bytes / total_bytes) * 100, 1) if total_bytes else 0.0,
+    }
+    return summary, kept_files
+
+
+# Estimation du data skipping d'une requête, avant exécution : prédicats du WHERE évalués sur les stats
+# min/max / null_count de chaque row group et sur les valeurs de partition hive des chemins
+def estimate_pruning(con, metadata_cache, sql):
+    tree = parse_one(sql, read="duckdb")
+    scans = parquet_scans(tree)
+    describe_scans(con, scans)
+
+    results = []
+    for scan in scans:
+        meta = scan_metadata(con, metadata_cache, scan["paths"])
+        stats = ScanStats(scan["alias"], scan["schema"], set(meta["path_in_schema"].to_pylist()))
+        summary, _ = evaluate_row_groups(con, meta, stats, scan_predicates(scan, scans, stats))
+        results.append({"source": scan["source"], "alias": scan["alias"], **summary})
+    return {"scans": results}
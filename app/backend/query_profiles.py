@@ -0,0 +1,213 @@
+import os, json, time, zlib, sqlite3, threading, statistics
+from contextlib import contextmanager
+
+TOP_OPERATORS = 10
+# Écart estimé / réel (q-error) au-delà duquel un opérateur est signalé
+MISESTIMATE_Q_ERROR = 10.0
+OPERATOR_DETAILS = ("Function", "Filters", "Total Files Read", "Groups", "Aggregates", "Join Type", "Conditions", "Top", "Order By")
+
+
+# EXPLAIN ANALYZE : la requête est exécutée, le profil JSON est renvoyé comme résultat
+# (pas de fichier profiling_output, pas de réglage enable_profiling laissé sur le curseur)
+def capture_profile(con, query):
+    row = con.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}").fetchone()
+    return json.loads(row[1])
+
+
+def _operators(node):
+    for child in node.get("children", []):
+        if child.get("operator_type") and child["operator_type"] != "EXPLAIN_ANALYZE":
+            yield child
+        yield from _operators(child)
+
+
+def _estimated(extra):
+    try:
+        return int(extra["Estimated Cardinality"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _q_error(estimated, actual):
+    if estimated is None:
+        return None
+    return round(max(estimated, actual, 1) / max(min(estimated, actual), 1), 1)
+
+
+# Résumé de l'arbre d'opérateurs : top opérateurs par temps, estimation vs réel, lignes / octets lus
+def summarize_profile(tree, latency, io=None):
+    operators = []
+    for node in _operators(tree):
+        extra = node.get("extra_info") or {}
+        estimated = _estimated(extra)
+        actual = node.get("operator_cardinality", 0)
+        operators.append({
+            "operator": node.get("operator_name", "").strip(),
+            "operator_type": node["operator_type"],
+            "timing": node.get("operator_timing", 0.0),
+            "cardinality": actual,
+            "estimated_cardinality": estimated,
+            "q_error": _q_error(estimated, actual),
+            "rows_scanned": node.get("operator_rows_scanned", 0),
+            "details": {k: extra[k] for k in OPERATOR_DETAILS if k in extra},
+        })
+
+    operator_time = sum(op["timing"] for op in operators)
+    for op in operators:
+        op["share"] = round(op["timing"] / operator_time, 3) if operator_time else 0.0
+        op["timing"] = round(op["timing"], 6)
+
+    time_by_type = {}
+    for op in operators:
+        time_by_type[op["operator_type"]] = round(time_by_type.get(op["operator_type"], 0.0) + op["timing"], 6)
+
+    return {
+        "latency": round(latency, 6),
+        "operator_time": round(operator_time, 6),
+        "operators": len(operators),
+        "rows_scanned": sum(op["rows_scanned"] for op in operators),
+        "bytes_fetched": io["bytes_fetched"] if io else None,
+        "bytes_read": io["bytes_read"] if io else None,
+        "time_by_operator_type": time_by_type,
+        "top_operators": sorted(operators, key=lambda op: op["timing"], reverse=True)[:TOP_OPERATORS],
+        "misestimates": sorted(
+            (op for op in operators if op["q_error"] is not None and op["q_error"] >= MISESTIMATE_Q_ERROR),
+            key=lambda op: op["q_error"], reverse=True,
+        )[:TOP_OPERATORS],
+    }
+
+
+class ProfileStore:
+    # Profils par empreinte de requête, persistés en SQLite
+    # bornes : per_fingerprint derniers runs par empreinte, max_fingerprints empreintes (les moins récentes évincées)
+
+    def __init__(self, path="profiles.db", per_fingerprint=20, max_fingerprints=200, regression_ratio=1.5):
+        self.path = path
+        self.per_fingerprint = per_fingerprint
+        self.max_fingerprints = max_fingerprints
+        self.regression_ratio = regression_ratio
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.evicted = 0
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS query_profiles (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fingerprint TEXT NOT NULL,
+                    normalized_query TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    latency REAL NOT NULL,
+                    summary TEXT NOT NULL,
+                    tree BLOB NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS query_profiles_fingerprint ON query_profiles (fingerprint, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def add(self, fingerprint, normalized_query, query, summary, tree):
+        with self._lock, self._connect() as db:
+            previous = db.execute(
+                "SELECT latency, summary FROM query_profiles WHERE fingerprint = ? ORDER BY created_at DESC LIMIT ?",
+                [fingerprint, self.per_fingerprint],
+            ).fetchall()
+            cur = db.execute(
+                "INSERT INTO query_profiles (fingerprint, normalized_query, query, created_at, latency, summary, tree) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [fingerprint, normalized_query, query, time.time(), summary["latency"], json.dumps(summary), zlib.compress(json.dumps(tree).encode())],
+            )
+            profile_id = cur.lastrowid
+            self.stored += 1
+            self._trim(db, fingerprint)
+        return profile_id, self.compare(summary, [(lat, json.loads(s)) for lat, s in previous])
+
+    def _trim(self, db, fingerprint):
+        db.execute(
+            "DELETE FROM query_profiles WHERE fingerprint = ? AND id NOT IN "
+            "(SELECT id FROM query_profiles WHERE fingerprint = ? ORDER BY created_at DESC LIMIT ?)",
+            [fingerprint, fingerprint, self.per_fingerprint],
+        )
+        stale = db.execute(
+            "SELECT fingerprint FROM query_profiles GROUP BY fingerprint ORDER BY MAX(created_at) DESC LIMIT -1 OFFSET ?",
+            [self.max_fingerprints],
+        ).fetchall()
+        for (old,) in stale:
+            db.execute("DELETE FROM query_profiles WHERE fingerprint = ?", [old])
+            self.evicted += 1
+
+    # Dernier run vs médiane des runs précédents ; opérateurs dont le temps a le plus augmenté vs le run précédent
+    def compare(self, summary, previous):
+        if not previous:
+            return {"baseline_runs": 0, "baseline_latency": None, "latency_ratio": None, "regressed": False, "operator_deltas": []}
+        baseline = statistics.median(lat for lat, _ in previous)
+        ratio = summary["latency"] / baseline if baseline else None
+        last = previous[0][1]["time_by_operator_type"]
+        current = summary["time_by_operator_type"]
+        deltas = sorted(
+            ({"operator_type": t, "previous": last.get(t, 0.0), "current": current.get(t, 0.0), "delta": round(current.get(t, 0.0) - last.get(t, 0.0), 6)}
+             for t in set(last) | set(current)),
+            key=lambda d: d["delta"], reverse=True,
+        )
+        return {
+            "baseline_runs": len(previous),
+            "baseline_latency": round(baseline, 6),
+            "latency_ratio": round(ratio, 3) if ratio is not None else None,
+            "regressed": ratio is not None and ratio >= self.regression_ratio,
+            "operator_deltas": deltas[:5],
+        }
+
+    def fingerprints(self, limit=50):
+        with self._connect() as db:
+            rows = db.execute("""
+                SELECT fingerprint, MAX(normalized_query), COUNT(*), MAX(created_at), AVG(latency), MIN(latency), MAX(latency)
+                FROM query_profiles
+                GROUP BY fingerprint
+                ORDER BY MAX(created_at) DESC
+                LIMIT ?
+            """, [limit]).fetchall()
+        keys = ("fingerprint", "normalized_query", "runs", "last_run", "avg_latency", "min_latency", "max_latency")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def history(self, fingerprint, limit=20):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, query, created_at, latency, summary FROM query_profiles WHERE fingerprint = ? ORDER BY created_at DESC LIMIT ?",
+                [fingerprint, limit],
+            ).fetchall()
+        runs = [{"id": r[0], "query": r[1], "created_at": r[2], "latency": r[3], "summary": json.loads(r[4])} for r in rows]
+        comparison = self.compare(runs[0]["summary"], [(r["latency"], r["summary"]) for r in runs[1:]]) if runs else None
+        return runs, comparison
+
+    def tree(self, fingerprint, profile_id):
+        with self._connect() as db:
+            row = db.execute("SELECT tree FROM query_profiles WHERE id = ? AND fingerprint = ?", [profile_id, fingerprint]).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def stats(self):
+        with self._connect() as db:
+            fingerprints, profiles = db.execute("SELECT COUNT(DISTINCT fingerprint), COUNT(*) FROM query_profiles").fetchone()
+        return {
+            "path": self.path,
+            "fingerprints": fingerprints,
+            "profiles": profiles,
+            "per_fingerprint": self.per_fingerprint,
+            "max_fingerprints": self.max_fingerprints,
+            "stored": self.stored,
+            "evicted_fingerprints": self.evicted,
+        }
+
+
+def create_profile_store():
+    return ProfileStore(
+        path=os.getenv("PROFILE_DB_PATH", "profiles.db"),
+        per_fingerprint=int(os.getenv("PROFILE_STORE_PER_FINGERPRINT", "20")),
+        max_fingerprints=int(os.getenv("PROFILE_STORE_MAX_FINGERPRINTS", "200")),
+        regression_ratio=float(os.getenv("PROFILE_REGRESSION_RATIO", "1.5")),
+    )
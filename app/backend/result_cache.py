@@ -0,0 +1,116 @@
+import os, json, time, hashlib, threading
+from collections import OrderedDict
+from sql_fingerprint import parse_sql, normalize_sql, parquet_sources, is_cacheable
+from file_stats import stat_files
+
+
+# Clé = texte normalisé + réglages threads / rows. None si la requête n'est pas cacheable.
+def cache_plan(query, num_threads, max_rows):
+    try:
+        tree = parse_sql(query)
+    except Exception:
+        return None
+    if not is_cacheable(tree):
+        return None
+    raw_key = f"{normalize_sql(tree)}|threads={num_threads}|max_rows={max_rows}"
+    return hashlib.sha1(raw_key.encode()).hexdigest(), parquet_sources(tree)
+
+
+# Empreinte des fichiers sources : ETag, taille et mtime de chaque fichier résolu
+# Listing relu sur S3 (pas celui du catalogue, en retard jusqu'à FILE_CATALOG_TTL_SECONDS)
+def source_fingerprint(con, sources):
+    fingerprint = []
+    for source in sources:
+        files = stat_files(con, source, fresh=True)
+        if files is None:
+            return None
+        fingerprint += [(f["path"], f["etag"], f["size"], f["last_modified"]) for f in files]
+    return tuple(sorted(fingerprint))
+
+
+class CacheEntry:
+    def __init__(self, fingerprint, payload, size):
+        self.fingerprint = fingerprint
+        self.payload = payload
+        self.size = size
+        self.validated_at = time.time()
+
+
+class ResultCache:
+    # LRU borné en octets ; les empreintes sources sont revalidées au plus toutes les validate_seconds
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, validate_seconds=5.0):
+        self.max_bytes = max_bytes
+        self.validate_seconds = validate_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, con, key, sources):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            stale = time.time() - entry.validated_at > self.validate_seconds
+
+        if stale:
+            fingerprint = source_fingerprint(con, sources)
+            with self._lock:
+                if fingerprint != entry.fingerprint:
+                    if self._entries.get(key) is entry:
+                        self._remove(key)
+                    self.invalidations += 1
+                    self.misses += 1
+                    return None
+                entry.validated_at = time.time()
+
+        with self._lock:
+            self.hits += 1
+        return entry.payload
+
+    def put(self, key, fingerprint, payload):
+        if fingerprint is None:
+            return
+        size = len(json.dumps(payload, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(fingerprint, payload, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+def create_result_cache():
+    return ResultCache(
+        max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+        validate_seconds=float(os.getenv("RESULT_CACHE_VALIDATE_SECONDS", "5")),
+    )
@@ -0,0 +1,390 @@
+import os, time, uuid, shutil, statistics
+from file_stats import stat_files, split_s3_path, s3_client, invalidate
+from metadata_cache import sql_list
+from profiler import quote_ident
+
+# Seuils des checks de tuning (check_parquet_file_size / check_parquet_row_group_size)
+SMALL_FILE_BYTES = 100 * 1024 * 1024
+SMALL_ROW_GROUP_ROWS = 5000
+
+
+class RewriteError(ValueError):
+    pass
+
+
+class RewriteConflict(RuntimeError):
+    pass
+
+
+# Répertoire racine d'un glob (partie sans joker) : unité de remplacement du dataset
+def dataset_root(pattern: str):
+    first_glob = min((pattern.find(c) for c in "*?[" if c in pattern), default=len(pattern))
+    return pattern[:pattern.rfind("/", 0, first_glob)]
+
+
+def relative_dir(root, path):
+    return path[len(root) + 1:].rpartition("/")[0]
+
+
+def join_path(root, rel):
+    return f"{root}/{rel}" if rel else root
+
+
+def _file_version(f):
+    return (f["path"], f["etag"] or f["last_modified"], f["size"])
+
+
+# Listings relus sur S3 (pas ceux du catalogue) : les contrôles avant remplacement ne tolèrent pas de retard
+def list_dataset(con, pattern):
+    files = stat_files(con, pattern, fresh=True)
+    if files is None:
+        raise RewriteError(f"Unsupported path: {pattern}")
+    files = [f for f in files if f["path"].endswith(".parquet")]
+    if not files:
+        raise RewriteError(f"No parquet file matches {pattern}")
+    return files
+
+
+# Disposition physique : fichiers, octets, row groups, et ce que les checks de tuning signalent
+def layout(con, files):
+    rows, row_groups, small_row_groups = con.execute(f"""
+        SELECT COALESCE(SUM(num_rows), 0), COUNT(*), COUNT(*) FILTER (WHERE num_rows < {SMALL_ROW_GROUP_ROWS})
+        FROM (
+            SELECT file_name, row_group_id, ANY_VALUE(row_group_num_rows) AS num_rows
+            FROM parquet_metadata({sql_list([f['path'] for f in files])})
+            GROUP BY file_name, row_group_id
+        )
+    """).fetchone()
+    total_bytes = sum(f["size"] for f in files)
+    return {
+        "files": len(files),
+        "bytes": total_bytes,
+        "rows": int(rows),
+        "row_groups": row_groups,
+        "avg_file_mb": round(total_bytes / len(files) / 1024 / 1024, 2) if files else 0,
+        "avg_row_group_rows": round(rows / row_groups) if row_groups else 0,
+        "small_files": sum(1 for f in files if f["size"] < SMALL_FILE_BYTES),
+        "small_row_groups": small_row_groups,
+    }
+
+
+# hive : colonnes des répertoires key=value lues comme colonnes (source d'un repartitionnement)
+def read_source(paths, hive=False):
+    return f"read_parquet({sql_list(paths)}, hive_partitioning = {str(hive).lower()}, union_by_name = true)"
+
+
+def data_columns(con, paths, hive=False):
+    return [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {read_source(paths, hive)}").fetchall()]
+
+
+# Scan complet chronométré : nombre de lignes + somme des hash par colonne (indépendante de l'ordre des lignes)
+# sert de benchmark avant / après et de vérification que la réécriture n'a rien perdu
+def scan_checksum(con, paths, columns, hive=False):
+    sums = "".join(f", SUM(hash({quote_ident(c)}))" for c in columns)
+    start = time.perf_counter()
+    row = con.execute(f"SELECT COUNT(*){sums} FROM {read_source(paths, hive)}").fetchone()
+    return round(time.perf_counter() - start, 4), [str(v) for v in row]
+
+
+def copy_options(spec):
+    options = ["FORMAT parquet", f"COMPRESSION {spec.compression}", f"ROW_GROUP_SIZE {spec.row_group_size}"]
+    if spec.bloom_filters:
+        # DuckDB n'écrit un bloom filter que pour les colonnes encodées en dictionnaire :
+        # limite du dictionnaire relevée à la taille d'un row group pour que toutes les colonnes en aient un
+        options += [f"DICTIONARY_SIZE_LIMIT {spec.row_group_size}", f"BLOOM_FILTER_FALSE_POSITIVE_RATIO {spec.bloom_filter_fpp}"]
+    return options
+
+
+def check_columns(columns, names, what):
+    unknown = [c for c in names or [] if c not in columns]
+    if unknown:
+        raise RewriteError(f"Unknown {what} column(s): {', '.join(unknown)}")
+
+
+# COPY crée le répertoire cible mais pas ses parents
+def make_parent_dirs(target_dir):
+    if not target_dir.startswith("s3://"):
+        os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+
+
+# Un répertoire réécrit en fichiers de ~target_file_size_mb (rotation FILE_SIZE_BYTES, un seul writer)
+def write_files(con, paths, target_dir, spec, prefix):
+    make_parent_dirs(target_dir)
+    order = f" ORDER BY {', '.join(quote_ident(c) for c in spec.sort_by)}" if spec.sort_by else ""
+    options = copy_options(spec) + [
+        f"FILE_SIZE_BYTES {spec.target_file_size_mb * 1024 * 1024}",
+        f"FILENAME_PATTERN '{prefix}_{{i}}'",
+        "OVERWRITE_OR_IGNORE",
+    ]
+    con.execute(f"COPY (SELECT * FROM {read_source(paths)}{order}) TO '{target_dir}' ({', '.join(options)})")
+
+
+def check_cancel(job):
+    if job is not None and job.cancel_requested:
+        raise InterruptedError("Job cancelled")
+
+
+def delete_objects(con, paths):
+    if not paths:
+        return
+    bucket, _ = split_s3_path(paths[0])
+    keys = [split_s3_path(p)[1] for p in paths]
+    for i in range(0, len(keys), 1000):
+        s3_client(con).delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in keys[i:i + 1000]]})
+
+
+def remove_tree(con, root):
+    if root.startswith("s3://"):
+        delete_objects(con, [f["path"] for f in stat_files(con, f"{root}/**", fresh=True)])
+        invalidate(root)
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+# Fichiers part-{rewrite_id}_* écrits sous root (et, en local, les sous-répertoires restés vides)
+def remove_written(con, root, rewrite_id):
+    prefix = f"part-{rewrite_id}_"
+    written = [f["path"] for f in stat_files(con, f"{root}/**/{prefix}*", fresh=True)]
+    if root.startswith("s3://"):
+        delete_objects(con, written)
+        invalidate(root)
+        return
+    for path in written:
+        os.remove(path)
+    for dirpath, _, _ in sorted(os.walk(root), key=lambda w: -len(w[0])):
+        if dirpath != root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+
+# Répertoire de travail voisin de root (même système de fichiers / bucket que la cible)
+def staging_dir(root, rewrite_id, kind="rewrite"):
+    parent, _, name = root.rpartition("/")
+    if not name or parent in ("s3:/", "s3:"):
+        raise RewriteError(f"Cannot rewrite {root} in place: pass an output_path")
+    return f"{parent}/_{kind}-{rewrite_id}-{name}"
+
+
+# Le remplacement porte sur tout le répertoire racine : le glob doit en couvrir tous les fichiers parquet
+def check_swappable(con, root, files):
+    everything = {f["path"] for f in list_dataset(con, f"{root}/**/*.parquet")}
+    others = everything - {f["path"] for f in files}
+    if others:
+        raise RewriteError(f"The glob selects {len(files)} of the {len(everything)} parquet files under {root}: pass an output_path")
+
+
+# Remplacement : les fichiers d'origine ne doivent pas avoir changé pendant la réécriture
+# local : renommage de répertoires (la racine change d'un coup)
+# S3 : copie serveur des nouveaux objets puis suppression des anciens (pas de renommage atomique sur S3)
+def swap_in(con, root, staging, files, rewrite_id):
+    current = {_file_version(f) for f in list_dataset(con, f"{root}/**/*.parquet")}
+    if current != {_file_version(f) for f in files}:
+        raise RewriteConflict(f"{root} changed during the rewrite, new files discarded")
+
+    if not root.startswith("s3://"):
+        # Fichiers annexes (_SUCCESS, manifestes...) conservés
+        old = {f["path"] for f in files}
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                if path not in old:
+                    target = os.path.join(staging, os.path.relpath(path, root))
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copy2(path, target)
+        backup = staging_dir(root, rewrite_id, "replaced")
+        os.rename(root, backup)
+        try:
+            os.rename(staging, root)
+        except OSError:
+            os.rename(backup, root)
+            raise
+        shutil.rmtree(backup, ignore_errors=True)
+        return {"method": "directory_rename", "replaced_files": len(files)}
+
+    client = s3_client(con)
+    bucket, _ = split_s3_path(root)
+    copied = []
+    try:
+        for f in stat_files(con, f"{staging}/**", fresh=True):
+            target = root + f["path"][len(staging):]
+            client.copy({"Bucket": bucket, "Key": split_s3_path(f["path"])[1]}, bucket, split_s3_path(target)[1])
+            copied.append(target)
+    except Exception:
+        # Copie interrompue : les objets déjà copiés sont retirés, le dataset d'origine reste intact
+        if copied:
+            delete_objects(con, copied)
+        raise
+    delete_objects(con, [f["path"] for f in files])
+    remove_tree(con, staging)
+    return {"method": "copy_then_delete", "replaced_files": len(files)}
+
+
+# Réécriture commune : source listée, écriture par write(con, files, root, target, rewrite_id) en staging (ou output_path),
+# vérification (checksum ou nombre de lignes), benchmark de scan avant / après, remplacement
+# partition_columns : colonnes passées dans les chemins (repartitionnement), source lue avec hive_partitioning
+def run_rewrite(con, job, spec, write, partition_columns=()):
+    rewrite_id = uuid.uuid4().hex[:8]
+    files = list_dataset(con, spec.s3_path)
+    paths = [f["path"] for f in files]
+    root = dataset_root(spec.s3_path)
+    in_place = spec.output_path is None
+    if in_place:
+        check_swappable(con, root, files)
+        target = staging_dir(root, rewrite_id)
+    else:
+        target = spec.output_path.rstrip("/")
+        existing = stat_files(con, f"{target}/**", fresh=True)
+        if existing:
+            raise RewriteError(f"{target} is not empty ({len(existing)} file(s)): pass a new or empty output_path")
+
+    hive = bool(partition_columns)
+    columns = data_columns(con, paths, hive)
+    check_columns(columns, spec.sort_by, "sort")
+    check_columns(columns, partition_columns, "partition")
+    # Colonnes de partition sorties des fichiers (valeurs dans les chemins) : comparées sur les autres colonnes
+    compared = [c for c in columns if c not in partition_columns]
+
+    report = {"input": spec.s3_path, "output": root if in_place else target, "before": layout(con, files)}
+    before = scan_checksum(con, paths, compared, hive) if spec.benchmark else None
+    check_cancel(job)
+
+    try:
+        start = time.perf_counter()
+        report.update(write(con, files, root, target, rewrite_id))
+        report["write_time"] = round(time.perf_counter() - start, 4)
+        check_cancel(job)
+
+        new_files = list_dataset(con, f"{target}/**/*.parquet")
+        new_paths = [f["path"] for f in new_files]
+        after_layout = layout(con, new_files)
+        if spec.benchmark:
+            after = scan_checksum(con, new_paths, compared)
+            if after[1] != before[1]:
+                raise RewriteError(f"Verification failed: rows / column checksums differ ({before[1][0]} rows before, {after[1][0]} after)")
+            report["verified"] = "checksum"
+            report["benchmark"] = {
+                "scan_time_before": before[0],
+                "scan_time_after": after[0],
+                "speedup": round(before[0] / after[0], 2) if after[0] else None,
+            }
+        else:
+            if after_layout["rows"] != report["before"]["rows"]:
+                raise RewriteError(f"Verification failed: {report['before']['rows']} rows before, {after_layout['rows']} after")
+            report["verified"] = "row_count"
+        check_cancel(job)
+
+        report["swap"] = swap_in(con, root, target, files, rewrite_id) if in_place else None
+    except BaseException:
+        # output_path : seuls les fichiers écrits par cette réécriture sont retirés, jamais le répertoire de l'appelant
+        if in_place:
+            remove_tree(con, target)
+        else:
+            remove_written(con, target, rewrite_id)
+        raise
+    finally:
+        # Listings du catalogue antérieurs à l'écriture
+        invalidate(root)
+        invalidate(target)
+
+    report["after"] = after_layout
+    print(f"🗜️ Rewrite {rewrite_id}: {report['before']['files']} -> {report['after']['files']} files")
+    return report
+
+
+# Compaction : chaque répertoire (partition hive ou racine) réécrit séparément, la disposition des répertoires est conservée
+def compact(con, job, spec):
+    def write(con, files, root, target, rewrite_id):
+        groups = {}
+        for f in files:
+            groups.setdefault(relative_dir(root, f["path"]), []).append(f["path"])
+        for rel, paths in sorted(groups.items()):
+            check_cancel(job)
+            write_files(con, paths, join_path(target, rel), spec, f"part-{rewrite_id}")
+        return {"directories": len(groups)}
+
+    return run_rewrite(con, job, spec, write)
+
+
+# Répartition des lignes entre partitions : skew = plus grosse partition / moyenne
+def partition_skew(con, root, files):
+    rows_by_file = dict(con.execute(f"""
+        SELECT file_name, SUM(row_group_num_rows)
+        FROM (SELECT DISTINCT file_name, row_group_id, row_group_num_rows FROM parquet_metadata({sql_list([f['path'] for f in files])}))
+        GROUP BY file_name
+    """).fetchall())
+    partitions = {}
+    for f in files:
+        p = partitions.setdefault(relative_dir(root, f["path"]), {"partition": relative_dir(root, f["path"]), "rows": 0, "bytes": 0, "files": 0})
+        p["rows"] += int(rows_by_file.get(f["path"], 0))
+        p["bytes"] += f["size"]
+        p["files"] += 1
+    rows = [p["rows"] for p in partitions.values()]
+    mean = statistics.mean(rows)
+    return {
+        "partitions": len(partitions),
+        "rows_min": min(rows),
+        "rows_median": statistics.median(rows),
+        "rows_max": max(rows),
+        "skew": round(max(rows) / mean, 2) if mean else None,
+        "small_partitions": sum(1 for p in partitions.values() if p["bytes"] < SMALL_FILE_BYTES),
+        "largest": sorted(partitions.values(), key=lambda p: -p["rows"])[:10],
+    }
+
+
+def move_file(con, path, target):
+    if target.startswith("s3://"):
+        bucket, key = split_s3_path(path)
+        s3_client(con).copy({"Bucket": bucket, "Key": key}, *split_s3_path(target))
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.rename(path, target)
+
+
+# Repartitionnement hive en deux passes, toutes deux en streaming :
+# 1. COPY ... PARTITION_BY vers un répertoire intermédiaire (écritures vidées au fil de l'eau, quelques fichiers par partition)
+# 2. par partition : fichier unique déjà à la bonne taille déplacé tel quel, sinon réécrit en fichiers de
+#    ~target_file_size_mb (grosse partition découpée, petits fichiers regroupés, tri éventuel)
+def repartition(con, job, spec):
+    if set(spec.sort_by or []) & set(spec.partition_by):
+        raise RewriteError("sort_by cannot include a partition column (its value is constant within a partition)")
+
+    def write(con, files, root, target, rewrite_id):
+        paths = [f["path"] for f in files]
+        columns = ", ".join(quote_ident(c) for c in spec.partition_by)
+        partitions = con.execute(f"SELECT COUNT(*) FROM (SELECT DISTINCT {columns} FROM {read_source(paths, True)})").fetchone()[0]
+        if partitions > spec.max_partitions:
+            raise RewriteError(f"{', '.join(spec.partition_by)} gives {partitions} partitions (max_partitions {spec.max_partitions})")
+        check_cancel(job)
+
+        raw = staging_dir(target, rewrite_id, "partitioned")
+        try:
+            make_parent_dirs(raw)
+            options = copy_options(spec) + [f"PARTITION_BY ({columns})"]
+            con.execute(f"COPY (SELECT * FROM {read_source(paths, True)}) TO '{raw}' ({', '.join(options)})")
+            check_cancel(job)
+
+            target_bytes = spec.target_file_size_mb * 1024 * 1024
+            groups = {}
+            for f in list_dataset(con, f"{raw}/**/*.parquet"):
+                groups.setdefault(relative_dir(raw, f["path"]), []).append(f)
+            actions = {"moved": 0, "split": 0, "coalesced": 0, "sorted": 0}
+            for rel, raw_files in sorted(groups.items()):
+                check_cancel(job)
+                size = sum(f["size"] for f in raw_files)
+                if len(raw_files) == 1 and size <= target_bytes and not spec.sort_by:
+                    move_file(con, raw_files[0]["path"], f"{join_path(target, rel)}/part-{rewrite_id}_0.parquet")
+                    actions["moved"] += 1
+                    continue
+                write_files(con, [f["path"] for f in raw_files], join_path(target, rel), spec, f"part-{rewrite_id}")
+                action = "split" if size > target_bytes else "coalesced" if len(raw_files) > 1 else "sorted"
+                actions[action] += 1
+        finally:
+            remove_tree(con, raw)
+
+        return {
+            "partition_by": spec.partition_by,
+            "partitions": partitions,
+            "partition_actions": actions,
+            "skew": partition_skew(con, target, list_dataset(con, f"{target}/**/*.parquet")),
+        }
+
+    return run_rewrite(con, job, spec, write, partition_columns=spec.partition_by)
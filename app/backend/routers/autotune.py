@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Request, HTTPException
+from models.models import AutotuneRequest
+from sql_fingerprint import fingerprint_sql
+from routers.query import pinnable
+from thread_tuning import sweep_threads, default_thread_counts
+from admission import Saturated
+import os, time
+
+router = APIRouter()
+
+
+# Courbe de speedup par nombre de threads (instances dédiées, pas de SET threads global)
+# remember : le nombre retenu est appliqué aux prochains /query de même empreinte sans num_threads
+@router.post("/query/autotune")
+def autotune_query(req: AutotuneRequest, request: Request):
+    pinned = request.app.state.pinned
+    query = req.query.strip().rstrip(';')
+    thread_counts = req.thread_counts or default_thread_counts(pinned.max_threads or os.cpu_count() or 1)
+    if req.repetitions < 1 or req.warmup < 0:
+        raise HTTPException(400, "repetitions must be >= 1 and warmup >= 0")
+    if not pinnable(query):
+        raise HTTPException(400, "Autotune only supports queries on parquet files: thread-pinned instances do not see the shared database's tables")
+
+    start_time = time.time()
+    try:
+        # Un slot d'analyse pour tout le balayage (les runs sont séquentiels)
+        with request.app.state.admission.slot("analysis"):
+            result = sweep_threads(pinned, query, thread_counts, req.warmup, req.repetitions)
+    except Saturated:
+        raise
+    except Exception as e:
+        print(f"❌ Autotune failed: {e}")
+        raise HTTPException(400, str(e))
+
+    fingerprint, normalized = fingerprint_sql(query)
+    if req.remember:
+        request.app.state.thread_tuning.put(fingerprint, normalized, result)
+    print(f"🎯 Autotune: best {result['best_threads']} threads, recommended {result['recommended_threads']}")
+    return {
+        **result,
+        "fingerprint": fingerprint,
+        "remembered": req.remember,
+        "hostname": os.uname().nodename,
+        "execution_time": time.time() - start_time,
+    }
+
+
+@router.get("/query/autotune")
+def list_tuned_queries(request: Request, limit: int = 50):
+    return {"hostname": os.uname().nodename, "tuned": request.app.state.thread_tuning.list(limit)}
+
+
+@router.delete("/query/autotune/{fingerprint}")
+def forget_tuned_query(fingerprint: str, request: Request):
+    if not request.app.state.thread_tuning.forget(fingerprint):
+        raise HTTPException(404, f"No tuned setting for fingerprint {fingerprint}")
+    return {"fingerprint": fingerprint, "forgotten": True}
@@ -0,0 +1,115 @@
+from fastapi import APIRouter, Request, HTTPException
+from models.models import DistributedQueryRequest, FragmentRequest
+from distributed import plan_query, aggregate_functions, list_source, scatter, cluster_nodes, partials_select, NotDistributable, FragmentFailed, PARTIALS_TABLE
+from routers.query import sanitize_row, stream_arrow, once, ClosingStreamingResponse, ARROW_BATCH_SIZE, ARROW_STREAM_MEDIA_TYPE
+from metrics import observe_bytes
+import os, time
+
+router = APIRouter()
+
+
+# Coordinateur scatter-gather : fragments par noeud (fichiers répartis), fusion locale des partiels
+@router.post("/distributed_query")
+def distributed_query(req: DistributedQueryRequest, request: Request):
+    hostname = os.uname().nodename
+    start_time = time.time()
+    nodes = cluster_nodes()
+    pool = request.app.state.pool
+
+    try:
+        with pool.cursor() as con:
+            aggregates = aggregate_functions(con)
+        plan = plan_query(req.query.strip().rstrip(';'), req.max_rows, aggregates)
+    except NotDistributable as e:
+        raise HTTPException(400, f"Query cannot be distributed: {e}")
+    except Exception as e:
+        raise HTTPException(400, str(e))
+
+    print(f"🌐 Distributed query over {len(nodes)} node(s): {req.query.strip()}")
+
+    try:
+        with pool.cursor() as con:
+            files = list_source(con, plan)
+        partials, fragments = scatter(plan, files, nodes)
+
+        gather_start = time.time()
+        with pool.cursor() as con:
+            # Table temporaire plutôt qu'un scan Arrow : les filtres dynamiques (Top-N) n'y sont pas poussés
+            con.register("partials_arrow", partials)
+            try:
+                con.execute(f"CREATE OR REPLACE TEMP TABLE {PARTIALS_TABLE} AS SELECT {partials_select(partials.schema)} FROM partials_arrow")
+                result = con.execute(plan.final.sql(dialect="duckdb")).fetchall()
+                columns = [desc[0] for desc in con.description]
+            finally:
+                con.unregister("partials_arrow")
+                con.execute(f"DROP TABLE IF EXISTS {PARTIALS_TABLE}")
+    except NotDistributable as e:
+        raise HTTPException(400, f"Query cannot be distributed: {e}")
+    except FragmentFailed as e:
+        raise HTTPException(502, str(e))
+    except Exception as e:
+        print(f"❌ Distributed query failed: {e}")
+        raise HTTPException(400, str(e))
+
+    exec_time = time.time() - start_time
+    print(f"🌐 Merged {partials.num_rows} partial rows from {len(fragments)} fragment(s) in {exec_time:.4f} seconds")
+
+    return {
+        "columns": columns,
+        "rows": [sanitize_row(row) for row in result],
+        "hostname": hostname,
+        "execution_time": exec_time,
+        "distributed": {
+            "source": plan.source,
+            "files": len(files),
+            "bytes": sum(f["size"] for f in files),
+            "partial_rows": partials.num_rows,
+            "merge_time": round(time.time() - gather_start, 4),
+            "fragments": fragments,
+            **plan.describe(),
+        }
+    }
+
+
+# Fragment exécuté pour un coordinateur : résultat complet (sans LIMIT ajouté) en Arrow IPC
+@router.post("/distributed/fragment")
+def run_fragment(req: FragmentRequest, request: Request):
+    pool = request.app.state.pool
+    admission = request.app.state.admission
+    hostname = os.uname().nodename
+    start_time = time.time()
+
+    # Fragment = partie d'une requête interactive : même priorité que /query (429 -> rejoué sur un autre noeud)
+    admission.acquire("interactive")
+
+    window = None
+
+    @once
+    def release(rows=None, size=None):
+        if window:
+            window.close()
+        pool.release(con)
+        admission.release(time.time() - start_time)
+        if size is not None:
+            observe_bytes("/distributed/fragment", "arrow", size)
+
+    try:
+        con = pool.acquire()
+    except Exception:
+        admission.release()
+        raise
+    try:
+        window = request.app.state.io.begin(con)
+        reader = con.execute(req.query).fetch_record_batch(ARROW_BATCH_SIZE)
+    except Exception as e:
+        release()
+        print(f"❌ Fragment failed: {e}")
+        raise HTTPException(400, str(e))
+
+    exec_time = time.time() - start_time
+    return ClosingStreamingResponse(
+        stream_arrow(reader, release),
+        release,
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"X-Hostname": hostname, "X-Execution-Time": f"{exec_time:.6f}"}
+    )
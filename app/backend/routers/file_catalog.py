@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Request, Depends
+from models.models import S3PathRequest
+from cursor_pool import pooled_cursor
+from file_stats import stat_files, invalidate
+import time
+
+router = APIRouter()
+
+
+@router.get("/file_catalog")
+def list_file_catalog(request: Request):
+    catalog = request.app.state.file_catalog
+    return {"stats": catalog.stats(), "prefixes": catalog.entries()}
+
+
+# Listing relu sur S3 et remis en cache (après une écriture externe, sans attendre le TTL)
+@router.post("/file_catalog/refresh")
+def refresh_file_catalog(req: S3PathRequest, request: Request, con=Depends(pooled_cursor)):
+    if not req.s3_path.startswith("s3://"):
+        raise HTTPException(400, "The file catalog only caches s3:// listings")
+    try:
+        start = time.time()
+        files = stat_files(con, req.s3_path, fresh=True)
+        return {"s3_path": req.s3_path, "files": len(files), "bytes": sum(f["size"] for f in files), "list_time": round(time.time() - start, 4)}
+    except Exception as e:
+        raise HTTPException(400, str(e))
+
+
+@router.delete("/file_catalog")
+def invalidate_file_catalog(s3_path: str, request: Request):
+    invalidate(s3_path)
+    return {"s3_path": s3_path, "invalidated": True}
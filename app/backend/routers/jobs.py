@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse
+from models.models import JobRequest
+from jobs import JobNotFound, JobQueueFull
+from routers.query import sanitize_row
+import os
+
+router = APIRouter()
+
+
+@router.post("/jobs", status_code=202)
+def submit_job(req: JobRequest, request: Request):
+    try:
+        job = request.app.state.jobs.submit(req.query.strip().rstrip(';'))
+    except JobQueueFull as e:
+        return JSONResponse(status_code=429, content={"detail": str(e)}, headers={"Retry-After": "5"})
+    print(f"📮 Job {job.job_id} queued")
+    return {"job_id": job.job_id, "status": job.status, "hostname": os.uname().nodename}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    try:
+        return request.app.state.jobs.get(job_id).info()
+    except JobNotFound as e:
+        raise HTTPException(404, str(e))
+
+
+# Pages de résultat : tranche offset / limit de la table Arrow du job
+@router.get("/jobs/{job_id}/results")
+def get_job_results(job_id: str, request: Request, offset: int = 0, limit: int = 100):
+    try:
+        job = request.app.state.jobs.get(job_id)
+    except JobNotFound as e:
+        raise HTTPException(404, str(e))
+    if job.status != "succeeded":
+        raise HTTPException(409, f"Job {job_id} is {job.status}" + (f": {job.error}" if job.error else ""))
+    if job.result is None:
+        raise HTTPException(409, f"Job {job_id} ({job.kind}) has no tabular result, see its report")
+
+    offset, limit = max(offset, 0), max(limit, 0)
+    page = job.result.slice(offset, limit)
+    # Colonne par colonne : to_pylist() en dicts écraserait les colonnes de même nom
+    rows = [sanitize_row(row) for row in zip(*(col.to_pylist() for col in page.columns))]
+    return {
+        "job_id": job_id,
+        "columns": job.result.column_names,
+        "rows": rows,
+        "offset": offset,
+        "total_rows": job.result.num_rows,
+        "has_more": offset + len(rows) < job.result.num_rows,
+    }
+
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str, request: Request):
+    try:
+        job = request.app.state.jobs.delete(job_id)
+    except JobNotFound as e:
+        raise HTTPException(404, str(e))
+    return {"job_id": job_id, "status": job.status, "cancel_requested": job.cancel_requested}
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,124 +1,158 @@
-from fastapi import APIRouter, HTTPException, Request
-from models.models import S3PathRequest, SuggestPartitionRequest, PartitionValueCountRequest
-import os, psutil, re, json
+from fastapi import APIRouter, HTTPException, Request, Depends
+from models.models import S3PathRequest, SuggestPartitionRequest, PartitionValueCountRequest, FilterabilityRequest, BloomProbeRequest
+from cursor_pool import pooled_cursor
+from metadata_cache import register_metadata, parquet_source
+from io_stats import request_io
+from profiler import profile_columns
+from bloom_probe import probe_bloom_filters
+from sampling import sample_source, estimate_profile, complete_sample_info, proportion_bounds
+from routers.query import sanitize_value
+import re, math
 from urllib.parse import unquote
 
 router = APIRouter()
 
 
 @router.post("/check_parquet_file_size")
-def check_parquet_size(req: S3PathRequest, request: Request):
-    con = request.app.state.con
-    cpu_count = psutil.cpu_count(logical=True)
+def check_parquet_size(req: S3PathRequest, request: Request, con=Depends(pooled_cursor)):
+    # Threads DuckDB effectifs (quota CPU du conteneur), pas les coeurs de l'hôte
+    cpu_count = request.app.state.duckdb_budget["threads"]
 
     try:
-        query = f"""
-            SELECT 
-                file_name,
-                COUNT(DISTINCT row_group_id) AS row_group_count,
-                SUM(row_group_num_rows) AS total_rows,
-                ROUND(SUM(total_compressed_size) / 1024.0 / 1024.0, 2) AS compressed_file_size_mb,
-                ROUND(SUM(total_uncompressed_size) / 1024.0 / 1024.0, 2) AS uncompressed_file_size_mb,
-                CASE
-                    WHEN ROUND(SUM(total_compressed_size) / 1024.0 / 1024.0, 2) < 100 THEN 'Too small ❌'
-                    WHEN ROUND(SUM(total_compressed_size) / 1024.0 / 1024.0, 2) > 10240 THEN 'Too big ⚠️'
-                    ELSE 'Optimal ✅'
-                END AS quality
-            FROM parquet_metadata('{req.s3_path}')
-            GROUP BY file_name
-            ORDER BY compressed_file_size_mb DESC
-        """
-        result = con.execute(query).fetchall()
-        columns = [desc[0] for desc in con.description]
-        total_row_groups = sum(row[columns.index("row_group_count")] for row in result)
-
-        files = []
-        for row in result:
-            file_data = dict(zip(columns, row))
-            rg_count = file_data["row_group_count"]
-
-            file_data["parallelism_quality"] = (
-                "✅ Optimal" if rg_count == cpu_count else
-                "❌ Underutilized" if rg_count < cpu_count else
-                "⚠️ Overhead Risk"
-            )
-
-            files.append(file_data)
+        with register_metadata(request, con, req.s3_path):
+            query = f"""
+                SELECT 
+                    file_name,
+                    COUNT(DISTINCT row_group_id) AS row_group_count,
+                    SUM(row_group_num_rows) AS total_rows,
+                    ROUND(SUM(total_compressed_size) / 1024.0 / 1024.0, 2) AS compressed_file_size_mb,
+                    ROUND(SUM(total_uncompressed_size) / 1024.0 / 1024.0, 2) AS uncompressed_file_size_mb,
+                    CASE
+                        WHEN ROUND(SUM(total_compressed_size) / 1024.0 / 1024.0, 2) < 100 THEN 'Too small ❌'
+                        WHEN ROUND(SUM(total_compressed_size) / 1024.0 / 1024.0, 2) > 10240 THEN 'Too big ⚠️'
+                        ELSE 'Optimal ✅'
+                    END AS quality
+                FROM parquet_meta
+                GROUP BY file_name
+                ORDER BY compressed_file_size_mb DESC
+            """
+            result = con.execute(query).fetchall()
+            columns = [desc[0] for desc in con.description]
+            total_row_groups = sum(row[columns.index("row_group_count")] for row in result)
+
+            files = []
+            for row in result:
+                file_data = dict(zip(columns, row))
+                rg_count = file_data["row_group_count"]
+
+                file_data["parallelism_quality"] = (
+                    "✅ Optimal" if rg_count == cpu_count else
+                    "❌ Underutilized" if rg_count < cpu_count else
+                    "⚠️ Overhead Risk"
+                )
 
-        return {
-            "s3_path": req.s3_path,
-            "total_row_groups": total_row_groups,
-            "cpu_count": cpu_count,
-            "files": files
-        }
+                files.append(file_data)
+
+            return {
+                "s3_path": req.s3_path,
+                "total_row_groups": total_row_groups,
+                "cpu_count": cpu_count,
+                "files": files,
+                "metadata_cache": request.app.state.metadata_cache.stats(),
+                "io": request_io(request)
+            }
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/check_parquet_row_group_size")
-def check_row_group_size(req: S3PathRequest, request: Request):
-    con = request.app.state.con
+def check_row_group_size(req: S3PathRequest, request: Request, con=Depends(pooled_cursor)):
 
     try:
-        query = f"""
-            SELECT 
-                file_name,
-                row_group_id,
-                row_group_num_rows,
-                ROUND(row_group_bytes / 1024.0, 2) AS size_kb,
-                CASE
-                    WHEN row_group_num_rows < 5000 THEN 'Very small ❌'
-                    WHEN row_group_num_rows < 20000 THEN 'Suboptimal ⚠️'
-                    WHEN row_group_num_rows BETWEEN 100000 AND 1000000  THEN 'Optimal ✅'
-                    WHEN row_group_num_rows >= 1000000 THEN 'Too high ⚠️'
-                    ELSE 'okay'
-                END AS quality
-            FROM parquet_metadata('{req.s3_path}')
-            GROUP BY file_name, row_group_id, row_group_num_rows, row_group_bytes
-            ORDER BY size_kb DESC
-        """
-        rows = con.execute(query).fetchall()
-        columns = [desc[0] for desc in con.description]
-        return {
-            "s3_path": req.s3_path,
-            "row_groups": [dict(zip(columns, row)) for row in rows]
-        }
+        with register_metadata(request, con, req.s3_path):
+            query = f"""
+                SELECT 
+                    file_name,
+                    row_group_id,
+                    row_group_num_rows,
+                    ROUND(row_group_bytes / 1024.0, 2) AS size_kb,
+                    CASE
+                        WHEN row_group_num_rows < 5000 THEN 'Very small ❌'
+                        WHEN row_group_num_rows < 20000 THEN 'Suboptimal ⚠️'
+                        WHEN row_group_num_rows BETWEEN 100000 AND 1000000  THEN 'Optimal ✅'
+                        WHEN row_group_num_rows >= 1000000 THEN 'Too high ⚠️'
+                        ELSE 'okay'
+                    END AS quality
+                FROM parquet_meta
+                GROUP BY file_name, row_group_id, row_group_num_rows, row_group_bytes
+                ORDER BY size_kb DESC
+            """
+            rows = con.execute(query).fetchall()
+            columns = [desc[0] for desc in con.description]
+            return {
+                "s3_path": req.s3_path,
+                "row_groups": [dict(zip(columns, row)) for row in rows],
+                "metadata_cache": request.app.state.metadata_cache.stats(),
+                "io": request_io(request)
+            }
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def profile_summary(profile):
+    return {k: profile[k] for k in ("total_rows", "scans", "scan_time", "bytes_read", "sketches") if k in profile}
+
+
+# Profil exact sur parquet_data, fusion des sketches par fichier si req.use_sketches,
+# ou estimé sur un échantillon si req.sample est fourni
+def profile_dataset(request, con, req, column_names):
+    with register_metadata(request, con, req.s3_path):
+        io = request.app.state.io
+        if req.use_sketches:
+            return request.app.state.sketches.profile(con, req.s3_path, column_names, io=io), None
+
+        if req.sample is None:
+            return profile_columns(con, "parquet_data", column_names, io=io), None
+
+        source, sample_info = sample_source(con, req.sample)
+        profile = profile_columns(con, source, column_names, io=io)
+        return profile, estimate_profile(profile, sample_info)
+
+
+def estimate_bounds(stats):
+    keys = ("distinct_values_bounds", "top_value_ratio_bounds", "null_ratio_bounds", "heavy_hitters")
+    return {k: stats[k] for k in keys if k in stats}
+
+
 def extract_partition_columns_from_path(s3_path: str) -> set:
     decoded_path = unquote(s3_path)
     return set(re.findall(r'/([^/=]+)=', decoded_path))
 
 
 @router.post("/suggest_partitions")
-def suggest_partitions(req: SuggestPartitionRequest, request: Request):
-    con = request.app.state.con
-
+def suggest_partitions(req: SuggestPartitionRequest, request: Request, con=Depends(pooled_cursor)):
     try:
-        con.execute(f"CREATE OR REPLACE VIEW parquet_data AS SELECT * FROM parquet_scan('{req.s3_path}');")
+        con.execute(f"CREATE OR REPLACE TEMP VIEW parquet_data AS SELECT * FROM {parquet_source(con, req.s3_path)};")
         existing_partitions = extract_partition_columns_from_path(req.s3_path)
         columns = con.execute("PRAGMA table_info(parquet_data);").fetchall()
         column_names = [col[1] for col in columns]
 
+        # Profil de toutes les colonnes en un scan (par lot)
+        profile, sample_info = profile_dataset(request, con, req, column_names)
+
         suggestions = []
         result = []
 
         for col_name in column_names:
             already_partitioned = col_name in existing_partitions
             try:
-                cardinality = con.execute(f"SELECT COUNT(DISTINCT {col_name}) FROM parquet_data;").fetchone()[0]
-                top_val_ratio = con.execute(f"""
-                    SELECT MAX(cnt) * 1.0 / SUM(cnt)
-                    FROM (
-                        SELECT COUNT(*) as cnt
-                        FROM parquet_data
-                        GROUP BY {col_name}
-                    );
-                """).fetchone()[0]
+                stats = profile["columns"][col_name]
+                if "error" in stats:
+                    raise ValueError(stats["error"])
+                cardinality = stats["distinct_values"]
+                top_val_ratio = stats["top_value_ratio"]
                 is_balanced = top_val_ratio < 0.7
 
                 if already_partitioned:
@@ -135,6 +169,10 @@ def suggest_partitions(req: SuggestPartitionRequest, request: Request):
                     "column": col_name,
                     "distinct_values": cardinality,
                     "top_value_ratio": round(top_val_ratio, 2),
+                    "null_ratio": round(stats["null_ratio"], 4),
+                    "min": sanitize_value(stats["min"]),
+                    "max": sanitize_value(stats["max"]),
+                    **estimate_bounds(stats),
                     "balanced": is_balanced,
                     "suggest": suggest,
                     "already_partitioned": already_partitioned
@@ -155,7 +193,12 @@ def suggest_partitions(req: SuggestPartitionRequest, request: Request):
             "threshold": req.threshold,
             "already_partitioned_columns": list(existing_partitions),
             "columns": result,
-            "suggested_partitions": suggestions
+            "suggested_partitions": suggestions,
+            "profile": profile_summary(profile),
+            "sample": sample_info,
+            "sketch_store": request.app.state.sketches.stats() if req.use_sketches else None,
+            "metadata_cache": request.app.state.metadata_cache.stats(),
+            "io": request_io(request)
         }
 
     except Exception as e:
@@ -163,14 +206,18 @@ def suggest_partitions(req: SuggestPartitionRequest, request: Request):
 
 
 @router.post("/partition_value_counts")
-def get_partition_value_counts(req: PartitionValueCountRequest, request: Request):
-    con = request.app.state.con
-
+def get_partition_value_counts(req: PartitionValueCountRequest, request: Request, con=Depends(pooled_cursor)):
     try:
-        con.execute(f"CREATE OR REPLACE VIEW parquet_data AS SELECT * FROM parquet_scan('{req.s3_path}');")
+        sample_info = None
+        source = "parquet_data"
+        con.execute(f"CREATE OR REPLACE TEMP VIEW parquet_data AS SELECT * FROM {parquet_source(con, req.s3_path)};")
+        if req.sample is not None:
+            with register_metadata(request, con, req.s3_path):
+                source, sample_info = sample_source(con, req.sample)
+
         rows = con.execute(f"""
             SELECT {req.column} AS value, COUNT(*) AS count 
-            FROM parquet_data 
+            FROM {source} 
             GROUP BY {req.column}
             ORDER BY count DESC
         """).fetchall()
@@ -180,48 +227,53 @@ def get_partition_value_counts(req: PartitionValueCountRequest, request: Request
             {"value": r[0], "count": r[1], "repartion": f"{round(r[1] / sum_count * 100)}%"}
             for r in rows
         ]
-        return {"counts": result}
+
+        # Échantillon : comptes extrapolés au dataset, avec intervalle à 95%
+        if sample_info is not None:
+            complete_sample_info(sample_info, sum_count)
+            total = sample_info["total_rows"]
+            for r in result:
+                share = r["count"] / sum_count
+                low, high = (share, share) if sample_info["exact"] else proportion_bounds(share, sum_count)
+                r["sampled_count"] = r["count"]
+                r["count"] = round(share * total)
+                r["count_bounds"] = [math.floor(low * total), math.ceil(high * total)]
+            return {"counts": result, "sample": sample_info, "io": request_io(request)}
+
+        return {"counts": result, "io": request_io(request)}
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/parquet_filterability_score")
-def parquet_filterability_score(req: S3PathRequest, request: Request):
-    con = request.app.state.con
-
+def parquet_filterability_score(req: FilterabilityRequest, request: Request, con=Depends(pooled_cursor)):
     try:
         s3_path = req.s3_path
-        con.execute(f"CREATE OR REPLACE VIEW parquet_data AS SELECT * FROM parquet_scan('{s3_path}')")
+        con.execute(f"CREATE OR REPLACE TEMP VIEW parquet_data AS SELECT * FROM {parquet_source(con, s3_path)}")
 
-        # 1. Cardinality and top value ratio
+        # 1. Cardinality and top value ratio (un scan par lot de colonnes)
         cols = con.execute("PRAGMA table_info(parquet_data);").fetchall()
         col_names = [col[1] for col in cols]
 
+        profile, sample_info = profile_dataset(request, con, req, col_names)
+
         results = []
         for col in col_names:
-            try:
-                distinct_count = con.execute(f"SELECT COUNT(DISTINCT {col}) FROM parquet_data").fetchone()[0]
-                top_val_ratio = con.execute(f"""
-                    SELECT MAX(cnt) * 1.0 / SUM(cnt)
-                    FROM (
-                        SELECT COUNT(*) AS cnt
-                        FROM parquet_data
-                        GROUP BY {col}
-                    )
-                """).fetchone()[0] or 0.0
-
+            stats = profile["columns"][col]
+            if "error" in stats:
                 results.append({
                     "column": col,
-                    "distinct_values": distinct_count,
-                    "top_value_ratio": round(top_val_ratio, 2),
+                    "distinct_values": None,
+                    "top_value_ratio": None,
                 })
-
-            except Exception:
+            else:
                 results.append({
                     "column": col,
-                    "distinct_values": None,
-                    "top_value_ratio": None,
+                    "distinct_values": stats["distinct_values"],
+                    "top_value_ratio": round(stats["top_value_ratio"], 2),
+                    "null_ratio": round(stats["null_ratio"], 4),
+                    **estimate_bounds(stats),
                 })
 
         # 2. Bloom filter metadata (corrigée)
@@ -250,7 +302,7 @@ def parquet_filterability_score(req: S3PathRequest, request: Request):
                     ELSE 0 
                 END) * 100.0 / COUNT(*), 1) AS bloom_coverage
 
-            FROM parquet_metadata('{s3_path}')
+            FROM parquet_meta
             WHERE path_in_schema IS NOT NULL
             GROUP BY path_in_schema
         """).fetchall()
@@ -296,7 +348,12 @@ def parquet_filterability_score(req: S3PathRequest, request: Request):
 
         return {
             "s3_path": s3_path,
-            "columns": results
+            "columns": results,
+            "profile": profile_summary(profile),
+            "sample": sample_info,
+            "sketch_store": request.app.state.sketches.stats() if req.use_sketches else None,
+            "metadata_cache": request.app.state.metadata_cache.stats(),
+            "io": request_io(request)
         }
 
     except Exception as e:
@@ -304,77 +361,100 @@ def parquet_filterability_score(req: S3PathRequest, request: Request):
 
 
 @router.post("/parquet_bloom_filter_check")
-def check_bloom_filter(req: S3PathRequest, request: Request):
-    con = request.app.state.con
+def check_bloom_filter(req: S3PathRequest, request: Request, con=Depends(pooled_cursor)):
 
     try:
-        query = f"""
-                SELECT 
-                    file_name,
-                    row_group_id,
-                    path_in_schema AS column,
-                    bloom_filter_offset IS NOT NULL AND bloom_filter_length > 0 AS has_bloom_filter,
-                    bloom_filter_offset,
-                    bloom_filter_length,
-                    CASE 
-                        WHEN bloom_filter_offset IS NOT NULL THEN 
-                            CASE 
-                                WHEN bloom_filter_length > 0 THEN '✅ Present'
-                                ELSE '⚠️ Declared but empty'
-                            END
-                        ELSE '❌ Absent'
-                    END AS status
-                FROM parquet_metadata('{req.s3_path}')
-                WHERE path_in_schema IS NOT NULL
-                ORDER BY file_name, path_in_schema;
-        """
-
-        rows = con.execute(query).fetchall()
-        columns = [desc[0] for desc in con.description]
-
-        # Regroup by file/column
-        grouped = {}
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-            file = row_dict["file_name"]
-            col = row_dict["column"]
-            status = row_dict["status"]
-
-            grouped.setdefault((file, col), []).append(status)
-
-        summary = []
-        for (file, col), statuses in grouped.items():
-            present_ratio = statuses.count("✅ Present") / len(statuses)
-            summary.append({
-                "file": file,
-                "column": col,
-                "num_row_groups": len(statuses),
-                "num_with_bloom": statuses.count("✅ Present"),
-                "num_declared_but_empty": statuses.count("⚠️ Declared but empty"),
-                "num_absent": statuses.count("❌ Absent"),
-                "presence_ratio": round(statuses.count("✅ Present") * 100 / len(statuses), 1),
-                "declared_but_empty_ratio": round(statuses.count("⚠️ Declared but empty") * 100 / len(statuses), 1),
-                "status": (
-                    "✅ Fully Present" if statuses.count("✅ Present") == len(statuses) else
-                    "⚠️ Some Empty" if statuses.count("⚠️ Declared but empty") > 0 and statuses.count("✅ Present") > 0 else
-                    "⚠️ Declared but Empty" if statuses.count("⚠️ Declared but empty") == len(statuses) else
-                    "❌ Absent"
-                )
-            })
+        with register_metadata(request, con, req.s3_path):
+            query = f"""
+                    SELECT 
+                        file_name,
+                        row_group_id,
+                        path_in_schema AS column,
+                        bloom_filter_offset IS NOT NULL AND bloom_filter_length > 0 AS has_bloom_filter,
+                        bloom_filter_offset,
+                        bloom_filter_length,
+                        CASE 
+                            WHEN bloom_filter_offset IS NOT NULL THEN 
+                                CASE 
+                                    WHEN bloom_filter_length > 0 THEN '✅ Present'
+                                    ELSE '⚠️ Declared but empty'
+                                END
+                            ELSE '❌ Absent'
+                        END AS status
+                    FROM parquet_meta
+                    WHERE path_in_schema IS NOT NULL
+                    ORDER BY file_name, path_in_schema;
+            """
+
+            rows = con.execute(query).fetchall()
+            columns = [desc[0] for desc in con.description]
+
+            # Regroup by file/column
+            grouped = {}
+            for row in rows:
+                row_dict = dict(zip(columns, row))
+                file = row_dict["file_name"]
+                col = row_dict["column"]
+                status = row_dict["status"]
+
+                grouped.setdefault((file, col), []).append(status)
+
+            summary = []
+            for (file, col), statuses in grouped.items():
+                present_ratio = statuses.count("✅ Present") / len(statuses)
+                summary.append({
+                    "file": file,
+                    "column": col,
+                    "num_row_groups": len(statuses),
+                    "num_with_bloom": statuses.count("✅ Present"),
+                    "num_declared_but_empty": statuses.count("⚠️ Declared but empty"),
+                    "num_absent": statuses.count("❌ Absent"),
+                    "presence_ratio": round(statuses.count("✅ Present") * 100 / len(statuses), 1),
+                    "declared_but_empty_ratio": round(statuses.count("⚠️ Declared but empty") * 100 / len(statuses), 1),
+                    "status": (
+                        "✅ Fully Present" if statuses.count("✅ Present") == len(statuses) else
+                        "⚠️ Some Empty" if statuses.count("⚠️ Declared but empty") > 0 and statuses.count("✅ Present") > 0 else
+                        "⚠️ Declared but Empty" if statuses.count("⚠️ Declared but empty") == len(statuses) else
+                        "❌ Absent"
+                    )
+                })
 
 
-        return {
-            "s3_path": req.s3_path,
-            "columns": summary
-        }
+            return {
+                "s3_path": req.s3_path,
+                "columns": summary,
+                "metadata_cache": request.app.state.metadata_cache.stats(),
+                "io": request_io(request)
+            }
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Efficacité mesurée des bloom filters : lookups ponctuels, row groups écartés et gains par rapport au seul min/max
+@router.post("/parquet_bloom_filter_probe")
+def probe_bloom_filter(req: BloomProbeRequest, request: Request, con=Depends(pooled_cursor)):
+    if req.values_per_column < 1 or req.repetitions < 1:
+        raise HTTPException(400, "values_per_column and repetitions must be >= 1")
+
+    try:
+        with register_metadata(request, con, req.s3_path):
+            paths = [row[0] for row in con.execute("SELECT DISTINCT file_name FROM parquet_meta ORDER BY file_name").fetchall()]
+            result = probe_bloom_filters(con, paths, req.columns, req.values_per_column, req.repetitions, req.seed)
+            return {
+                "s3_path": req.s3_path,
+                "files": len(paths),
+                **result,
+                "metadata_cache": request.app.state.metadata_cache.stats(),
+                "io": request_io(request)
+            }
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/s3_test")
-def test_s3_connection(request: Request):
-    con = request.app.state.con
+def test_s3_connection(request: Request, con=Depends(pooled_cursor)):
     try:
         con.execute("SELECT * FROM list('s3://your-bucket/') LIMIT 1;")
         return {"s3": "ok"}
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Request, HTTPException
+import os
+
+router = APIRouter()
+
+
+# Profils stockés sur ce noeud (profiling=true sur /query), regroupés par empreinte
+@router.get("/profiles")
+def list_profiles(request: Request, limit: int = 50):
+    return {"hostname": os.uname().nodename, "fingerprints": request.app.state.profiles.fingerprints(limit)}
+
+
+@router.get("/profiles/{fingerprint}")
+def get_profile_history(fingerprint: str, request: Request, limit: int = 20):
+    runs, comparison = request.app.state.profiles.history(fingerprint, limit)
+    if not runs:
+        raise HTTPException(404, f"No profile for fingerprint {fingerprint} on this node")
+    return {"hostname": os.uname().nodename, "fingerprint": fingerprint, "runs": runs, "comparison": comparison}
+
+
+@router.get("/profiles/{fingerprint}/{profile_id}")
+def get_profile_tree(fingerprint: str, profile_id: int, request: Request):
+    tree = request.app.state.profiles.tree(fingerprint, profile_id)
+    if tree is None:
+        raise HTTPException(404, f"Profile {profile_id} not found for fingerprint {fingerprint} on this node")
+    return {"hostname": os.uname().nodename, "fingerprint": fingerprint, "profile_id": profile_id, "profiling": tree}
@@ -1,11 +1,29 @@
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from models.models import SQLRequest
-import os, json, time, re, uuid, math
+from cursor_store import CursorNotFound
+from admission import Saturated
+from result_cache import cache_plan, source_fingerprint
+from metrics import observe_query, observe_bytes
+from query_profiles import capture_profile, summarize_profile
+from sql_fingerprint import fingerprint_sql, parse_sql, reads_parquet_only
+from pruning import expand_globs, parquet_scans
+from file_stats import invalidate
+import os, io, json, time, re, math, threading
+import anyio
+import duckdb
+import pyarrow as pa
 from decimal import Decimal
 from datetime import datetime, date
 
 router = APIRouter()
 
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_BATCH_SIZE = int(os.getenv("ARROW_BATCH_SIZE", "122880"))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH_SIZE = int(os.getenv("NDJSON_BATCH_SIZE", "1000"))
+
 # 🔧 Fonction de sanitation de chaque valeur
 def sanitize_value(val):
     if val is None:
@@ -25,89 +43,377 @@ def sanitize_value(val):
 def sanitize_row(row):
     return [sanitize_value(col) for col in row]
 
+# Appels suivants ignorés : le nettoyage d'un flux peut venir du générateur comme de la réponse
+def once(fn):
+    done = threading.Lock()
+
+    def wrapper(*args, **kwargs):
+        if done.acquire(blocking=False):
+            fn(*args, **kwargs)
+    return wrapper
+
+class ClosingStreamingResponse(StreamingResponse):
+    # on_close (idempotent, cf. once) appelé quelle que soit l'issue de la réponse : le finally d'un générateur
+    # jamais itéré (client parti avant le premier chunk, échec de http.response.start) ne s'exécute pas
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.content = content
+        self.on_close = on_close
+
+    def close(self):
+        # Générateur entamé : son finally appelle on_close avec les lignes envoyées
+        self.content.close()
+        self.on_close()
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self.close)
+
+def wants_arrow(request: Request):
+    return ARROW_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+
+def wants_ndjson(request: Request):
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+# 🔧 Stream NDJSON : une ligne d'en-tête (colonnes) puis une ligne par row, envoyées au fil du fetchmany
+# on_close(rows, size) : lignes et octets envoyés, appelé en fin de flux (ou à l'abandon)
+def stream_ndjson(con, columns, max_rows, on_close):
+    sent = 0
+    size = 0
+    try:
+        chunk = json.dumps({"columns": columns}) + "\n"
+        size += len(chunk)
+        yield chunk
+        while sent < max_rows:
+            rows = con.fetchmany(min(NDJSON_BATCH_SIZE, max_rows - sent))
+            if not rows:
+                break
+            chunk = "".join(json.dumps(sanitize_row(row)) + "\n" for row in rows)
+            size += len(chunk)
+            yield chunk
+            sent += len(rows)
+        print(f"📨 Streamed {sent} rows as NDJSON")
+    except Exception as e:
+        print(f"❌ NDJSON stream aborted after {sent} rows: {e}")
+        raise
+    finally:
+        on_close(sent, size)
+
+def cursor_page(entry, rows, hostname, exec_time):
+    return {
+        "cursor_id": None if entry.exhausted else entry.cursor_id,
+        "columns": entry.columns,
+        "rows": [sanitize_row(row) for row in rows],
+        "has_more": not entry.exhausted,
+        "rows_fetched": entry.rows_fetched,
+        "hostname": hostname,
+        "execution_time": exec_time
+    }
+
+# 🔧 Stream IPC : les record batches DuckDB sont écrits tels quels, sans conversion Python
+def stream_arrow(reader, on_close):
+    buf = io.BytesIO()
+    rows = 0
+    size = 0
+    try:
+        with pa.ipc.new_stream(buf, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+                size += buf.tell()
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        size += buf.tell()
+        yield buf.getvalue()
+        print(f"📦 Streamed {rows} rows as Arrow IPC")
+    except Exception as e:
+        print(f"❌ Arrow stream aborted after {rows} rows: {e}")
+        raise
+    finally:
+        on_close(rows, size)
+
+# Objet S3 (404) ou fichier local supprimé
+def missing_file(e):
+    if isinstance(e, duckdb.HTTPException):
+        return getattr(e, "status_code", None) == 404
+    return isinstance(e, duckdb.IOException) and "No such file or directory" in str(e)
+
+# Les instances dédiées sont des bases séparées : elles ne voient que les fichiers, pas les tables / vues de la base partagée
+def pinnable(query):
+    try:
+        return reads_parquet_only(parse_sql(query))
+    except Exception:
+        return False
+
+# Nombre de threads de la requête : demandé, sinon celui retenu par /query/autotune pour son empreinte
+def pinned_threads(req: SQLRequest, query, request: Request):
+    if req.num_threads != -1:
+        threads, source = req.num_threads, "request"
+    else:
+        threads, source = request.app.state.thread_tuning.get(fingerprint_sql(query)[0]), "autotune"
+        if not threads:
+            return None, None
+    if not pinnable(query):
+        print(f"⚠️ Ignoring {threads} threads ({source}): only queries on parquet files run on a thread-pinned instance")
+        return None, None
+    return threads, source
+
 @router.post("/query")
 def execute_query(req: SQLRequest, request: Request):
-    con = request.app.state.con
+    pool = request.app.state.pool
+    pinned = request.app.state.pinned
+    admission = request.app.state.admission
     hostname = os.uname().nodename
 
-    original_threads = None
+    io_window = None
+    # Format de réponse et lignes renvoyées, pour les métriques (non renseigné si la requête échoue)
+    outcome = {"format": None, "rows": 0}
+    streaming = False
+    # Curseur passé à un curseur serveur (mode cursor) : rendu à sa fermeture, pas en fin de requête
+    handed_over = False
     start_time = time.time()
+    query = req.query.strip().rstrip(';')
+    num_threads, threads_source = pinned_threads(req, query, request)
+
+    # Slot interactif (prioritaire sur les endpoints d'analyse), 429 si le noeud est saturé
+    admission.acquire("interactive")
+    try:
+        # threads n'a pas de portée curseur dans DuckDB : instance dédiée plutôt qu'un SET threads global
+        instance = pinned.acquire(num_threads) if num_threads else None
+        con = instance.cursor() if instance else pool.acquire()
+    except Exception:
+        admission.release()
+        raise
+
+    # discard : résultat en cours abandonné (curseur serveur), le curseur du pool est remplacé
+    def release_cursor(discard=False):
+        if instance:
+            con.close()
+            pinned.release(instance)
+        elif discard:
+            pool.discard(con)
+        else:
+            pool.release(con)
+
+    @once
+    def cleanup(rows=None, size=None):
+        if io_window:
+            io_window.close()
+        if not handed_over:
+            release_cursor()
+        admission.release(time.time() - start_time)
+        if outcome["format"]:
+            elapsed = time.time() - start_time
+            rows = outcome["rows"] if rows is None else rows
+            observe_query(req.query, outcome["format"], elapsed, rows)
+            request.app.state.workload.record(req.query, outcome["format"], elapsed, rows, io_window.metrics if io_window else None)
+        if size is not None:
+            observe_bytes("/query", outcome["format"], size)
 
     print(f"📥 Received query from {hostname}")
-    print(f"🧵 Threads requested: {req.num_threads}")
+    print(f"🧵 Threads: {instance.threads if instance else 'default'} ({threads_source or 'node setting'})")
     print(f"📝 Query:\n{req.query.strip()}")
 
     try:
-        query = req.query.strip().rstrip(';')
-
-        # Sauvegarde la config actuelle des threads
-        if req.num_threads != -1:
-            try:
-                original_threads = con.execute("SELECT current_setting('threads') AS val").fetchone()[0]
-                con.execute(f"SET threads TO {req.num_threads}")
-                print(f"✅ Threads set to {req.num_threads} (original was {original_threads})")
-            except Exception as e:
-                print(f"⚠️ Failed to set threads: {e}")
+        io_window = (instance.io if instance else request.app.state.io).begin(con)
 
-        # Ajoute LIMIT si SELECT sans LIMIT
-        if re.match(r"(?i)^select\b", query) and not re.search(r"(?i)\blimit\b", query):
+        # Ajoute LIMIT si SELECT sans LIMIT (les modes curseur / NDJSON bornent via fetchmany,
+        # le flux Arrow est borné par le client qui arrête de lire ou par un LIMIT explicite)
+        bounded_by_fetch = req.cursor or wants_ndjson(request) or wants_arrow(request)
+        if not bounded_by_fetch and re.match(r"(?i)^select\b", query) and not re.search(r"(?i)\blimit\b", query):
             query += f" LIMIT {req.max_rows}"
             print(f"➕ Appended LIMIT {req.max_rows}")
 
-        if req.profiling:
-            profile_path = f"/tmp/duckdb_profile_{uuid.uuid4().hex}.json"
-            con.execute("SET enable_profiling = 'json'")
-            con.execute(f"SET profiling_output = '{profile_path}'")
-
-            if os.path.exists(profile_path):
-                os.remove(profile_path)
-
-            con.execute(query).fetchall()
-
-            start_wait = time.time()
-            while not os.path.exists(profile_path):
-                if time.time() - start_wait > 2:
-                    raise HTTPException(500, "Profiling file not written.")
-                time.sleep(0.01)
+        # Globs indexés remplacés par les fichiers compatibles avec le WHERE (requête d'origine si échec)
+        zone_maps = None
+        original = query
+        if req.use_zone_maps:
+            try:
+                query, zone_maps = request.app.state.zone_maps.rewrite(con, query)
+            except Exception as e:
+                print(f"⚠️ Zone map rewrite skipped: {e}")
+                zone_maps = {"error": str(e)}
 
-            with open(profile_path) as f:
-                profiling_data = json.load(f)
+        # Globs S3 restants remplacés par le listing du catalogue (pas de LIST S3 à chaque requête)
+        unexpanded = query
+        if req.use_file_catalog:
+            try:
+                query, expanded = expand_globs(con, query)
+                if expanded:
+                    print(f"📇 Expanded {expanded} S3 glob(s) from the file catalog")
+            except Exception as e:
+                print(f"⚠️ Glob expansion skipped: {e}")
 
-            os.remove(profile_path)
+        # Fichier d'une liste (catalogue, zone maps) supprimé depuis son listing : requête rejouée une fois telle
+        # qu'écrite (globs relistés par DuckDB), listings du catalogue oubliés. Flux Arrow / NDJSON : à l'exécution seulement
+        def run(execute):
+            nonlocal query
+            try:
+                return execute(query)
+            except duckdb.Error as e:
+                if query == original or not missing_file(e):
+                    raise
+                print(f"⚠️ Listed file is gone, running the query with its original globs: {e}")
+                for scan in parquet_scans(parse_sql(original)):
+                    for path in scan["paths"]:
+                        invalidate(path)
+                query = original
+                if zone_maps:
+                    zone_maps["rewritten"] = False
+                return execute(query)
 
+        if req.profiling:
+            # Profil capturé en mémoire, limité à cette requête, résumé et historisé par empreinte
+            profiling_data = run(lambda q: capture_profile(con, q))
             exec_time = time.time() - start_time
+            io_metrics = io_window.close() if io_window else None
+            summary = summarize_profile(profiling_data, exec_time, io_metrics)
+            # Empreinte de la requête d'origine : la liste de fichiers réécrite varie d'une exécution à l'autre
+            fingerprint, normalized = fingerprint_sql(original)
+            profile_id, comparison = request.app.state.profiles.add(fingerprint, normalized, query, summary, profiling_data)
             print(f"📈 Profiling completed in {exec_time:.4f} seconds")
+            outcome["format"] = "profiling"
 
             return {
                 "profiling": profiling_data,
+                "profile_summary": summary,
+                "profile_id": profile_id,
+                "fingerprint": fingerprint,
+                "comparison": comparison,
                 "hostname": hostname,
-                "execution_time": exec_time
+                "execution_time": exec_time,
+                "threads": instance.threads if instance else None,
+                "io": io_metrics,
+                "zone_maps": zone_maps
             }
 
+        elif req.cursor:
+            store = request.app.state.cursors
+            entry, rows = run(lambda q: store.open(con, q, req.max_rows, lambda: release_cursor(discard=True)))
+            handed_over = True
+            store.release_if_exhausted(entry)
+
+            exec_time = time.time() - start_time
+            print(f"📑 Opened cursor {entry.cursor_id}, first page of {len(rows)} rows in {exec_time:.4f} seconds")
+            outcome.update(format="cursor", rows=len(rows))
+            # I/O de l'ouverture + première page (le curseur serveur continue de lire aux pages suivantes)
+            return {
+                **cursor_page(entry, rows, hostname, exec_time),
+                "threads": instance.threads if instance else None,
+                "io": io_window.close() if io_window else None,
+                "zone_maps": zone_maps
+            }
+
+        elif wants_ndjson(request):
+            run(con.execute)
+            columns = [desc[0] for desc in con.description] if con.description else []
+            exec_time = time.time() - start_time
+
+            streaming = True
+            outcome["format"] = "ndjson"
+            return ClosingStreamingResponse(
+                stream_ndjson(con, columns, req.max_rows, cleanup),
+                cleanup,
+                media_type=NDJSON_MEDIA_TYPE,
+                headers={"X-Hostname": hostname, "X-Execution-Time": f"{exec_time:.6f}"}
+            )
+
+        elif wants_arrow(request):
+            reader = run(lambda q: con.execute(q).fetch_record_batch(ARROW_BATCH_SIZE))
+            exec_time = time.time() - start_time
+            print(f"📦 Arrow stream started in {exec_time:.4f} seconds")
+
+            # Le curseur reste au streaming : libéré à la fin du flux
+            streaming = True
+            outcome["format"] = "arrow"
+            return ClosingStreamingResponse(
+                stream_arrow(reader, cleanup),
+                cleanup,
+                media_type=ARROW_STREAM_MEDIA_TYPE,
+                headers={"X-Hostname": hostname, "X-Execution-Time": f"{exec_time:.6f}"}
+            )
+
         else:
-            result = con.execute(query).fetchall()
+            cache = request.app.state.result_cache
+            # Clé et sources sur la requête d'origine : globs revalidés via le catalogue, pas fichier par fichier
+            plan = cache_plan(original, req.num_threads, req.max_rows) if req.use_cache else None
+            fingerprint = None
+
+            if plan:
+                cache_key, sources = plan
+                cached = cache.get(con, cache_key, sources)
+                if cached is not None:
+                    exec_time = time.time() - start_time
+                    print(f"⚡ Cache hit, returned {len(cached['rows'])} rows in {exec_time:.4f} seconds")
+                    outcome.update(format="json", rows=len(cached["rows"]))
+                    return {**cached, "hostname": hostname, "execution_time": exec_time, "cache": "hit", "io": io_window.close() if io_window else None, "zone_maps": zone_maps}
+                # Empreinte prise avant l'exécution : une modification pendant la requête invalide l'entrée
+                fingerprint = source_fingerprint(con, sources)
+                # Listings relus par l'empreinte : globs redéveloppés sur ces listings plutôt que sur ceux, plus anciens, du catalogue
+                if req.use_file_catalog and unexpanded != query:
+                    query = expand_globs(con, unexpanded)[0]
+
+            result = run(lambda q: con.execute(q).fetchall())
             columns = [desc[0] for desc in con.description]
             sanitized_rows = [sanitize_row(row) for row in result]
 
             exec_time = time.time() - start_time
             print(f"📊 Returned {len(sanitized_rows)} rows in {exec_time:.4f} seconds")
+            outcome.update(format="json", rows=len(sanitized_rows))
 
-            return {
+            response = {
                 "columns": columns,
                 "rows": sanitized_rows,
                 "hostname": hostname,
-                "execution_time": exec_time
+                "execution_time": exec_time,
+                "threads": instance.threads if instance else None,
+                "io": io_window.close() if io_window else None,
+                "zone_maps": zone_maps
             }
+            if req.use_cache:
+                if plan:
+                    cache.put(cache_key, fingerprint, {"columns": columns, "rows": sanitized_rows})
+                response["cache"] = "miss" if plan else "bypass"
+            return response
 
     except Exception as e:
         print(f"❌ Query execution failed: {e}")
         raise HTTPException(400, str(e))
 
     finally:
-        # Remet la config des threads si on l'a modifiée
-        if original_threads is not None:
-            try:
-                con.execute(f"SET threads TO {original_threads}")
-                print(f"🔄 Threads reset to original value: {original_threads}")
-            except Exception as e:
-                print(f"⚠️ Failed to reset threads to {original_threads}: {e}")
+        if not streaming:
+            cleanup()
+
+
+@router.get("/query/cursor/{cursor_id}")
+def fetch_cursor_page(cursor_id: str, request: Request, page_size: int | None = None):
+    store = request.app.state.cursors
+    hostname = os.uname().nodename
+    start_time = time.time()
+
+    try:
+        entry = store.get(cursor_id)
+        # Page lue sous un slot d'admission (429 si le noeud est saturé)
+        rows = store.fetch(entry, page_size)
+    except CursorNotFound as e:
+        raise HTTPException(404, str(e))
+    except Saturated:
+        raise
+    except Exception as e:
+        print(f"❌ Cursor fetch failed: {e}")
+        raise HTTPException(400, str(e))
+
+    return cursor_page(entry, rows, hostname, time.time() - start_time)
+
+
+@router.delete("/query/cursor/{cursor_id}")
+def close_cursor(cursor_id: str, request: Request):
+    try:
+        request.app.state.cursors.close(cursor_id)
+    except CursorNotFound as e:
+        raise HTTPException(404, str(e))
+    return {"cursor_id": cursor_id, "closed": True}
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Depends
 from models.models import SQLAnalyzerRequest
 from pydantic import BaseModel
 from sqlglot import parse_one, optimizer, exp
+from cursor_pool import pooled_cursor
+from pruning import estimate_pruning
 import sqlite3
 import time
 
@@ -54,3 +56,11 @@ def analyze_sql(req: SQLAnalyzerRequest, request: Request):
     except Exception as e:
         return {"error": str(e)}
 
+
+# Data skipping attendu avant exécution : fichiers / row groups / octets lus par scan parquet
+@router.post("/analyze/pruning")
+def analyze_pruning(req: SQLAnalyzerRequest, request: Request, con=Depends(pooled_cursor)):
+    try:
+        return estimate_pruning(con, request.app.state.metadata_cache, req.sql.strip().rstrip(';'))
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse
+from models.models import CompactionRequest, RepartitionRequest
+from jobs import JobQueueFull
+from rewrite import compact, repartition
+import os
+
+router = APIRouter()
+
+
+def check_layout_spec(req):
+    if req.target_file_size_mb < 1 or req.row_group_size < 1:
+        raise HTTPException(400, "target_file_size_mb and row_group_size must be >= 1")
+    if not 0 < req.bloom_filter_fpp < 1:
+        raise HTTPException(400, "bloom_filter_fpp must be between 0 and 1")
+
+
+def submit_rewrite(request, description, kind, task):
+    try:
+        job = request.app.state.jobs.submit(description, kind=kind, task=task)
+    except JobQueueFull as e:
+        return JSONResponse(status_code=429, content={"detail": str(e)}, headers={"Retry-After": "5"})
+    print(f"📮 Job {job.job_id} queued ({description})")
+    return {"job_id": job.job_id, "status": job.status, "hostname": os.uname().nodename}
+
+
+# Compaction en job asynchrone : suivi et rapport (avant / après, benchmark) via GET /jobs/{job_id}
+@router.post("/compact_parquet", status_code=202)
+def compact_parquet(req: CompactionRequest, request: Request):
+    check_layout_spec(req)
+    return submit_rewrite(request, f"compact {req.s3_path}", "compaction", lambda con, job: compact(con, job, req))
+
+
+# Repartitionnement hive (typiquement sur les colonnes de /suggest_partitions), rapport de skew dans GET /jobs/{job_id}
+@router.post("/repartition_parquet", status_code=202)
+def repartition_parquet(req: RepartitionRequest, request: Request):
+    check_layout_spec(req)
+    if not req.partition_by:
+        raise HTTPException(400, "partition_by must list at least one column")
+    return submit_rewrite(request, f"repartition {req.s3_path} by {', '.join(req.partition_by)}", "repartition", lambda con, job: repartition(con, job, req))
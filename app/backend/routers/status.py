@@ -1,18 +1,40 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, HTTPException
 import platform, psutil, socket
+from capacity import node_capacity, duckdb_settings
 
 router = APIRouter()
 
 @router.get("/status")
-def get_status():
+def get_status(request: Request):
     try:
+        capacity = node_capacity()
         return {
             "hostname": socket.gethostname(),
             "os": platform.system(),
             "architecture": platform.machine(),
-            "cpu_count": psutil.cpu_count(logical=True),
+            # CPU / mémoire effectifs (quota cgroup) ; valeurs de l'hôte sous host_*
+            "cpu_count": capacity["cpu_limit"],
+            "host_cpu_count": psutil.cpu_count(logical=True),
             "cpu_load": psutil.getloadavg(),
-            "memory": dict(psutil.virtual_memory()._asdict())
+            "memory": {"total": capacity["memory_limit"], "used": capacity["memory_used"], "percent": round(capacity["memory_used"] / capacity["memory_limit"] * 100, 1) if capacity["memory_used"] else None},
+            "host_memory": dict(psutil.virtual_memory()._asdict()),
+            "capacity": capacity,
+            "duckdb": duckdb_settings(request.app.state.con),
+            "in_flight": request.app.state.in_flight,
+            "admission": request.app.state.admission.stats(),
+            "io": request.app.state.io.stats(),
+            "cursor_pool": request.app.state.pool.stats(),
+            "pinned_instances": request.app.state.pinned.stats(),
+            "thread_tuning": request.app.state.thread_tuning.stats(),
+            "server_cursors": request.app.state.cursors.stats(),
+            "result_cache": request.app.state.result_cache.stats(),
+            "file_catalog": request.app.state.file_catalog.stats(),
+            "metadata_cache": request.app.state.metadata_cache.stats(),
+            "sketch_store": request.app.state.sketches.stats(),
+            "zone_maps": request.app.state.zone_maps.stats(),
+            "profile_store": request.app.state.profiles.stats(),
+            "workload": request.app.state.workload.stats(),
+            "jobs": request.app.state.jobs.stats()
         }
     except Exception as e:
         raise HTTPException(500, f"Status error: {e}")
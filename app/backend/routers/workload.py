@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Request, HTTPException
+from distributed import cluster_nodes
+from workload import cluster_workload
+
+router = APIRouter()
+
+ORDER_BY = ("total_time", "count", "mean_time", "p95_time", "max_time", "rows", "bytes_fetched")
+
+
+# scope=node : agrégats bruts de ce noeud (histogrammes fusionnables) ; scope=cluster : fusion de tous les noeuds
+@router.get("/workload")
+def get_workload(request: Request, scope: str = "cluster", top: int = 20, order_by: str = "total_time"):
+    if order_by not in ORDER_BY:
+        raise HTTPException(400, f"order_by must be one of {', '.join(ORDER_BY)}")
+    if scope == "node":
+        return request.app.state.workload.snapshot()
+    if scope == "cluster":
+        return cluster_workload(cluster_nodes(), top, order_by)
+    raise HTTPException(400, "scope must be 'node' or 'cluster'")
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Request, Depends
+from models.models import ZoneMapRequest, SQLAnalyzerRequest
+from cursor_pool import pooled_cursor
+
+router = APIRouter()
+
+
+# Création ou rafraîchissement incrémental (seuls les footers nouveaux / modifiés sont lus)
+@router.post("/zone_maps")
+def build_zone_maps(req: ZoneMapRequest, request: Request, con=Depends(pooled_cursor)):
+    try:
+        return request.app.state.zone_maps.refresh(con, req.s3_path, req.columns, fresh=True)
+    except Exception as e:
+        raise HTTPException(400, str(e))
+
+
+@router.get("/zone_maps")
+def list_zone_maps(request: Request):
+    return {"datasets": request.app.state.zone_maps.list()}
+
+
+@router.delete("/zone_maps")
+def drop_zone_maps(s3_path: str, request: Request):
+    if not request.app.state.zone_maps.drop(s3_path):
+        raise HTTPException(404, f"No zone maps for {s3_path}")
+    return {"s3_path": s3_path, "dropped": True}
+
+
+# Requête telle que /query l'exécuterait : globs indexés remplacés par la liste des fichiers gardés
+@router.post("/zone_maps/rewrite")
+def rewrite_with_zone_maps(req: SQLAnalyzerRequest, request: Request, con=Depends(pooled_cursor)):
+    try:
+        query, info = request.app.state.zone_maps.rewrite(con, req.sql.strip().rstrip(';'))
+        return {"sql": query, "zone_maps": info}
+    except Exception as e:
+        raise HTTPException(400, str(e))
@@ -0,0 +1,145 @@
+import math, random
+from metadata_cache import sql_list
+
+Z_95 = 1.96
+
+
+def sql_str(val: str) -> str:
+    return "'" + val.replace("'", "''") + "'"
+
+
+# (file_name, row_group_id, num_rows, compressed bytes) depuis la vue parquet_meta
+def dataset_row_groups(con):
+    return con.execute("""
+        SELECT file_name, row_group_id, ANY_VALUE(row_group_num_rows), SUM(total_compressed_size)
+        FROM parquet_meta
+        GROUP BY file_name, row_group_id
+        ORDER BY file_name, row_group_id
+    """).fetchall()
+
+
+# Source SQL limitée à des row groups tirés (DuckDB ne lit pas un row group isolé : on ne scanne que les
+# fichiers concernés, filtrés sur les bornes file_row_number de chaque row group) + octets compressés lus
+def row_group_source(row_groups, chosen):
+    offsets, start, current = {}, 0, None
+    for file_name, rg_id, num_rows, _ in row_groups:
+        if file_name != current:
+            current, start = file_name, 0
+        offsets[(file_name, rg_id)] = (start, start + num_rows - 1)
+        start += num_rows
+
+    files = sorted({rg[0] for rg in chosen})
+    conditions = " OR ".join(
+        f"(filename = {sql_str(rg[0])} AND file_row_number BETWEEN {offsets[(rg[0], rg[1])][0]} AND {offsets[(rg[0], rg[1])][1]})"
+        for rg in chosen
+    )
+    source = (
+        f"(SELECT * EXCLUDE (filename, file_row_number) "
+        f"FROM parquet_scan({sql_list(files)}, filename=true, file_row_number=true) WHERE {conditions})"
+    )
+    return source, sum(rg[3] or 0 for rg in row_groups if rg[0] in files)
+
+
+# Row groups tirés au hasard jusqu'à couvrir target_rows lignes
+def row_groups_covering(rng, row_groups, target_rows):
+    chosen, covered = [], 0
+    for rg in rng.sample(row_groups, len(row_groups)):
+        if covered >= target_rows:
+            break
+        chosen.append(rg)
+        covered += rg[2]
+    return chosen
+
+
+# Source SQL échantillonnée + description de l'échantillon (sans les lignes lues, connues après le scan).
+# percent et rows ne lisent que des row groups tirés (échantillon par grappes, comme row_groups) :
+# un échantillon ligne à ligne uniforme obligerait à lire tout le dataset
+def sample_source(con, spec):
+    row_groups = dataset_row_groups(con)
+    total_rows = sum(rg[2] for rg in row_groups)
+    total_bytes = sum(rg[3] or 0 for rg in row_groups) or 1
+    seed = spec.seed if spec.seed is not None else random.randrange(2 ** 31)
+    rng = random.Random(seed)
+
+    if spec.method == "percent":
+        # pct% des row groups, puis pct% des lignes de ceux-ci : la fraction lue suit l'échantillon
+        pct = min(max(spec.value, 0.0), 100.0)
+        count = min(len(row_groups), max(1, math.ceil(len(row_groups) * pct / 100)))
+        base, bytes_read = row_group_source(row_groups, rng.sample(row_groups, count))
+        rows_pct = min(100.0, pct * len(row_groups) / count) if row_groups else pct
+        source = f"(SELECT * FROM {base} USING SAMPLE {rows_pct} PERCENT (bernoulli, {seed}))"
+
+    elif spec.method == "rows":
+        # Réservoir sur des row groups couvrant 4x les lignes demandées (diversité de l'échantillon)
+        chosen = row_groups_covering(rng, row_groups, 4 * int(spec.value))
+        base, bytes_read = row_group_source(row_groups, chosen)
+        source = f"(SELECT * FROM {base} USING SAMPLE {int(spec.value)} ROWS (reservoir, {seed}))"
+
+    elif spec.method == "files":
+        files = sorted({rg[0] for rg in row_groups})
+        chosen = set(rng.sample(files, min(len(files), max(1, int(spec.value)))))
+        source = f"(SELECT * FROM parquet_scan({sql_list(sorted(chosen))}))"
+        bytes_read = sum(rg[3] or 0 for rg in row_groups if rg[0] in chosen)
+
+    else:
+        chosen = rng.sample(row_groups, min(len(row_groups), max(1, int(spec.value))))
+        source, bytes_read = row_group_source(row_groups, chosen)
+
+    info = {
+        "method": spec.method,
+        "value": spec.value,
+        "seed": seed,
+        "total_rows": total_rows,
+        "fraction_bytes_read": round(bytes_read / total_bytes, 4),
+    }
+    return source, info
+
+
+def complete_sample_info(info, sampled_rows):
+    total = info["total_rows"]
+    info.update({
+        "sampled_rows": sampled_rows,
+        "fraction_rows": round(sampled_rows / total, 4) if total else 1.0,
+        "exact": sampled_rows >= total,
+    })
+    return info
+
+
+# Intervalle à 95% d'une proportion (approximation normale, lignes supposées indépendantes)
+def proportion_bounds(p, n):
+    if n <= 0:
+        return 0.0, 1.0
+    half = Z_95 * math.sqrt(p * (1 - p) / n)
+    return max(0.0, p - half), min(1.0, p + half)
+
+
+# Estimateur GEE (Charikar et al.) : sqrt(N/n) * f1 + (d - f1), erreur de ratio bornée par sqrt(N/n)
+def estimate_distinct(d, f1, n, N):
+    if n <= 0 or n >= N:
+        return d, (d, d)
+    scale = math.sqrt(N / n)
+    est = scale * f1 + (d - f1)
+    low = max(d, est / scale)
+    high = min(est * scale, d + (N - n))
+    return round(est), (math.floor(low), math.ceil(high))
+
+
+# Remplace les valeurs exactes du profil par des estimations + bornes
+def estimate_profile(profile, info):
+    n, N = profile["total_rows"] or 0, info["total_rows"]
+    complete_sample_info(info, n)
+
+    for stats in profile["columns"].values():
+        if "error" in stats:
+            continue
+        if info["exact"]:
+            stats["distinct_values_bounds"] = [stats["distinct_values"]] * 2
+            stats["top_value_ratio_bounds"] = [round(stats["top_value_ratio"], 4)] * 2
+            stats["null_ratio_bounds"] = [round(stats["null_ratio"], 4)] * 2
+            continue
+        est, bounds = estimate_distinct(stats["distinct_values"], stats["singletons"], n, N)
+        stats["distinct_values"] = est
+        stats["distinct_values_bounds"] = list(bounds)
+        stats["top_value_ratio_bounds"] = [round(b, 4) for b in proportion_bounds(stats["top_value_ratio"], n)]
+        stats["null_ratio_bounds"] = [round(b, 4) for b in proportion_bounds(stats["null_ratio"], n)]
+    return info
@@ -0,0 +1,283 @@
+import os, json, math, time, sqlite3, threading
+from contextlib import contextmanager
+import pyarrow as pa
+import pyarrow.compute as pc
+from file_stats import stat_files
+from metadata_cache import sql_list
+from profiler import quote_ident
+
+# HyperLogLog : 2^12 registres (erreur standard ~1.6%), hash 64 bits de DuckDB
+HLL_P = 12
+HLL_M = 1 << HLL_P
+HLL_LOW_MASK = (1 << (64 - HLL_P)) - 1
+HEAVY_HITTERS = 5
+
+
+def _hll_estimate(registers: bytes):
+    m = HLL_M
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    # Correction petites cardinalités (linear counting)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return estimate
+
+
+def _merge_registers(a: bytes, b: bytes):
+    arrays = [pa.Array.from_buffers(pa.uint8(), HLL_M, [None, pa.py_buffer(x)]) for x in (a, b)]
+    return pc.max_element_wise(*arrays).buffers()[1].to_pybytes()[:HLL_M]
+
+
+class SketchStore:
+    # Sketches par fichier et par colonne (registres HLL + top-k), persistés en SQLite
+    # clé = (path, etag ou mtime, size) : un fichier modifié est rescanné, les autres sont réutilisés
+
+    def __init__(self, path="sketches.db", top_k=64):
+        self.path = path
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self.files_scanned = 0
+        self.files_reused = 0
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS file_sketches (
+                    path TEXT NOT NULL,
+                    column_name TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    num_rows INTEGER NOT NULL,
+                    non_null INTEGER NOT NULL,
+                    hll BLOB NOT NULL,
+                    top_values TEXT NOT NULL,
+                    top_floor INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (path, column_name)
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def file_version(f):
+        return f["etag"] or repr(f["last_modified"])
+
+    def _load(self, files, columns):
+        wanted = {f["path"]: (self.file_version(f), f["size"]) for f in files}
+        sketches = {}
+        with self._connect() as db:
+            paths = list(wanted)
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                rows = db.execute(
+                    f"SELECT path, column_name, version, size, num_rows, non_null, hll, top_values, top_floor "
+                    f"FROM file_sketches WHERE path IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for path, column, version, size, num_rows, non_null, hll, top_values, top_floor in rows:
+                    if (version, size) == wanted[path] and column in columns:
+                        sketches.setdefault(path, {})[column] = {
+                            "num_rows": num_rows,
+                            "non_null": non_null,
+                            "hll": hll,
+                            "top_values": json.loads(top_values),
+                            "top_floor": top_floor,
+                        }
+        # Un fichier n'est réutilisable que si toutes les colonnes demandées sont présentes
+        return {path: cols for path, cols in sketches.items() if len(cols) == len(columns)}
+
+    # Un seul scan pour tous les fichiers nouveaux ou modifiés : valeurs castées en VARCHAR
+    # pour que le hash soit stable entre fichiers aux types physiques différents
+    def _scan(self, con, paths, columns):
+        select = ", ".join(f"CAST({quote_ident(c)} AS VARCHAR) AS {quote_ident(c)}" for c in columns)
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE sketch_groups AS
+            SELECT filename, col_name, value, hash(value) AS h, COUNT(*) AS c
+            FROM (
+                UNPIVOT (SELECT filename, {select} FROM parquet_scan({sql_list(paths)}, filename=true))
+                ON COLUMNS(* EXCLUDE (filename)) INTO NAME col_name VALUE value
+            )
+            GROUP BY ALL
+        """)
+        try:
+            registers = con.execute(f"""
+                SELECT filename, col_name, list(reg::INTEGER), list(rho)
+                FROM (
+                    SELECT filename, col_name, h >> {64 - HLL_P} AS reg,
+                           MAX(bit_position('1'::BIT, ((h & {HLL_LOW_MASK}::UBIGINT) << {HLL_P})::BIT)) AS rho
+                    FROM sketch_groups
+                    GROUP BY ALL
+                )
+                GROUP BY ALL
+            """).fetchall()
+            tops = con.execute(f"""
+                SELECT filename, col_name, SUM(c) AS non_null,
+                       list([value, c::VARCHAR] ORDER BY c DESC, value) FILTER (WHERE rn <= {self.top_k}),
+                       COALESCE(MAX(c) FILTER (WHERE rn = {self.top_k + 1}), 0)
+                FROM (
+                    SELECT *, row_number() OVER (PARTITION BY filename, col_name ORDER BY c DESC, value) AS rn
+                    FROM sketch_groups
+                )
+                GROUP BY ALL
+            """).fetchall()
+            num_rows = dict(con.execute(f"""
+                SELECT file_name, SUM(row_group_num_rows)
+                FROM (SELECT DISTINCT file_name, row_group_id, row_group_num_rows FROM parquet_meta)
+                WHERE file_name IN (SELECT unnest({sql_list(paths)}))
+                GROUP BY file_name
+            """).fetchall())
+        finally:
+            con.execute("DROP TABLE IF EXISTS sketch_groups")
+
+        sketches = {p: {c: {"non_null": 0, "hll": bytes(HLL_M), "top_values": [], "top_floor": 0} for c in columns} for p in paths}
+        for filename, column, regs, rhos in registers:
+            hll = bytearray(HLL_M)
+            for reg, rho in zip(regs, rhos):
+                # rho = 0 : les 52 bits bas sont nuls
+                hll[reg] = rho or (64 - HLL_P + 1)
+            sketches[filename][column]["hll"] = bytes(hll)
+        for filename, column, non_null, top_values, top_floor in tops:
+            sketches[filename][column].update({
+                "non_null": non_null,
+                "top_values": [[v, int(c)] for v, c in top_values or []],
+                "top_floor": top_floor,
+            })
+        for path in paths:
+            for sketch in sketches[path].values():
+                sketch["num_rows"] = num_rows.get(path, 0)
+        return sketches
+
+    def _save(self, files, sketches):
+        now = time.time()
+        rows = [
+            (f["path"], column, self.file_version(f), f["size"], s["num_rows"], s["non_null"],
+             s["hll"], json.dumps(s["top_values"]), s["top_floor"], now)
+            for f in files
+            for column, s in sketches[f["path"]].items()
+        ]
+        with self._lock, self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO file_sketches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    # Même forme que profiler.profile_columns, plus un bloc "sketches" (fichiers scannés / réutilisés)
+    # La vue parquet_meta du chemin doit être enregistrée sur le curseur ; io : octets lus mesurés pendant le scan
+    def profile(self, con, s3_path, columns, io=None):
+        files = stat_files(con, s3_path)
+        if files is None:
+            raise ValueError(f"Sketches need a listable path (s3:// or local): {s3_path}")
+        if not files:
+            raise FileNotFoundError(f"No files found that match the pattern \"{s3_path}\"")
+
+        t0 = time.time()
+        sketches = self._load(files, columns)
+        missing = [f for f in files if f["path"] not in sketches]
+        bytes_read = 0 if io and io.enabled and io.trace_reads else None
+        if missing:
+            paths = [f["path"] for f in missing]
+            window = io.begin(con, nested=True) if io else None
+            try:
+                scanned = self._scan(con, paths, columns)
+            finally:
+                metrics = window.close() if window else None
+            self._save(missing, scanned)
+            sketches.update(scanned)
+            bytes_read = metrics["bytes_read"] if metrics else None
+        with self._lock:
+            self.files_scanned += len(missing)
+            self.files_reused += len(files) - len(missing)
+
+        result = {"columns": {}, "total_rows": 0, "scans": 1 if missing else 0, "scan_time": 0.0, "bytes_read": bytes_read}
+        total_rows = sum(next(iter(sketches[f["path"]].values()))["num_rows"] for f in files) if columns else 0
+        result["total_rows"] = total_rows
+
+        for column in columns:
+            result["columns"][column] = self._merge([sketches[f["path"]][column] for f in files], total_rows)
+
+        result["scan_time"] = round(time.time() - t0, 4)
+        result["sketches"] = {
+            "files": len(files),
+            "scanned_files": len(missing),
+            "reused_files": len(files) - len(missing),
+        }
+        return result
+
+    @staticmethod
+    def _merge(file_sketches, total_rows):
+        registers = bytes(HLL_M)
+        counts, non_null = {}, 0
+        for s in file_sketches:
+            registers = _merge_registers(registers, s["hll"])
+            non_null += s["non_null"]
+            for value, count in s["top_values"]:
+                counts[value] = counts.get(value, 0) + count
+
+        # Borne haute d'une valeur : ses comptes connus + le plancher top-k des fichiers où elle n'apparaît pas
+        floors = sum(s["top_floor"] for s in file_sketches)
+        in_file = {}
+        for s in file_sketches:
+            for value, _ in s["top_values"]:
+                in_file[value] = in_file.get(value, 0) + s["top_floor"]
+        hitters = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        heavy = [
+            {"value": v, "count": c, "count_upper": c + floors - in_file[v]}
+            for v, c in hitters[:HEAVY_HITTERS]
+        ]
+
+        null_count = total_rows - non_null
+        top_low = max(hitters[0][1] if hitters else 0, null_count)
+        top_high = max([h["count_upper"] for h in heavy] + [floors, null_count])
+
+        if floors == 0:
+            # Tous les fichiers tiennent dans leur top-k : les comptes fusionnés sont exacts
+            distinct = distinct_low = distinct_high = len(counts)
+        else:
+            distinct = round(_hll_estimate(registers))
+            # Intervalle à 95% : ± 2 erreurs standard (1.04 / sqrt(m)), borné par les valeurs déjà connues
+            err = 2 * 1.04 / math.sqrt(HLL_M)
+            distinct_high = max(min(math.ceil(distinct * (1 + err)), non_null), len(counts))
+            distinct_low = max(math.floor(distinct * (1 - err)), len(counts))
+            distinct = min(max(distinct, distinct_low), distinct_high)
+
+        def ratio(x):
+            return x / total_rows if total_rows else 0.0
+
+        return {
+            "distinct_values": distinct,
+            "top_value_ratio": ratio(top_low),
+            "null_ratio": ratio(null_count),
+            "singletons": None,
+            "min": None,
+            "max": None,
+            "distinct_values_bounds": [distinct_low, distinct_high],
+            "top_value_ratio_bounds": [round(ratio(top_low), 4), round(min(ratio(top_high), 1.0), 4)],
+            "null_ratio_bounds": [round(ratio(null_count), 4)] * 2,
+            "heavy_hitters": heavy,
+        }
+
+    def stats(self):
+        with self._connect() as db:
+            files, columns = db.execute("SELECT COUNT(DISTINCT path), COUNT(*) FROM file_sketches").fetchone()
+        with self._lock:
+            lookups = self.files_scanned + self.files_reused
+            return {
+                "path": self.path,
+                "files": files,
+                "column_sketches": columns,
+                "top_k": self.top_k,
+                "files_scanned": self.files_scanned,
+                "files_reused": self.files_reused,
+                "reuse_ratio": round(self.files_reused / lookups, 3) if lookups else None,
+            }
+
+
+def create_sketch_store():
+    return SketchStore(
+        path=os.getenv("SKETCH_DB_PATH", "sketches.db"),
+        top_k=int(os.getenv("SKETCH_TOP_K", "64")),
+    )
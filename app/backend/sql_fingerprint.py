@@ -0,0 +1,82 @@
+import re, hashlib
+from functools import lru_cache
+from sqlglot import parse_one, exp
+
+PARQUET_FUNCTIONS = {"read_parquet", "parquet_scan"}
+
+NON_DETERMINISTIC = (exp.Rand, exp.Uuid, exp.CurrentDate, exp.CurrentTime, exp.CurrentTimestamp, exp.CurrentDatetime)
+NON_DETERMINISTIC_NAMES = {"random", "gen_random_uuid", "uuid", "now", "setseed"}
+
+
+def parse_sql(query: str):
+    return parse_one(query, read="duckdb")
+
+
+# Texte canonique : mots-clés, espaces et identifiants normalisés par sqlglot
+def normalize_sql(tree) -> str:
+    return tree.sql(dialect="duckdb", normalize=True, comments=False)
+
+
+def parquet_sources(tree) -> list:
+    paths = []
+    for table in tree.find_all(exp.Table):
+        fn = table.this
+        if isinstance(fn, exp.Anonymous) and fn.name.lower() in PARQUET_FUNCTIONS and fn.expressions:
+            arg = fn.expressions[0]
+            if isinstance(arg, exp.Array):
+                paths += [e.name for e in arg.expressions if isinstance(e, exp.Literal)]
+            elif isinstance(arg, exp.Literal):
+                paths.append(arg.name)
+        elif isinstance(fn, exp.Identifier) and fn.name.endswith(".parquet"):
+            paths.append(fn.name)
+    return paths
+
+
+# Requête qui ne lit que des fichiers parquet (ou des CTE) : aucune table ni vue de la base
+def reads_parquet_only(tree) -> bool:
+    if not isinstance(tree, exp.Query):
+        return False
+    cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    for table in tree.find_all(exp.Table):
+        fn = table.this
+        if isinstance(fn, exp.Anonymous) and fn.name.lower() in PARQUET_FUNCTIONS:
+            continue
+        if isinstance(fn, exp.Identifier) and (fn.name.endswith(".parquet") or fn.name in cte_names):
+            continue
+        return False
+    return True
+
+
+# Cacheable : SELECT déterministe dont toutes les tables sont des fichiers parquet (ou des CTE)
+def is_cacheable(tree) -> bool:
+    if any(tree.find_all(*NON_DETERMINISTIC)):
+        return False
+    if any(fn.name.lower() in NON_DETERMINISTIC_NAMES for fn in tree.find_all(exp.Anonymous)):
+        return False
+    return reads_parquet_only(tree)
+
+
+# Forme de la requête : littéraux remplacés par ?, listes IN réduites à un seul ?
+# Conservés : chemins parquet et positions GROUP BY / ORDER BY (1, 2...)
+def strip_literals(tree):
+    tree = tree.copy()
+    sources = {id(lit) for fn in tree.find_all(exp.Anonymous) if fn.name.lower() in PARQUET_FUNCTIONS for lit in fn.find_all(exp.Literal)}
+
+    def strip(node):
+        if isinstance(node, exp.In) and node.expressions and all(isinstance(e, exp.Literal) for e in node.expressions):
+            node.set("expressions", [exp.Placeholder()])
+        elif isinstance(node, exp.Literal) and id(node) not in sources and not isinstance(node.parent, (exp.Group, exp.Ordered)):
+            return exp.Placeholder()
+        return node
+
+    return tree.transform(strip, copy=False)
+
+
+# Empreinte (hash court) + texte normalisé sans littéraux ; SQL non parsable : texte brut compacté
+@lru_cache(maxsize=4096)
+def fingerprint_sql(query: str):
+    try:
+        text = normalize_sql(strip_literals(parse_sql(query)))
+    except Exception:
+        text = re.sub(r"\s+", " ", query.strip().rstrip(";")).lower()
+    return hashlib.sha1(text.encode()).hexdigest()[:16], text
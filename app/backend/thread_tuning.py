@@ -0,0 +1,130 @@
+import os, json, time, sqlite3, threading, statistics
+from contextlib import contextmanager
+
+# Nombre de threads retenu : le plus petit dont la médiane reste à moins de tolerance du meilleur
+DEFAULT_TOLERANCE = 0.05
+
+
+def default_thread_counts(max_threads):
+    counts = []
+    n = 1
+    while n < max_threads:
+        counts.append(n)
+        n *= 2
+    return counts + [max_threads]
+
+
+# Résultat consommé par record batches : temps d'exécution sans conversion Python des lignes
+def _run(cur, query):
+    rows = 0
+    for batch in cur.execute(query).fetch_record_batch():
+        rows += batch.num_rows
+    return rows
+
+
+# Balayage : pour chaque nombre de threads, warmup runs puis repetitions runs chronométrés sur l'instance dédiée
+def sweep_threads(pinned, query, thread_counts, warmup=1, repetitions=3, tolerance=DEFAULT_TOLERANCE):
+    curve = []
+    for threads in sorted({pinned.clamp(n) for n in thread_counts}):
+        instance = pinned.acquire(threads)
+        cur = instance.cursor()
+        try:
+            for _ in range(warmup):
+                rows = _run(cur, query)
+            times = []
+            for _ in range(repetitions):
+                start = time.perf_counter()
+                rows = _run(cur, query)
+                times.append(time.perf_counter() - start)
+        finally:
+            cur.close()
+            pinned.release(instance)
+        curve.append({
+            "threads": threads,
+            "median": round(statistics.median(times), 6),
+            "min": round(min(times), 6),
+            "mean": round(statistics.mean(times), 6),
+            "runs": [round(t, 6) for t in times],
+            "rows": rows,
+        })
+        print(f"⏱️ {threads} threads: median {curve[-1]['median']:.4f}s")
+
+    base = curve[0]
+    for point in curve:
+        point["speedup"] = round(base["median"] / point["median"], 3) if point["median"] else None
+        point["efficiency"] = round(point["speedup"] * base["threads"] / point["threads"], 3) if point["speedup"] else None
+
+    best = min(curve, key=lambda p: p["median"])
+    recommended = next(p for p in curve if p["median"] <= best["median"] * (1 + tolerance))
+    return {
+        "curve": curve,
+        "best_threads": best["threads"],
+        "recommended_threads": recommended["threads"],
+        "tolerance": tolerance,
+    }
+
+
+class ThreadTuningStore:
+    # Nombre de threads retenu par empreinte de requête, persisté en SQLite, relu en mémoire par /query
+
+    def __init__(self, path="thread_tuning.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = 0
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS thread_tuning (
+                    fingerprint TEXT PRIMARY KEY,
+                    normalized_query TEXT NOT NULL,
+                    threads INTEGER NOT NULL,
+                    best_threads INTEGER NOT NULL,
+                    curve TEXT NOT NULL,
+                    tuned_at REAL NOT NULL
+                )
+            """)
+            self._threads = dict(db.execute("SELECT fingerprint, threads FROM thread_tuning").fetchall())
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, fingerprint):
+        threads = self._threads.get(fingerprint)
+        if threads is not None:
+            self.hits += 1
+        return threads
+
+    def put(self, fingerprint, normalized_query, result):
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO thread_tuning (fingerprint, normalized_query, threads, best_threads, curve, tuned_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [fingerprint, normalized_query, result["recommended_threads"], result["best_threads"], json.dumps(result["curve"]), time.time()],
+            )
+            self._threads[fingerprint] = result["recommended_threads"]
+
+    def forget(self, fingerprint):
+        with self._lock, self._connect() as db:
+            deleted = db.execute("DELETE FROM thread_tuning WHERE fingerprint = ?", [fingerprint]).rowcount
+            self._threads.pop(fingerprint, None)
+        return deleted > 0
+
+    def list(self, limit=50):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT fingerprint, normalized_query, threads, best_threads, curve, tuned_at FROM thread_tuning ORDER BY tuned_at DESC LIMIT ?",
+                [limit],
+            ).fetchall()
+        keys = ("fingerprint", "normalized_query", "threads", "best_threads", "curve", "tuned_at")
+        return [{**dict(zip(keys, row)), "curve": json.loads(row[4])} for row in rows]
+
+    def stats(self):
+        return {"path": self.path, "fingerprints": len(self._threads), "hits": self.hits}
+
+
+def create_thread_tuning_store():
+    return ThreadTuningStore(path=os.getenv("THREAD_TUNING_DB_PATH", "thread_tuning.db"))
@@ -0,0 +1,234 @@
+import os, json, time, bisect, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from sql_fingerprint import fingerprint_sql
+from metrics import LATENCY_BUCKETS
+
+WORKLOAD_TIMEOUT = float(os.getenv("DBGRID_WORKLOAD_TIMEOUT", "5"))
+SLOW_QUERY_TEXT_LIMIT = 2000
+
+
+class Aggregate:
+    # Agrégat fusionnable : compteurs + histogramme à buckets fixes (p95 estimé sur les noeuds réunis)
+
+    def __init__(self, normalized_query=""):
+        self.normalized_query = normalized_query
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.bytes_fetched = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, elapsed, rows, bytes_fetched):
+        self.count += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.rows += rows
+        self.bytes_fetched += bytes_fetched
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def merge(self, other):
+        self.normalized_query = self.normalized_query or other["normalized_query"]
+        self.count += other["count"]
+        self.total_time += other["total_time"]
+        self.max_time = max(self.max_time, other["max_time"])
+        self.rows += other["rows"]
+        self.bytes_fetched += other["bytes_fetched"]
+        self.histogram = [a + b for a, b in zip(self.histogram, other["histogram"])]
+
+    # Interpolation linéaire dans le bucket qui contient le quantile, bornée par le max observé
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.histogram):
+            if n and seen + n >= rank:
+                low = LATENCY_BUCKETS[i - 1] if i else 0.0
+                high = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max_time
+                return round(min(low + (high - low) * (rank - seen) / n, self.max_time), 6)
+            seen += n
+        return round(self.max_time, 6)
+
+    def raw(self):
+        return {
+            "normalized_query": self.normalized_query,
+            "count": self.count,
+            "total_time": self.total_time,
+            "max_time": self.max_time,
+            "rows": self.rows,
+            "bytes_fetched": self.bytes_fetched,
+            "histogram": self.histogram,
+        }
+
+    def summary(self):
+        return {
+            "normalized_query": self.normalized_query,
+            "count": self.count,
+            "total_time": round(self.total_time, 6),
+            "mean_time": round(self.total_time / self.count, 6) if self.count else None,
+            "p95_time": self.quantile(0.95),
+            "max_time": round(self.max_time, 6),
+            "rows": self.rows,
+            "mean_rows": round(self.rows / self.count, 1) if self.count else None,
+            "bytes_fetched": self.bytes_fetched,
+        }
+
+
+class WorkloadStore:
+    # Agrégats par empreinte sur une fenêtre glissante (tranches de slot_seconds) + journal des requêtes lentes
+
+    def __init__(self, window_seconds=3600, slot_seconds=60, max_fingerprints=1000,
+                 slow_threshold=1.0, slow_log_path="slow_queries.log", slow_log_max_bytes=10 * 1024 * 1024, recent_slow=100):
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self.max_fingerprints = max_fingerprints
+        self.slow_threshold = slow_threshold
+        self.slow_log_path = slow_log_path
+        self.slow_log_max_bytes = slow_log_max_bytes
+        self._slots = deque()
+        self._recent_slow = deque(maxlen=recent_slow)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.slow_logged = 0
+
+    def _slot(self, now):
+        start = now - now % self.slot_seconds
+        if not self._slots or self._slots[-1][0] != start:
+            self._slots.append((start, {}))
+        while self._slots and self._slots[0][0] <= now - self.window_seconds:
+            self._slots.popleft()
+        return self._slots[-1][1]
+
+    def record(self, query, fmt, elapsed, rows, io=None):
+        fingerprint, normalized = fingerprint_sql(query)
+        bytes_fetched = (io or {}).get("bytes_fetched") or 0
+        now = time.time()
+        with self._lock:
+            slot = self._slot(now)
+            agg = slot.get(fingerprint)
+            if agg is None:
+                if len(slot) >= self.max_fingerprints:
+                    self.dropped += 1
+                    agg = slot.setdefault("other", Aggregate("(other query shapes)"))
+                else:
+                    agg = slot[fingerprint] = Aggregate(normalized)
+            agg.add(elapsed, rows, bytes_fetched)
+            self.recorded += 1
+
+        if elapsed >= self.slow_threshold:
+            self._log_slow({
+                "ts": round(now, 3),
+                "hostname": os.uname().nodename,
+                "fingerprint": fingerprint,
+                "latency": round(elapsed, 4),
+                "rows": rows,
+                "bytes_fetched": bytes_fetched,
+                "format": fmt,
+                "query": query[:SLOW_QUERY_TEXT_LIMIT],
+            })
+
+    # JSON Lines, une rotation (.1) au-delà de slow_log_max_bytes
+    def _log_slow(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._recent_slow.append(entry)
+            self.slow_logged += 1
+            if not self.slow_log_path:
+                return
+            try:
+                if os.path.exists(self.slow_log_path) and os.path.getsize(self.slow_log_path) + len(line) > self.slow_log_max_bytes:
+                    os.replace(self.slow_log_path, self.slow_log_path + ".1")
+                with open(self.slow_log_path, "a") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"⚠️ Failed to write slow query log: {e}")
+
+    def snapshot(self):
+        now = time.time()
+        merged = {}
+        with self._lock:
+            self._slot(now)
+            for _, slot in self._slots:
+                for fingerprint, agg in slot.items():
+                    merged.setdefault(fingerprint, Aggregate()).merge(agg.raw())
+            slow = list(self._recent_slow)
+        return {
+            "hostname": os.uname().nodename,
+            "window_seconds": self.window_seconds,
+            "fingerprints": {fp: agg.raw() for fp, agg in merged.items()},
+            "slow_queries": slow,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_seconds": self.window_seconds,
+                "fingerprints": len({fp for _, slot in self._slots for fp in slot}),
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "slow_threshold": self.slow_threshold,
+                "slow_logged": self.slow_logged,
+                "slow_log_path": self.slow_log_path,
+            }
+
+
+def create_workload_store():
+    return WorkloadStore(
+        window_seconds=int(os.getenv("WORKLOAD_WINDOW_SECONDS", "3600")),
+        slot_seconds=int(os.getenv("WORKLOAD_SLOT_SECONDS", "60")),
+        max_fingerprints=int(os.getenv("WORKLOAD_MAX_FINGERPRINTS", "1000")),
+        slow_threshold=float(os.getenv("SLOW_QUERY_SECONDS", "1.0")),
+        slow_log_path=os.getenv("SLOW_QUERY_LOG", "slow_queries.log"),
+        slow_log_max_bytes=int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    )
+
+
+def fetch_node_workload(url):
+    resp = requests.get(f"{url}/workload", params={"scope": "node"}, timeout=WORKLOAD_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
+
+
+# Vue cluster : snapshots de chaque noeud fusionnés par empreinte, triés par temps total
+def merge_workloads(snapshots, top, order_by="total_time"):
+    merged, nodes = {}, {}
+    slow = []
+    for snap in snapshots:
+        for fingerprint, raw in snap["fingerprints"].items():
+            merged.setdefault(fingerprint, Aggregate()).merge(raw)
+            nodes.setdefault(fingerprint, []).append(snap["hostname"])
+        slow += snap["slow_queries"]
+
+    grand_total = sum(agg.total_time for agg in merged.values())
+    shapes = []
+    for fingerprint, agg in merged.items():
+        summary = agg.summary()
+        summary["fingerprint"] = fingerprint
+        summary["share_of_time"] = round(agg.total_time / grand_total, 4) if grand_total else 0.0
+        summary["nodes"] = sorted(set(nodes[fingerprint]))
+        shapes.append(summary)
+    shapes.sort(key=lambda s: s.get(order_by) or 0, reverse=True)
+    slow.sort(key=lambda e: e["ts"], reverse=True)
+    return {
+        "total_queries": sum(agg.count for agg in merged.values()),
+        "total_time": round(grand_total, 6),
+        "shapes": shapes[:top],
+        "slow_queries": slow[:top],
+    }
+
+
+def cluster_workload(nodes, top, order_by):
+    with ThreadPoolExecutor(max_workers=len(nodes)) as pool:
+        futures = {url: pool.submit(fetch_node_workload, url) for url, _ in nodes}
+    snapshots, errors = [], {}
+    for url, future in futures.items():
+        try:
+            snapshots.append(future.result())
+        except Exception as e:
+            print(f"⚠️ Workload fetch failed on {url}: {e}")
+            errors[url] = str(e)
+    return {**merge_workloads(snapshots, top, order_by), "nodes": [s["hostname"] for s in snapshots], "errors": errors}
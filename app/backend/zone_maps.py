@@ -0,0 +1,305 @@
+import os, json, time, sqlite3, threading
+from contextlib import contextmanager
+import pyarrow as pa
+from sqlglot import parse_one, exp
+from file_stats import stat_files
+from metadata_cache import sql_list
+from pruning import ScanStats, parquet_scans, scan_predicates, evaluate_row_groups, replace_scan_path, sql_literal
+
+# Table au format parquet_metadata reconstruite depuis l'index (colonnes lues par pruning.evaluate_row_groups)
+INDEX_SCHEMA = pa.schema([
+    ("file_name", pa.string()),
+    ("row_group_id", pa.int64()),
+    ("row_group_num_rows", pa.int64()),
+    ("path_in_schema", pa.string()),
+    ("stats_min_value", pa.string()),
+    ("stats_max_value", pa.string()),
+    ("stats_null_count", pa.int64()),
+    ("total_compressed_size", pa.int64()),
+])
+
+
+class ZoneMapIndex:
+    # Zone maps par glob indexé : min / max / null_count par row group pour les colonnes choisies,
+    # lus dans les footers et persistés en SQLite. Rafraîchi au listing : seuls les fichiers nouveaux
+    # ou modifiés (etag ou mtime, size) sont relus, les fichiers disparus sont retirés.
+
+    def __init__(self, path="zone_maps.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        # Table Arrow par glob, reconstruite après un rafraîchissement qui change l'index
+        self._tables = {}
+        self.footers_read = 0
+        self.rewrites = 0
+        self.files_total = 0
+        self.files_kept = 0
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS zone_map_datasets (
+                    pattern TEXT PRIMARY KEY,
+                    schema TEXT NOT NULL,
+                    columns TEXT NOT NULL,
+                    hive TEXT NOT NULL,
+                    refreshed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS zone_map_files (
+                    pattern TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (pattern, path)
+                );
+                CREATE TABLE IF NOT EXISTS zone_map_row_groups (
+                    pattern TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    row_group_id INTEGER NOT NULL,
+                    num_rows INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    PRIMARY KEY (pattern, path, row_group_id)
+                );
+                CREATE TABLE IF NOT EXISTS zone_map_stats (
+                    pattern TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    row_group_id INTEGER NOT NULL,
+                    column_name TEXT NOT NULL,
+                    min_value TEXT,
+                    max_value TEXT,
+                    null_count INTEGER,
+                    PRIMARY KEY (pattern, path, row_group_id, column_name)
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def file_version(f):
+        return f["etag"] or repr(f["last_modified"])
+
+    def _dataset(self, db, pattern):
+        row = db.execute("SELECT schema, columns, hive, refreshed_at FROM zone_map_datasets WHERE pattern = ?", [pattern]).fetchone()
+        if row is None:
+            return None
+        return {"schema": json.loads(row[0]), "columns": json.loads(row[1]), "hive": json.loads(row[2]), "refreshed_at": row[3]}
+
+    def patterns(self):
+        with self._connect() as db:
+            return [row[0] for row in db.execute("SELECT pattern FROM zone_map_datasets").fetchall()]
+
+    def _delete_files(self, db, pattern, paths):
+        for table in ("zone_map_files", "zone_map_row_groups", "zone_map_stats"):
+            db.executemany(f"DELETE FROM {table} WHERE pattern = ? AND path = ?", [(pattern, p) for p in paths])
+
+    # Création (columns obligatoire ou toutes les colonnes parquet) ou rafraîchissement incrémental d'un glob
+    # columns différentes de celles de l'index : reconstruction complète ; fresh : listing relu sur S3
+    def refresh(self, con, pattern, columns=None, fresh=False):
+        files = stat_files(con, pattern, fresh)
+        if files is None:
+            raise ValueError(f"Zone maps need a listable path (s3:// or local): {pattern}")
+        if not files:
+            raise FileNotFoundError(f"No files found that match the pattern \"{pattern}\"")
+
+        t0 = time.time()
+        with self._lock:
+            with self._connect() as db:
+                dataset = self._dataset(db, pattern)
+                indexed = dict(((p, (v, s)) for p, v, s in db.execute(
+                    "SELECT path, version, size FROM zone_map_files WHERE pattern = ?", [pattern]
+                ).fetchall()))
+            rebuild = dataset is None or (columns is not None and sorted(columns) != sorted(dataset["columns"]))
+            if rebuild:
+                indexed = {}
+
+            current = {f["path"]: (self.file_version(f), f["size"]) for f in files}
+            changed = [p for p, version in current.items() if indexed.get(p) != version]
+            removed = [p for p in indexed if p not in current]
+
+            if changed:
+                schema = dict(con.execute(f"SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM read_parquet({sql_literal(pattern)}))").fetchall())
+                con.execute(f"CREATE OR REPLACE TEMP TABLE zone_map_footers AS SELECT * FROM parquet_metadata({sql_list(changed)})")
+                try:
+                    physical = {row[0] for row in con.execute("SELECT DISTINCT path_in_schema FROM zone_map_footers").fetchall()}
+                    if rebuild:
+                        columns = list(columns) if columns is not None else [c for c in schema if c in physical]
+                        unknown = [c for c in columns if c not in schema]
+                        if unknown:
+                            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+                        partitions = [c for c in columns if c not in physical]
+                        if partitions:
+                            raise ValueError(f"Not parquet column(s), hive partitions are read from the paths: {', '.join(partitions)}")
+                    else:
+                        columns = dataset["columns"]
+                    row_groups = con.execute("""
+                        SELECT file_name, row_group_id, ANY_VALUE(row_group_num_rows), SUM(total_compressed_size)
+                        FROM zone_map_footers
+                        GROUP BY file_name, row_group_id
+                    """).fetchall()
+                    stats = con.execute("""
+                        SELECT file_name, row_group_id, path_in_schema, stats_min_value, stats_max_value, stats_null_count
+                        FROM zone_map_footers
+                        WHERE path_in_schema IN ?
+                    """, [columns or [""]]).fetchall()
+                finally:
+                    con.execute("DROP TABLE IF EXISTS zone_map_footers")
+                # Partitions hive : colonnes hors footers présentes en "nom=" dans les chemins
+                hive = [c for c in schema if c not in physical and any(f"/{c}=" in p for p in current)]
+            else:
+                schema, columns, hive = dataset["schema"], dataset["columns"], dataset["hive"]
+                row_groups, stats = [], []
+
+            with self._connect() as db:
+                if rebuild:
+                    for table in ("zone_map_files", "zone_map_row_groups", "zone_map_stats"):
+                        db.execute(f"DELETE FROM {table} WHERE pattern = ?", [pattern])
+                self._delete_files(db, pattern, changed + removed)
+                db.executemany("INSERT INTO zone_map_files VALUES (?, ?, ?, ?)", [(pattern, p, *current[p]) for p in changed])
+                db.executemany("INSERT INTO zone_map_row_groups VALUES (?, ?, ?, ?, ?)", [(pattern, *row) for row in row_groups])
+                db.executemany("INSERT INTO zone_map_stats VALUES (?, ?, ?, ?, ?, ?, ?)", [(pattern, *row) for row in stats])
+                db.execute(
+                    "INSERT OR REPLACE INTO zone_map_datasets VALUES (?, ?, ?, ?, ?)",
+                    [pattern, json.dumps(schema), json.dumps(columns), json.dumps(hive), time.time()],
+                )
+            if changed or removed:
+                self._tables.pop(pattern, None)
+            self.footers_read += len(changed)
+
+        return {
+            "s3_path": pattern,
+            "columns": columns,
+            "hive_columns": hive,
+            "files": len(current),
+            "files_read": len(changed),
+            "files_removed": len(removed),
+            "files_unchanged": len(current) - len(changed),
+            "rebuilt": rebuild,
+            "refresh_time": round(time.time() - t0, 4),
+        }
+
+    def _table(self, pattern):
+        with self._lock:
+            table = self._tables.get(pattern)
+            if table is not None:
+                return table
+            with self._connect() as db:
+                rows = db.execute("""
+                    SELECT path, row_group_id, num_rows, NULL, NULL, NULL, NULL, bytes
+                    FROM zone_map_row_groups WHERE pattern = ?
+                    UNION ALL
+                    SELECT s.path, s.row_group_id, r.num_rows, s.column_name, s.min_value, s.max_value, s.null_count, 0
+                    FROM zone_map_stats s JOIN zone_map_row_groups r USING (pattern, path, row_group_id)
+                    WHERE s.pattern = ?
+                """, [pattern, pattern]).fetchall()
+            columns = list(zip(*rows)) if rows else [[] for _ in INDEX_SCHEMA]
+            table = pa.table([pa.array(c, type=f.type) for c, f in zip(columns, INDEX_SCHEMA)], schema=INDEX_SCHEMA)
+            self._tables[pattern] = table
+            return table
+
+    # Remplace chaque glob indexé de la requête par la liste des fichiers dont les zone maps peuvent
+    # satisfaire le WHERE. Renvoie (requête, infos), infos = None si aucun glob indexé n'est utilisé.
+    def rewrite(self, con, query):
+        indexed = [p for p in self.patterns() if sql_literal(p) in query]
+        if not indexed:
+            return query, None
+
+        t0 = time.time()
+        tree = parse_one(query, read="duckdb")
+        scans = parquet_scans(tree)
+        datasets, refreshes = {}, {}
+        # Listing relu (pas celui du catalogue) : un fichier arrivé depuis doit rester dans la liste réécrite
+        for pattern in {s["paths"][0] for s in scans if len(s["paths"]) == 1 and s["paths"][0] in indexed}:
+            refreshes[pattern] = self.refresh(con, pattern, fresh=True)
+            with self._connect() as db:
+                datasets[pattern] = self._dataset(db, pattern)
+        for scan in scans:
+            dataset = datasets.get(scan["paths"][0]) if len(scan["paths"]) == 1 else None
+            scan["schema"] = dataset["schema"] if dataset else {}
+
+        kept, info = {}, []
+        for scan in scans:
+            pattern = scan["paths"][0]
+            if pattern not in datasets or len(scan["paths"]) != 1:
+                continue
+            select = scan["table"].find_ancestor(exp.Select)
+            entry = {"s3_path": pattern, "alias": scan["alias"]}
+            # Jointure externe / ASOF / POSITIONAL : un fichier écarté changerait les lignes appariées ou complétées par NULL
+            # Liste de colonnes dans l'alias (t(a, b)) : les noms du WHERE ne sont plus ceux des zone maps
+            skipped = None
+            if select is not None and any(j.side or j.text("method").lower() in ("asof", "positional") for j in select.args.get("joins") or []):
+                skipped = "outer, asof or positional join"
+            elif scan["column_aliases"]:
+                skipped = "column alias list"
+            if skipped:
+                entry["skipped"] = skipped
+                kept[pattern] = None
+                info.append(entry)
+                continue
+            dataset = datasets[pattern]
+            stats = ScanStats(scan["alias"], dataset["schema"], set(dataset["columns"]), set(dataset["hive"]))
+            summary, files = evaluate_row_groups(con, self._table(pattern), stats, scan_predicates(scan, scans, stats))
+            entry.update(summary)
+            info.append(entry)
+            if kept.get(pattern, set()) is not None:
+                kept[pattern] = kept.get(pattern, set()) | set(files)
+
+        rewritten = query
+        for pattern, files in kept.items():
+            total = refreshes[pattern]["files"]
+            if files is None or len(files) >= total:
+                continue
+            # Aucun fichier possible : on garde le premier pour conserver le schéma (le WHERE ne renvoie rien)
+            files = sorted(files) or self._table(pattern)["file_name"].to_pylist()[:1]
+            if not files:
+                continue
+            rewritten = replace_scan_path(rewritten, pattern, files)
+            with self._lock:
+                self.rewrites += 1
+                self.files_total += total
+                self.files_kept += len(files)
+            print(f"🗺️ Zone maps: {pattern} -> {len(files)}/{total} files")
+
+        return rewritten, {"rewritten": rewritten != query, "scans": info, "refresh": list(refreshes.values()), "rewrite_time": round(time.time() - t0, 4)}
+
+    def drop(self, pattern):
+        with self._lock, self._connect() as db:
+            found = db.execute("DELETE FROM zone_map_datasets WHERE pattern = ?", [pattern]).rowcount
+            for table in ("zone_map_files", "zone_map_row_groups", "zone_map_stats"):
+                db.execute(f"DELETE FROM {table} WHERE pattern = ?", [pattern])
+            self._tables.pop(pattern, None)
+        return bool(found)
+
+    def list(self):
+        with self._connect() as db:
+            rows = db.execute("""
+                SELECT d.pattern, d.columns, d.hive, d.refreshed_at,
+                       (SELECT COUNT(*) FROM zone_map_files f WHERE f.pattern = d.pattern),
+                       (SELECT COUNT(*) FROM zone_map_row_groups r WHERE r.pattern = d.pattern)
+                FROM zone_map_datasets d
+                ORDER BY d.pattern
+            """).fetchall()
+        return [
+            {"s3_path": p, "columns": json.loads(c), "hive_columns": json.loads(h), "refreshed_at": t, "files": f, "row_groups": rg}
+            for p, c, h, t, f, rg in rows
+        ]
+
+    def stats(self):
+        with self._connect() as db:
+            datasets, files = db.execute("SELECT (SELECT COUNT(*) FROM zone_map_datasets), (SELECT COUNT(*) FROM zone_map_files)").fetchone()
+        with self._lock:
+            return {
+                "path": self.path,
+                "datasets": datasets,
+                "files": files,
+                "footers_read": self.footers_read,
+                "rewrites": self.rewrites,
+                "files_kept_ratio": round(self.files_kept / self.files_total, 3) if self.files_total else None,
+            }
+
+
+def create_zone_map_index():
+    return ZoneMapIndex(path=os.getenv("ZONE_MAP_DB_PATH", "zone_maps.db"))
@@ -7,6 +7,7 @@ from tabs.tuning_tab import run_tuning_tab
 from tabs.partition_tab import run_partition_tab
 from tabs.bloom_filter_tab import run_bloom_filter_tab
 from tabs.query_optimizer_tab import run_query_optimizer_tab
+from tabs.workload_tab import run_workload_tab
 
 st.set_page_config(page_title="DuckDB Client", layout="wide")
 
@@ -48,7 +49,8 @@ tabs = st.tabs([
     "⚙️ Tuning",
     "🧩 Partitioning",
     "🧬 Bloom Filter",    
-    "🧠 SQL Query Optimizer"         
+    "🧠 SQL Query Optimizer",
+    "📈 Workload"
 ])
 
 
@@ -70,3 +72,6 @@ with tabs[4]:
 
 with tabs[5]:
     run_query_optimizer_tab(TUNING_BASE_URL, disable_ssl_verification)
+
+with tabs[6]:
+    run_workload_tab(TUNING_BASE_URL, disable_ssl_verification)
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import pandas as pd
+from tabs.partition_tab import sampling_controls, show_sample_info, show_sketch_info
 
 def run_bloom_filter_tab(base_url: str, disable_ssl_verification: bool):
     st.title("🔍 Parquet Bloom & Filterability Analysis")
@@ -13,7 +14,7 @@ def run_bloom_filter_tab(base_url: str, disable_ssl_verification: bool):
         st.warning("❗ Please enter a valid S3 path starting with s3://")
         #return
 
-    tab1, tab2 = st.tabs(["📊 Filterability Score", "🧪 Bloom Filter Presence"])
+    tab1, tab2, tab3 = st.tabs(["📊 Filterability Score", "🧪 Bloom Filter Presence", "🎯 Bloom Filter Effectiveness"])
 
     # --- Tab 1: Filterability Score ---
     with tab1:
@@ -28,12 +29,15 @@ def run_bloom_filter_tab(base_url: str, disable_ssl_verification: bool):
         Use this to identify columns that are efficient for **predicate pushdown**.
         """)
 
+        use_sketches = st.checkbox("🧮 Reuse per-file sketches (only new or changed files are scanned)", key="filterability_sketches")
+        sample = None if use_sketches else sampling_controls("filterability")
+
         if st.button("🔍 Analyze Filterability"):
             try:
                 with st.spinner("⏳ Running filterability analysis..."):
                     resp = requests.post(
                         f"{base_url}/parquet_filterability_score",
-                        json={"s3_path": s3_path},
+                        json={"s3_path": s3_path, "sample": sample, "use_sketches": use_sketches},
                         verify=not disable_ssl_verification
                     )
 
@@ -59,6 +63,8 @@ def run_bloom_filter_tab(base_url: str, disable_ssl_verification: bool):
 
                     # Affichage du tableau
                     st.success("✅ Filterability analysis complete")
+                    show_sample_info(data.get("sample"))
+                    show_sketch_info(data.get("profile"))
                     st.dataframe(df[[ 
                         "column", 
                         "distinct_values", 
@@ -141,3 +147,47 @@ def run_bloom_filter_tab(base_url: str, disable_ssl_verification: bool):
 
             except Exception as e:
                 st.error(f"Request failed: {e}")
+
+    # --- Tab 3: Bloom Filter Effectiveness ---
+    with tab3:
+        st.subheader("🎯 Measured Bloom Filter Effectiveness")
+        st.markdown("""
+        Runs point lookups (`col = value`) with values sampled from the data (present) and values inside the column's min/max range that do not occur (absent). Each lookup is compared with a min/max-only lookup (`col >= value AND col <= value`).
+        - **False positive rate**: share of row groups, for absent values, that the bloom filter failed to skip
+        - **Skipped**: row groups kept by min/max but skipped by the bloom filter
+        - **Bytes / latency saved**: compared to the min/max-only lookup
+        """)
+
+        columns = st.text_input("Columns (comma separated, empty = columns with bloom filters):", "", key="bloom_probe_columns")
+        col1, col2 = st.columns(2)
+        values_per_column = col1.number_input("Values per column (present and absent)", min_value=1, value=5)
+        repetitions = col2.number_input("Repetitions per lookup", min_value=1, value=3)
+
+        if st.button("🎯 Probe Bloom Filters"):
+            payload = {
+                "s3_path": s3_path,
+                "columns": [c.strip() for c in columns.split(",") if c.strip()] or None,
+                "values_per_column": int(values_per_column),
+                "repetitions": int(repetitions),
+            }
+            try:
+                with st.spinner("⏳ Running point lookups..."):
+                    resp = requests.post(f"{base_url}/parquet_bloom_filter_probe", json=payload, verify=not disable_ssl_verification)
+
+                if resp.status_code == 200:
+                    data = resp.json()
+                    df = pd.DataFrame(data["columns"])
+                    if df.empty:
+                        st.info("No column with bloom filters: list columns explicitly to probe them.")
+                    else:
+                        st.success(f"✅ Probed {len(df)} column(s) over {data['files']} file(s) (seed {data['seed']})")
+                        st.dataframe(df, use_container_width=True)
+                        if "bytes_saved" in df:
+                            st.markdown("### 💾 Column bytes saved vs min/max only")
+                            st.bar_chart(df.set_index("column")[["bytes_saved", "bloom_filter_bytes_read"]])
+                else:
+                    st.error("❌ Backend error:")
+                    st.text(resp.text)
+
+            except Exception as e:
+                st.error(f"Request failed: {e}")
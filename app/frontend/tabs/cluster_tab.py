@@ -44,9 +44,9 @@ def run_cluster_tab(STATUS_URL, disable_ssl_verification):
                     "Node": node,
                     "CPU Count (total cores)": cpu_count,
                     "CPU Load (1m avg)": cpu_load_1m,
-                    "Memory Used (%)": mem.get('percent', 0),
+                    "Memory Used (%)": mem.get('percent') or 0,
                     "Memory Total (GB)": mem_total / (1024**3),
-                    "Memory Used (GB)": mem.get('used', 0) / (1024**3),
+                    "Memory Used (GB)": (mem.get('used') or 0) / (1024**3),
                 })
             df_summary = pd.DataFrame(rows)
 
@@ -73,12 +73,14 @@ def run_cluster_tab(STATUS_URL, disable_ssl_verification):
                 st.markdown(f"### Node: `{node}`")
                 st.json(status)
                 st.markdown(f"**OS:** {status.get('os')} - **Architecture:** {status.get('architecture')}")
-                st.markdown(f"**CPU count (logical):** {status.get('cpu_count')}")
+                st.markdown(f"**CPU count (effective / host):** {status.get('cpu_count')} / {status.get('host_cpu_count')}")
                 st.markdown(f"**CPU Load (1m,5m,15m):** {status.get('cpu_load')}")
                 mem = status.get('memory', {})
                 st.markdown(f"**Memory Total:** {mem.get('total',0) // (1024**2)} MB")
                 st.markdown(f"**Memory Used:** {mem.get('used',0) // (1024**2)} MB ({mem.get('percent',0)}%)")
-                st.markdown(f"**Memory Available:** {mem.get('available',0) // (1024**2)} MB")
+                st.markdown(f"**Memory Available:** {(mem.get('total',0) - (mem.get('used') or 0)) // (1024**2)} MB")
+                duckdb_settings = status.get('duckdb', {})
+                st.markdown(f"**DuckDB:** {duckdb_settings.get('threads')} threads, memory_limit {duckdb_settings.get('memory_limit')}, temp_directory `{duckdb_settings.get('temp_directory')}`")
                 st.markdown("---")
 
         else:
@@ -1,6 +1,34 @@
 import streamlit as st
 import requests
 import pandas as pd
+import time
+
+# Suivi des jobs de réécriture : timeout par appel HTTP, attente bornée (le job continue côté backend)
+JOB_REQUEST_TIMEOUT = 30
+JOB_MAX_WAIT = 2 * 3600
+
+def sampling_controls(key: str):
+    if not st.checkbox("🎲 Estimate on a sample", key=f"{key}_sample"):
+        return None
+    methods = {"Percent of rows": "percent", "Number of rows": "rows", "Random row groups": "row_groups", "Random files": "files"}
+    label = st.selectbox("Sampling method", list(methods.keys()), key=f"{key}_method")
+    value = st.number_input("Sample size (percent, rows, row groups or files)", min_value=1.0, value=10.0, key=f"{key}_value")
+    return {"method": methods[label], "value": value}
+
+def show_sketch_info(profile):
+    sketches = (profile or {}).get("sketches")
+    if sketches:
+        st.caption(
+            f"🧮 Merged sketches of {sketches['files']} file(s): "
+            f"{sketches['scanned_files']} scanned, {sketches['reused_files']} reused"
+        )
+
+def show_sample_info(sample):
+    if sample:
+        st.caption(
+            f"🎲 Estimated from {sample['sampled_rows']} of {sample['total_rows']} rows "
+            f"({sample['fraction_rows'] * 100:.1f}% of rows, {sample['fraction_bytes_read'] * 100:.1f}% of bytes read)"
+        )
 
 def run_partition_tab(base_url: str, disable_ssl_verification: bool):
     st.subheader("🧩 Partition Recommendation")
@@ -13,6 +41,8 @@ def run_partition_tab(base_url: str, disable_ssl_verification: bool):
 
     threshold = st.slider("🔢 Max DISTINCT values to consider for partitioning", min_value=2, max_value=10, value=5)
     show_value_distribution = st.checkbox("🔎 Show value distribution for suggested partitions")
+    use_sketches = st.checkbox("🧮 Reuse per-file sketches (only new or changed files are scanned)", key="partition_sketches")
+    sample = None if use_sketches else sampling_controls("partition")
 
     if st.button("Analyze Columns"):
         if not s3_path.startswith("s3://"):
@@ -23,7 +53,7 @@ def run_partition_tab(base_url: str, disable_ssl_verification: bool):
             with st.spinner("🚀 Analyzing columns... please wait"):
                 resp = requests.post(
                     f"{base_url}/suggest_partitions",
-                    json={"s3_path": s3_path, "threshold": threshold},
+                    json={"s3_path": s3_path, "threshold": threshold, "sample": sample, "use_sketches": use_sketches},
                     verify=not disable_ssl_verification
                 )
 
@@ -31,6 +61,7 @@ def run_partition_tab(base_url: str, disable_ssl_verification: bool):
                 data = resp.json()
                 suggested = data["suggested_partitions"]
                 already_partitioned = data.get("already_partitioned_columns", [])
+                st.session_state["suggested_partitions"] = suggested
 
                 df = pd.DataFrame(data["columns"])
                 df["distinct_values"] = pd.to_numeric(df["distinct_values"], errors='coerce')
@@ -39,6 +70,12 @@ def run_partition_tab(base_url: str, disable_ssl_verification: bool):
                 df = df.sort_values("distinct_values", na_position="last")
 
                 st.markdown(f"### 🔍 Column Analysis (Threshold: ≤ {threshold})")
+                profile = data.get("profile")
+                if profile:
+                    read = f", {profile['bytes_read'] / 1024 / 1024:.1f} MB read" if profile.get("bytes_read") is not None else ""
+                    st.caption(f"⏱️ Profiled {profile['total_rows']} rows in {profile['scans']} scan(s), {profile['scan_time']:.2f}s{read}")
+                show_sample_info(data.get("sample"))
+                show_sketch_info(profile)
                 st.dataframe(df[[ 
                     "column", 
                     "distinct_values", 
@@ -78,7 +115,7 @@ def run_partition_tab(base_url: str, disable_ssl_verification: bool):
                                 with st.spinner(f"📊 Fetching value distribution for `{col}`..."):
                                     value_resp = requests.post(
                                         f"{base_url}/partition_value_counts",
-                                        json={"s3_path": s3_path, "column": col},
+                                        json={"s3_path": s3_path, "column": col, "sample": sample},
                                         verify=not disable_ssl_verification
                                     )
                                 if value_resp.status_code == 200:
@@ -97,3 +134,56 @@ def run_partition_tab(base_url: str, disable_ssl_verification: bool):
 
         except Exception as e:
             st.error(f"Request error: {e}")
+
+    st.markdown("---")
+    st.markdown("### 🏗️ Repartition")
+    st.caption("Writes the files matched by the path above as a hive-partitioned dataset (defaults to the last suggested columns). Without an output path, the dataset is replaced once the new files are verified.")
+
+    partition_by = st.text_input("Partition columns (comma separated, in nesting order):", ", ".join(st.session_state.get("suggested_partitions", [])))
+    col1, col2 = st.columns(2)
+    target_file_size_mb = col1.number_input("Target file size (MB)", min_value=1, value=256, key="repartition_file_size")
+    max_partitions = col2.number_input("Max partitions", min_value=1, value=1000)
+    output_path = st.text_input("Output path (empty = replace the dataset in place):", "", key="repartition_output")
+
+    if st.button("Repartition"):
+        payload = {
+            "s3_path": s3_path,
+            "partition_by": [c.strip() for c in partition_by.split(",") if c.strip()],
+            "output_path": output_path or None,
+            "target_file_size_mb": int(target_file_size_mb),
+            "max_partitions": int(max_partitions),
+        }
+        try:
+            resp = requests.post(f"{base_url}/repartition_parquet", json=payload, verify=not disable_ssl_verification, timeout=JOB_REQUEST_TIMEOUT)
+            if resp.status_code != 202:
+                st.error("Error while submitting the repartition job.")
+                st.text(resp.text)
+                return
+
+            job_id = resp.json()["job_id"]
+            deadline = time.time() + JOB_MAX_WAIT
+            with st.spinner(f"Repartition job {job_id} running..."):
+                while True:
+                    job = requests.get(f"{base_url}/jobs/{job_id}", verify=not disable_ssl_verification, timeout=JOB_REQUEST_TIMEOUT).json()
+                    if job["status"] not in ("queued", "running"):
+                        break
+                    if time.time() > deadline:
+                        st.warning(f"Repartition job {job_id} still {job['status']} after {JOB_MAX_WAIT}s, check GET /jobs/{job_id} later.")
+                        return
+                    time.sleep(2)
+
+            if job["status"] != "succeeded":
+                st.error(f"Repartition {job['status']}: {job.get('error')}")
+                return
+
+            report = job["report"]
+            skew = report["skew"]
+            st.success(f"{skew['partitions']} partitions, {report['after']['files']} files written in {report['write_time']}s ({report['verified']} verified)")
+            st.markdown(f"**Skew (largest / mean rows):** {skew['skew']} — rows per partition min {skew['rows_min']}, median {skew['rows_median']}, max {skew['rows_max']}")
+            if skew["small_partitions"]:
+                st.warning(f"⚠️ {skew['small_partitions']} partition(s) under 100 MB: consider fewer partition columns.")
+            st.dataframe(pd.DataFrame(skew["largest"]))
+            st.caption(f"Per partition: {report['partition_actions']}")
+            st.dataframe(pd.DataFrame({"Before": report["before"], "After": report["after"]}))
+        except Exception as e:
+            st.error(f"Request error: {e}")
@@ -1,6 +1,7 @@
 import requests
 import streamlit as st
 import difflib
+from tabs.query_tab import run_job, show_profile_summary, REQUEST_TIMEOUT
 
 def diff_explanation(sql1, sql2):
     d = difflib.unified_diff(
@@ -27,15 +28,39 @@ def fetch_execution_plan(query_url: str, disable_ssl_verification: bool, query,
         query_url,
         json={"query": query, "profiling": True, "max_rows": 1, "num_threads": -1},
         verify=not disable_ssl_verification,
-        timeout=10,
+        timeout=REQUEST_TIMEOUT,
     )
     if res.ok:
-        plan = res.json().get("profiling", "")
+        data = res.json()
         st.subheader(f"🗺️ Execution Plan - {label}")
-        st.json(plan)
+        show_profile_summary(data)
+        with st.expander("Profiling JSON"):
+            st.json(data.get("profiling", ""))
     else:
         st.error(f"Failed to fetch execution plan for {label}")
 
+def show_pruning_estimate(base_url: str, disable_ssl_verification: bool, query):
+    res = requests.post(base_url + "/analyze/pruning", json={"sql": query}, verify=not disable_ssl_verification, timeout=REQUEST_TIMEOUT)
+    data = res.json() if res.ok else {"error": res.text}
+    st.subheader("✂️ Data Skipping Estimate")
+    if "error" in data:
+        st.warning(f"Pruning estimate unavailable: {data['error']}")
+        return
+    if not data["scans"]:
+        st.info("No read_parquet / parquet_scan source in this query.")
+        return
+    for scan in data["scans"]:
+        st.markdown(f"**`{scan['alias']}`** — `{scan['source']}`")
+        cols = st.columns(4)
+        for col, key in zip(cols, ("files", "row_groups", "rows", "bytes")):
+            col.metric(key.replace("_", " ").title(), f"{scan[key]['scanned']:,} / {scan[key]['total']:,}")
+        if scan["skipped_percent"] > 0:
+            st.success(f"~{scan['skipped_percent']}% of the bytes skipped by min/max statistics and hive partitions")
+        else:
+            st.warning("No data skipping: every row group would be read.")
+        if scan["predicates"]:
+            st.dataframe(scan["predicates"], use_container_width=True)
+
 def run_query_optimizer_tab(base_url: str, disable_ssl_verification: bool):
     st.header("🧠 SQL Optimizer")
 
@@ -89,32 +114,15 @@ def run_query_optimizer_tab(base_url: str, disable_ssl_verification: bool):
             for label, query in payloads:
                 with st.expander(f"▶️ {label} Execution Result", expanded=False):
                     try:
-                        res = requests.post(
-                            QUERY_URL,
-                            json={
-                                "query": query,
-                                "profiling": False,
-                                "max_rows": 50,
-                                "num_threads": -1
-                            },
-                            verify=not disable_ssl_verification,
-                            timeout=10
-                        )
-                        if res.ok:
-                            data = res.json()
-                            st.success(f"{label} executed successfully.")
-                            st.write(f"⏱️ Time: {round(data.get('execution_time'),3) if data.get('execution_time') else 'N/A'} s")
-                            if "columns" in data and "rows" in data:
-                                st.dataframe([dict(zip(data["columns"], row)) for row in data["rows"]])
-                            elif "profiling" in data:
-                                st.json(data["profiling"])
-                            else:
-                                st.write(data)
-                        else:
-                            st.error(f"❌ {label} failed with status {res.status_code}")
+                        # Exécution en job : pas de timeout sur la durée de la requête
+                        info, page = run_job(base_url.rstrip("/"), query, 50, disable_ssl_verification)
+                        st.success(f"{label} executed successfully.")
+                        st.write(f"⏱️ Time: {round(info['execution_time'], 3)} s")
+                        st.dataframe([dict(zip(page["columns"], row)) for row in page["rows"]])
                     except Exception as e:
-                        st.error(f"❌ Error calling backend: {e}")
+                        st.error(f"❌ {label} failed: {e}")
 
+            show_pruning_estimate(base_url.rstrip("/"), disable_ssl_verification, sql_original)
             fetch_execution_plan(QUERY_URL, disable_ssl_verification,sql_original, "Original Query")
             fetch_execution_plan(QUERY_URL,disable_ssl_verification,sql_optimized, "Optimized Query")
         except Exception as e:
@@ -2,6 +2,155 @@ import streamlit as st
 import requests
 import time
 import pandas as pd
+import pyarrow as pa
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Timeout par appel HTTP : les requêtes longues passent par /jobs, dont la durée n'est pas bornée
+REQUEST_TIMEOUT = 300
+JOB_POLL_INTERVAL = 0.5
+JOB_FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+def cancel_running_job(base_url, disable_ssl_verification):
+    job_id = st.session_state.pop("job_id", None)
+    if job_id:
+        requests.delete(f"{base_url}/jobs/{job_id}", verify=not disable_ssl_verification, timeout=10)
+        st.info(f"🛑 Cancellation requested for job `{job_id}`")
+
+# Balayage du nombre de threads côté backend, courbe de speedup ; le réglage retenu s'applique aux prochaines exécutions
+def run_autotune(base_url, query, disable_ssl_verification):
+    with st.spinner("Running the query at several thread counts..."):
+        resp = requests.post(f"{base_url}/query/autotune", json={"query": query}, verify=not disable_ssl_verification, timeout=REQUEST_TIMEOUT)
+    if resp.status_code != 200:
+        st.error(f"❌ Auto-tune failed: {resp.json().get('detail', resp.text)}")
+        return
+    data = resp.json()
+    st.success(f"🎯 Best: {data['best_threads']} threads, recommended: {data['recommended_threads']} threads (within {data['tolerance']:.0%} of the best)")
+    df = pd.DataFrame(data["curve"]).set_index("threads")
+    st.line_chart(df[["speedup", "efficiency"]])
+    st.dataframe(df[["median", "min", "mean", "speedup", "efficiency"]], use_container_width=True)
+    if data["remembered"]:
+        st.caption(f"💾 Recommended setting remembered for fingerprint `{data['fingerprint']}` on `{data['hostname']}`")
+
+# Soumet la requête en job, suit sa progression, puis récupère la première page du résultat
+def run_job(base_url, query, max_rows, disable_ssl_verification):
+    verify = not disable_ssl_verification
+    resp = requests.post(f"{base_url}/jobs", json={"query": query}, verify=verify, timeout=30)
+    if resp.status_code == 429:
+        raise RuntimeError(f"{resp.json()['detail']}, retry in {resp.headers.get('Retry-After', '?')}s")
+    resp.raise_for_status()
+    job_id = resp.json()["job_id"]
+    st.session_state["job_id"] = job_id
+
+    bar = st.progress(0, text=f"⏳ Job `{job_id}` queued")
+    while True:
+        info = requests.get(f"{base_url}/jobs/{job_id}", verify=verify, timeout=30).json()
+        if info["status"] in JOB_FINAL_STATUSES:
+            break
+        progress = info.get("progress") or 0
+        bar.progress(min(int(progress), 100), text=f"⏳ Job {info['status']} ({progress:.0f}%)")
+        time.sleep(JOB_POLL_INTERVAL)
+    bar.empty()
+    st.session_state.pop("job_id", None)
+
+    if info["status"] != "succeeded":
+        raise RuntimeError(f"Job {info['status']}" + (f": {info['error']}" if info.get("error") else ""))
+    page = requests.get(f"{base_url}/jobs/{job_id}/results", params={"limit": max_rows}, verify=verify, timeout=30).json()
+    return info, page
+
+def close_server_cursor(API_URL, disable_ssl_verification):
+    previous = st.session_state.pop("query_result", None)
+    if previous and previous.get("cursor_id"):
+        try:
+            requests.delete(f"{API_URL}/cursor/{previous['cursor_id']}", verify=not disable_ssl_verification, timeout=5)
+        except Exception:
+            pass
+
+# Le sélecteur "Maximum number of rows" pagine le curseur serveur au lieu de relancer la requête
+def fetch_more_rows(API_URL, disable_ssl_verification, result, max_rows):
+    while result.get("has_more") and len(result["rows"]) < max_rows:
+        resp = requests.get(
+            f"{API_URL}/cursor/{result['cursor_id']}",
+            params={"page_size": max_rows - len(result["rows"])},
+            verify=not disable_ssl_verification,
+            timeout=REQUEST_TIMEOUT
+        )
+        if not resp.ok:
+            st.warning(f"⚠️ Server cursor unavailable ({resp.status_code}), re-run the query to load more rows.")
+            result["has_more"] = False
+            break
+        page = resp.json()
+        result["rows"] += page["rows"]
+        result["has_more"] = page["has_more"]
+        result["cursor_id"] = page["cursor_id"]
+
+def show_io(io):
+    if not io or not io["requests"]:
+        return
+    st.caption(
+        f"🪣 Object storage: `{io['bytes_fetched'] / 1024 / 1024:.2f} MiB` fetched, "
+        f"{io['range_requests']} range GET, {io['head_requests']} HEAD, {io['list_requests']} LIST, "
+        f"I/O wait ≤ `{io['io_wait_time']:.4f} sec`"
+    )
+
+# Globs remplacés par les fichiers retenus par les zone maps (/zone_maps)
+def show_zone_maps(zone_maps):
+    if not zone_maps or not zone_maps.get("rewritten"):
+        return
+    for scan in zone_maps["scans"]:
+        if "files" in scan:
+            st.caption(f"🗺️ Zone maps: `{scan['s3_path']}` read {scan['files']['scanned']}/{scan['files']['total']} files ({scan['skipped_percent']}% of bytes skipped)")
+
+def show_profile_summary(data):
+    summary = data.get("profile_summary")
+    if not summary:
+        return
+    st.caption(
+        f"🧪 {summary['operators']} operators, `{summary['operator_time']:.4f} sec` operator time, "
+        f"{summary['rows_scanned']} rows scanned"
+        + (f", `{summary['bytes_fetched'] / 1024 / 1024:.2f} MiB` fetched" if summary.get("bytes_fetched") else "")
+        + (f", `{summary['bytes_read'] / 1024 / 1024:.2f} MiB` read" if summary.get("bytes_read") else "")
+    )
+    top = pd.DataFrame(summary["top_operators"])
+    if not top.empty:
+        st.dataframe(top[["operator", "timing", "share", "cardinality", "estimated_cardinality", "q_error", "rows_scanned"]], use_container_width=True)
+    for op in summary["misestimates"]:
+        st.warning(f"⚠️ {op['operator']}: estimated {op['estimated_cardinality']} rows, got {op['cardinality']} (q-error {op['q_error']})")
+
+    comparison = data.get("comparison") or {}
+    if comparison.get("baseline_runs"):
+        msg = f"📉 {comparison['latency_ratio']}x the median of the {comparison['baseline_runs']} previous run(s) ({comparison['baseline_latency']:.4f} sec)"
+        if comparison["regressed"]:
+            st.error(msg)
+        else:
+            st.caption(msg)
+
+def render_paged_result(API_URL, disable_ssl_verification, max_rows, show_result_json):
+    result = st.session_state.get("query_result")
+    if not result:
+        return
+
+    try:
+        fetch_more_rows(API_URL, disable_ssl_verification, result, max_rows)
+    except Exception as e:
+        st.warning(f"⚠️ Failed to fetch more rows: {e}")
+
+    st.success(f"✅ Executed in {result['elapsed']:.4f} seconds")
+    st.caption(f"📡 Served by: `{result['hostname']}`")
+    st.caption(f"⏱️ Backend execution (first page): `{result['execution_time']:.4f} sec`")
+    show_io(result.get("io"))
+    show_zone_maps(result.get("zone_maps"))
+
+    rows = result["rows"][:max_rows]
+    more = " (more available on the server cursor)" if result["has_more"] or len(result["rows"]) > max_rows else ""
+    st.caption(f"📑 Showing {len(rows)} rows{more}")
+
+    df = pd.DataFrame(rows, columns=result["columns"])
+    st.dataframe(df, use_container_width=True)
+
+    if show_result_json:
+        result_json = [dict(zip(result["columns"], row)) for row in rows]
+        st.markdown("### SQL Result (JSON)")
+        st.json(result_json)
 
 def run_query_tab(API_URL, disable_ssl_verification):
     examples = {
@@ -29,6 +178,8 @@ def run_query_tab(API_URL, disable_ssl_verification):
 
         max_rows = st.selectbox("Maximum number of rows to display:", [10, 50, 100, 500, 1000], index=1)
 
+        result_format = st.selectbox("Result format:", ["JSON", "Arrow IPC stream", "Distributed (scatter-gather)", "Background job"])
+
       
         thread_mode = st.selectbox("Thread mode:", ["Default (Auto)", "Custom number of threads"])
         if thread_mode == "Custom number of threads":
@@ -44,24 +195,87 @@ def run_query_tab(API_URL, disable_ssl_verification):
 
         show_result_json = st.checkbox("Show SQL result as JSON", value=False)
         enable_profiling = st.checkbox("Enable profiling", value=False)
+        use_zone_maps = st.checkbox("Skip files with zone maps (indexed globs)", value=False)
+
+        base_url = API_URL.rsplit("/", 1)[0]
+        if st.session_state.get("job_id") and st.button("🛑 Cancel running job"):
+            cancel_running_job(base_url, disable_ssl_verification)
+
+        if st.button("🎯 Auto-tune threads"):
+            if query.strip():
+                run_autotune(base_url, query, disable_ssl_verification)
 
         if st.button("Execute query"):
             if not query.strip():
                 st.warning("Please enter a query.")
                 return
 
+            close_server_cursor(API_URL, disable_ssl_verification)
+
+            if result_format == "Background job":
+                try:
+                    start = time.time()
+                    info, page = run_job(base_url, query, max_rows, disable_ssl_verification)
+                    st.success(f"✅ Executed in {time.time() - start:.4f} seconds")
+                    st.caption(f"⏱️ Queued `{info['queued_time']:.4f} sec`, backend execution `{info['execution_time']:.4f} sec`")
+                    show_io(info.get("io"))
+                    st.caption(f"📑 Showing {len(page['rows'])} of {page['total_rows']} rows")
+                    st.dataframe(pd.DataFrame(page["rows"], columns=page["columns"]), use_container_width=True)
+                except Exception as e:
+                    st.error(f"🚫 Job failed: {e}")
+                return
+
             try:
                 start = time.time()
+                use_arrow = result_format == "Arrow IPC stream" and not enable_profiling
                 payload = {
                     "query": query,
                     "profiling": enable_profiling,
                     "max_rows": max_rows,
-                    "num_threads": num_threads  # 👈 value depends on mode
+                    "num_threads": num_threads,  # 👈 value depends on mode
+                    "cursor": not (use_arrow or enable_profiling),
+                    "use_zone_maps": use_zone_maps
                 }
-                response = requests.post(API_URL, json=payload, verify=not disable_ssl_verification)
+                headers = {"Accept": ARROW_STREAM_MEDIA_TYPE} if use_arrow else {}
+                if result_format == "Distributed (scatter-gather)":
+                    # Fragments répartis sur tous les backends, fusion par le noeud coordinateur
+                    response = requests.post(
+                        base_url + "/distributed_query",
+                        json={"query": query, "max_rows": max_rows},
+                        verify=not disable_ssl_verification,
+                        timeout=REQUEST_TIMEOUT
+                    )
+                else:
+                    response = requests.post(API_URL, json=payload, headers=headers, stream=use_arrow, verify=not disable_ssl_verification, timeout=REQUEST_TIMEOUT)
+
+                if response.status_code == 200 and response.headers.get("content-type", "").startswith(ARROW_STREAM_MEDIA_TYPE):
+                    # Lecture directe des record batches, arrêtée à max_rows (le backend n'ajoute pas de LIMIT en Arrow)
+                    reader = pa.ipc.open_stream(response.raw)
+                    batches = []
+                    for batch in reader:
+                        batches.append(batch)
+                        if sum(b.num_rows for b in batches) >= max_rows:
+                            break
+                    response.close()
+                    df = pa.Table.from_batches(batches, schema=reader.schema).slice(0, max_rows).to_pandas()
+                    elapsed = time.time() - start
+                    st.success(f"✅ Executed in {elapsed:.4f} seconds")
+                    st.caption(f"📡 Served by: `{response.headers.get('x-hostname')}`")
+                    st.caption(f"⏱️ Backend time to first batch: `{float(response.headers.get('x-execution-time', 0)):.4f} sec`")
+                    st.caption(f"📦 {len(df)} rows received as Arrow IPC")
+                    st.dataframe(df, use_container_width=True)
+
+                    if show_result_json:
+                        st.markdown("### SQL Result (JSON)")
+                        st.json(df.astype(str).to_dict(orient="records"))
+                    return
+
                 elapsed = time.time() - start
 
-                if response.status_code == 200:
+                if response.status_code == 200 and "cursor_id" in response.json():
+                    st.session_state["query_result"] = {**response.json(), "elapsed": elapsed}
+
+                elif response.status_code == 200:
                     st.success(f"✅ Executed in {elapsed:.4f} seconds")
                     data = response.json()
 
@@ -71,6 +285,12 @@ def run_query_tab(API_URL, disable_ssl_verification):
                     if "execution_time" in data:
                         st.caption(f"⏱️ Backend execution: `{data['execution_time']:.4f} sec`")
 
+                    if data.get("threads"):
+                        st.caption(f"🧵 Ran with {data['threads']} threads")
+
+                    show_io(data.get("io"))
+                    show_zone_maps(data.get("zone_maps"))
+
                     if "columns" in data and "rows" in data:
                         df = pd.DataFrame(data["rows"], columns=data["columns"])
                         st.dataframe(df, use_container_width=True)
@@ -80,12 +300,24 @@ def run_query_tab(API_URL, disable_ssl_verification):
                             st.markdown("### SQL Result (JSON)")
                             st.json(result_json)
 
+                    if "distributed" in data:
+                        dist = data["distributed"]
+                        st.caption(f"🌐 {dist['files']} file(s) split into {len(dist['fragments'])} fragment(s), {dist['partial_rows']} partial rows merged in {dist['merge_time']:.4f} sec")
+                        st.dataframe(pd.DataFrame(dist["fragments"]), use_container_width=True)
+                        with st.expander("🧩 Distributed plan"):
+                            st.code(dist["fragment_query"], language="sql")
+                            st.code(dist["final_query"], language="sql")
+
                     if enable_profiling and "profiling" in data:
-                        st.markdown("### 🧪 Profiling JSON")
-                        st.json(data["profiling"])
+                        st.markdown("### 🧪 Profile")
+                        show_profile_summary(data)
+                        with st.expander("Profiling JSON"):
+                            st.json(data["profiling"])
 
                 else:
                     st.error(f"❌ Error: {response.json().get('detail', 'Unknown error')}")
 
             except Exception as e:
                 st.error(f"🚫 Query failed: {e}")
+
+        render_paged_result(API_URL, disable_ssl_verification, max_rows, show_result_json)
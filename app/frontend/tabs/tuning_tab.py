@@ -3,6 +3,15 @@ import requests
 import pandas as pd
 import time
 
+# Suivi des jobs de réécriture : timeout par appel HTTP, attente bornée (le job continue côté backend)
+JOB_REQUEST_TIMEOUT = 30
+JOB_MAX_WAIT = 2 * 3600
+
+def show_metadata_cache_stats(data):
+    stats = data.get("metadata_cache")
+    if stats:
+        st.caption(f"🗃️ Footer cache: {stats['hits']} hits / {stats['misses']} misses, {stats['files']} files cached ({stats['bytes'] / 1024:.0f} KB)")
+
 def run_tuning_tab(base_url: str, disable_ssl_verification: bool):
 
   
@@ -42,6 +51,7 @@ def run_tuning_tab(base_url: str, disable_ssl_verification: bool):
                 if resp.status_code == 200:
                     data = resp.json()
                     st.success("File size analysis successful")
+                    show_metadata_cache_stats(data)
 
                     # Résumé
                     st.markdown(f"**Total Row Groups:** {data['total_row_groups']}")
@@ -84,6 +94,7 @@ def run_tuning_tab(base_url: str, disable_ssl_verification: bool):
                 if resp.status_code == 200:
                     data = resp.json()
                     st.success("Row group analysis successful")
+                    show_metadata_cache_stats(data)
 
                     df = pd.DataFrame(data["row_groups"])
                     df.rename(columns={
@@ -107,3 +118,60 @@ def run_tuning_tab(base_url: str, disable_ssl_verification: bool):
                     st.text(resp.text)
             except Exception as e:
                 st.error(f"Request error: {e}")
+
+    st.markdown("---")
+    st.markdown("### 🗜️ Compact / Rewrite")
+    st.caption("Rewrites the files matched by the path above into fewer, larger files (hive directories are kept). Without an output path, the dataset is replaced once the new files are verified.")
+
+    col1, col2, col3 = st.columns(3)
+    target_file_size_mb = col1.number_input("Target file size (MB)", min_value=1, value=256)
+    row_group_size = col2.number_input("Row group size (rows)", min_value=1000, value=122880, step=10000)
+    compression = col3.selectbox("Compression", ["zstd", "snappy", "gzip", "lz4_raw", "uncompressed"])
+    sort_by = st.text_input("Sort by (comma separated columns, optional):", "")
+    bloom_filters = st.checkbox("Write bloom filters")
+    output_path = st.text_input("Output path (empty = replace the dataset in place):", "")
+
+    if st.button("Compact"):
+        payload = {
+            "s3_path": s3_path,
+            "output_path": output_path or None,
+            "target_file_size_mb": int(target_file_size_mb),
+            "row_group_size": int(row_group_size),
+            "compression": compression,
+            "sort_by": [c.strip() for c in sort_by.split(",") if c.strip()] or None,
+            "bloom_filters": bloom_filters,
+        }
+        try:
+            resp = requests.post(f"{base_url}/compact_parquet", json=payload, verify=not disable_ssl_verification, timeout=JOB_REQUEST_TIMEOUT)
+            if resp.status_code != 202:
+                st.error("Error while submitting the compaction job.")
+                st.text(resp.text)
+                return
+
+            job_id = resp.json()["job_id"]
+            deadline = time.time() + JOB_MAX_WAIT
+            with st.spinner(f"Compaction job {job_id} running..."):
+                while True:
+                    job = requests.get(f"{base_url}/jobs/{job_id}", verify=not disable_ssl_verification, timeout=JOB_REQUEST_TIMEOUT).json()
+                    if job["status"] not in ("queued", "running"):
+                        break
+                    if time.time() > deadline:
+                        st.warning(f"Compaction job {job_id} still {job['status']} after {JOB_MAX_WAIT}s, check GET /jobs/{job_id} later.")
+                        return
+                    time.sleep(2)
+
+            if job["status"] != "succeeded":
+                st.error(f"Compaction {job['status']}: {job.get('error')}")
+                return
+
+            report = job["report"]
+            st.success(f"Compaction done in {report['write_time']}s ({report['verified']} verified)")
+            layouts = pd.DataFrame({"Before": report["before"], "After": report["after"]})
+            st.dataframe(layouts)
+            if report.get("benchmark"):
+                bench = report["benchmark"]
+                st.metric("Full scan", f"{bench['scan_time_after']}s", delta=f"x{bench['speedup']} vs {bench['scan_time_before']}s", delta_color="off")
+            if report.get("swap"):
+                st.caption(f"🔁 {report['swap']['replaced_files']} files replaced ({report['swap']['method']})")
+        except Exception as e:
+            st.error(f"Request error: {e}")
@@ -0,0 +1,55 @@
+import streamlit as st
+import requests
+import pandas as pd
+from datetime import datetime
+
+ORDER_BY = ["total_time", "count", "mean_time", "p95_time", "max_time", "rows", "bytes_fetched"]
+
+def run_workload_tab(base_url, disable_ssl_verification):
+    st.markdown("## Workload")
+    st.markdown("Most expensive query shapes (literals stripped) across the cluster, over the backend's rolling window.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        top = st.slider("Number of query shapes:", min_value=5, max_value=100, value=20)
+    with col2:
+        order_by = st.selectbox("Order by:", ORDER_BY)
+
+    if st.button("Load Workload"):
+        try:
+            with st.spinner("Collecting workload from every node..."):
+                resp = requests.get(
+                    f"{base_url}/workload",
+                    params={"scope": "cluster", "top": top, "order_by": order_by},
+                    verify=not disable_ssl_verification,
+                    timeout=30
+                )
+            if resp.status_code != 200:
+                st.error(f"Error {resp.status_code}: {resp.text}")
+                return
+            data = resp.json()
+        except Exception as e:
+            st.error(f"Request failed: {e}")
+            return
+
+        st.markdown(f"**Nodes:** {', '.join(data['nodes']) or '-'} — **Queries:** {data['total_queries']} — **Total time:** {data['total_time']:.2f} s")
+        for url, err in data.get("errors", {}).items():
+            st.warning(f"{url}: {err}")
+
+        if data["shapes"]:
+            df = pd.DataFrame(data["shapes"])
+            df["nodes"] = df["nodes"].apply(", ".join)
+            df["MB fetched"] = df.pop("bytes_fetched") / (1024**2)
+            columns = ["fingerprint", "count", "total_time", "share_of_time", "mean_time", "p95_time", "max_time", "mean_rows", "MB fetched", "nodes", "normalized_query"]
+            st.markdown("### Query Shapes")
+            st.dataframe(df[columns], use_container_width=True)
+            st.markdown("### Share of Total Time")
+            st.bar_chart(df.set_index("fingerprint")["share_of_time"])
+        else:
+            st.info("No query recorded yet.")
+
+        if data["slow_queries"]:
+            st.markdown("### Recent Slow Queries")
+            slow = pd.DataFrame(data["slow_queries"])
+            slow["ts"] = slow["ts"].apply(lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"))
+            st.dataframe(slow[["ts", "hostname", "latency", "rows", "bytes_fetched", "format", "fingerprint", "query"]], use_container_width=True)
@@ -0,0 +1,255 @@
+import os, re, time, asyncio
+from contextlib import asynccontextmanager
+import anyio
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+
+ROUTER_NODES = os.getenv("ROUTER_NODES", "http://backend1:8000,http://backend2:8000")
+# capacity_weighted (défaut) : charge / capacité ; least_outstanding : moins de requêtes en cours
+ROUTER_POLICY = os.getenv("ROUTER_POLICY", "capacity_weighted")
+HEALTH_INTERVAL = float(os.getenv("ROUTER_HEALTH_INTERVAL", "2"))
+HEALTH_TIMEOUT = float(os.getenv("ROUTER_HEALTH_TIMEOUT", "2"))
+EJECT_FAILURES = int(os.getenv("ROUTER_EJECT_FAILURES", "3"))
+EJECT_SECONDS = float(os.getenv("ROUTER_EJECT_SECONDS", "10"))
+MAX_ATTEMPTS = int(os.getenv("ROUTER_MAX_ATTEMPTS", "2"))
+# Mémoire considérée nécessaire par coeur : un noeud à 2 CPU / 1 Go pèse 1, pas 2
+BYTES_PER_CPU = float(os.getenv("ROUTER_BYTES_PER_CPU", str(1024 ** 3)))
+
+# Endpoints d'analyse en lecture seule : rejouables sur un autre noeud
+IDEMPOTENT_POSTS = {
+    "/analyze",
+    "/check_parquet_file_size",
+    "/check_parquet_row_group_size",
+    "/suggest_partitions",
+    "/partition_value_counts",
+    "/parquet_filterability_score",
+    "/parquet_bloom_filter_check",
+    "/parquet_bloom_filter_probe",
+    "/analyze/pruning",
+    "/zone_maps/rewrite",
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Ressources serveur préfixées par le hostname du noeud qui les détient
+STICKY_ROUTES = [
+    re.compile(r"^/query/cursor/(?P<host>.+)-[0-9a-f]{32}$"),
+    re.compile(r"^/jobs/(?P<host>.+)-[0-9a-f]{32}(/results)?$"),
+]
+
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "host", "te", "trailer", "upgrade"}
+
+
+class Node:
+    def __init__(self, url):
+        self.url = url
+        self.hostname = None
+        self.healthy = True
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.cpu_limit = None
+        self.memory_limit = None
+        self.reported_in_flight = 0
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency = None
+        self.last_check = None
+
+    @property
+    def weight(self):
+        if not self.cpu_limit:
+            return 1.0
+        cpus = self.cpu_limit
+        if self.memory_limit:
+            cpus = min(cpus, self.memory_limit / BYTES_PER_CPU)
+        return max(cpus, 0.1)
+
+    # Requêtes du routeur + requêtes vues par le noeud (autres clients, fragments distribués)
+    @property
+    def load(self):
+        return max(self.outstanding, self.reported_in_flight)
+
+    def available(self, now):
+        return self.healthy and now >= self.ejected_until
+
+    def stats(self, now):
+        return {
+            "url": self.url,
+            "hostname": self.hostname,
+            "available": self.available(now),
+            "healthy": self.healthy,
+            "ejected_for": round(max(0.0, self.ejected_until - now), 1),
+            "consecutive_failures": self.failures,
+            "cpu_limit": self.cpu_limit,
+            "memory_limit": self.memory_limit,
+            "weight": round(self.weight, 2),
+            "outstanding": self.outstanding,
+            "reported_in_flight": self.reported_in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "latency_ewma": round(self.latency, 4) if self.latency is not None else None,
+            "last_check": self.last_check,
+        }
+
+
+class Router:
+    def __init__(self, urls, policy):
+        self.nodes = [Node(u) for u in urls]
+        self.policy = policy
+
+    def choose(self, exclude=()):
+        now = time.time()
+        candidates = [n for n in self.nodes if n not in exclude and n.available(now)]
+        if not candidates:
+            # Tous éjectés : on tente quand même plutôt que de refuser la requête
+            candidates = [n for n in self.nodes if n not in exclude]
+        if not candidates:
+            return None
+        if self.policy == "least_outstanding":
+            return min(candidates, key=lambda n: (n.load, -n.weight))
+        return min(candidates, key=lambda n: ((n.load + 1) / n.weight, n.load))
+
+    def sticky(self, path):
+        for pattern in STICKY_ROUTES:
+            match = pattern.match(path)
+            if match:
+                return next((n for n in self.nodes if n.hostname == match.group("host")), None)
+        return None
+
+    def record_success(self, node, elapsed):
+        node.failures = 0
+        node.latency = elapsed if node.latency is None else 0.8 * node.latency + 0.2 * elapsed
+
+    def record_failure(self, node, reason):
+        node.errors += 1
+        node.failures += 1
+        if node.failures >= EJECT_FAILURES and node.healthy:
+            node.healthy = False
+            node.ejected_until = time.time() + EJECT_SECONDS
+            print(f"⛔ Ejected {node.url} for {EJECT_SECONDS}s after {node.failures} failures: {reason}")
+
+    async def check(self, client, node):
+        try:
+            resp = await client.get(f"{node.url}/status", timeout=HEALTH_TIMEOUT)
+            resp.raise_for_status()
+            status = resp.json()
+        except Exception as e:
+            self.record_failure(node, f"health check: {e}")
+            return
+
+        capacity = status.get("capacity") or {}
+        node.hostname = status.get("hostname")
+        node.cpu_limit = capacity.get("cpu_limit") or status.get("cpu_count")
+        node.memory_limit = capacity.get("memory_limit") or (status.get("memory") or {}).get("total")
+        # /status se compte lui-même dans in_flight
+        node.reported_in_flight = max(0, status.get("in_flight", 1) - 1)
+        node.last_check = time.time()
+        node.failures = 0
+        if not node.healthy:
+            print(f"✅ {node.url} is back")
+        # Un /status qui répond ne lève pas l'éjection : elle expire d'elle-même (EJECT_SECONDS)
+        node.healthy = True
+
+    async def health_loop(self, client):
+        while True:
+            await asyncio.gather(*(self.check(client, n) for n in self.nodes))
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+
+router = Router([u.strip().rstrip("/") for u in ROUTER_NODES.split(",") if u.strip()], ROUTER_POLICY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=5.0))
+    task = asyncio.create_task(router.health_loop(app.state.client))
+    yield
+    task.cancel()
+    await app.state.client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/router/status")
+def router_status():
+    now = time.time()
+    return {"policy": router.policy, "nodes": [n.stats(now) for n in router.nodes]}
+
+
+class RelayResponse(StreamingResponse):
+    # Réponse du noeud relayée telle quelle ; fermée et décomptée de outstanding quelle que soit l'issue
+    # (un générateur jamais itéré, client parti avant le premier chunk, n'exécuterait pas son finally)
+    def __init__(self, resp, node, headers):
+        super().__init__(resp.aiter_raw(), status_code=resp.status_code, headers=headers)
+        self.resp = resp
+        self.node = node
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.node.outstanding -= 1
+            with anyio.CancelScope(shield=True):
+                await self.resp.aclose()
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"])
+async def proxy(path: str, request: Request):
+    client = request.app.state.client
+    url_path = "/" + path
+    body = await request.body()
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+    # Ajout à la chaîne existante (proxy en amont, ex: nginx) plutôt qu'écrasement
+    client_host = request.client.host if request.client else ""
+    forwarded = request.headers.get("x-forwarded-for")
+    headers["x-forwarded-for"] = f"{forwarded}, {client_host}" if forwarded else client_host
+
+    sticky = router.sticky(url_path)
+    idempotent = request.method in ("GET", "HEAD") or url_path in IDEMPOTENT_POSTS
+    attempts = 1 if sticky else max(1, MAX_ATTEMPTS)
+    tried = []
+    error = None
+
+    for attempt in range(attempts):
+        node = sticky or router.choose(exclude=tried)
+        if node is None:
+            break
+        tried.append(node)
+        if attempt:
+            node.retries += 1
+        node.outstanding += 1
+        node.requests += 1
+        start = time.time()
+        last = attempt + 1 == attempts
+
+        try:
+            resp = await client.send(
+                client.build_request(request.method, node.url + url_path, params=request.query_params, headers=headers, content=body),
+                stream=True,
+            )
+        except httpx.TransportError as e:
+            node.outstanding -= 1
+            router.record_failure(node, str(e))
+            error = f"{node.url}: {e}"
+            # Connexion refusée : la requête n'a pas été reçue, on peut toujours la rejouer
+            if isinstance(e, httpx.ConnectError) or idempotent:
+                continue
+            break
+
+        # 429 = refusée par l'admission du backend avant exécution : rejouable même pour /query
+        if resp.status_code in RETRY_STATUSES and (idempotent or resp.status_code == 429) and not last:
+            # Noeud saturé ou en erreur : on tente le suivant
+            await resp.aclose()
+            node.outstanding -= 1
+            continue
+
+        router.record_success(node, time.time() - start)
+        out_headers = {k: v for k, v in resp.headers.items() if k.lower() not in HOP_HEADERS}
+        out_headers["x-routed-to"] = node.hostname or node.url
+        return RelayResponse(resp, node, out_headers)
+
+    return JSONResponse(status_code=502, content={"detail": f"No backend could serve the request ({error or 'no node available'})"})
@@ -0,0 +1,228 @@
+import argparse, json, os, time, subprocess, statistics, threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import requests
+
+# Latence / débit des endpoints du backend à plusieurs niveaux de concurrence, résultats en JSON (diffables entre versions)
+#
+#   python tests/generate_benchmark_data.py --rows 10000000 --files 10 --output ./data/bench
+#   python tests/benchmark.py --base-url http://localhost:8000 --dataset ./data/bench --concurrency 1 4 16 --output bench_v1.json
+#   python tests/benchmark.py --compare bench_v1.json bench_v2.json
+#
+# --dataset : répertoire local (lu par le backend, même chemin) ou s3://bucket/prefix (MinIO / S3)
+
+ARROW = "application/vnd.apache.arrow.stream"
+NDJSON = "application/x-ndjson"
+
+# Requêtes sur le schéma de generate_benchmark_data.py
+QUERIES = {
+    "point_lookup": "SELECT * FROM read_parquet('{glob}') WHERE id = 123456",
+    "filtered_count": "SELECT COUNT(*) FROM read_parquet('{glob}') WHERE category = 'cat_1' AND amount > 500",
+    "group_by_region": "SELECT region, COUNT(*), SUM(amount), AVG(amount) FROM read_parquet('{glob}') GROUP BY region ORDER BY region",
+    "distinct_users": "SELECT COUNT(DISTINCT user_id) FROM read_parquet('{glob}')",
+    "top_categories": "SELECT category, COUNT(*) AS n FROM read_parquet('{glob}') GROUP BY category ORDER BY n DESC LIMIT 20",
+    "date_range_scan": "SELECT event_date, SUM(amount) FROM read_parquet('{glob}') WHERE event_date BETWEEN DATE '2024-03-01' AND DATE '2024-03-31' GROUP BY event_date",
+}
+
+
+# Un cas = (endpoint, nom, chemin, payload, en-têtes)
+def build_cases(glob, max_rows):
+    cases = []
+    for name, sql in QUERIES.items():
+        cases.append(("/query", name, "/query", {"query": sql.format(glob=glob), "max_rows": max_rows}, {}))
+    export = f"SELECT * FROM read_parquet('{glob}') WHERE event_date < DATE '2024-01-15'"
+    cases.append(("/query", "export_arrow", "/query", {"query": export, "max_rows": max_rows * 1000}, {"Accept": ARROW}))
+    cases.append(("/query", "export_ndjson", "/query", {"query": export, "max_rows": max_rows * 1000}, {"Accept": NDJSON}))
+    cases.append(("/check_parquet_file_size", "file_size", "/check_parquet_file_size", {"s3_path": glob}, {}))
+    cases.append(("/suggest_partitions", "suggest", "/suggest_partitions", {"s3_path": glob, "threshold": 10}, {}))
+    cases.append(("/suggest_partitions", "suggest_sampled", "/suggest_partitions",
+                  {"s3_path": glob, "threshold": 10, "sample": {"method": "row_groups", "value": 10, "seed": 1}}, {}))
+    cases.append(("/parquet_filterability_score", "filterability", "/parquet_filterability_score", {"s3_path": glob}, {}))
+    cases.append(("/analyze", "analyze", "/analyze", {"sql": QUERIES["group_by_region"].format(glob=glob)}, {}))
+    return cases
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def send(session, base_url, path, payload, headers, timeout):
+    start = time.perf_counter()
+    try:
+        resp = session.post(f"{base_url}{path}", json=payload, headers=headers, timeout=timeout)
+        # Corps lu en entier : la latence couvre aussi le transfert des résultats streamés
+        size = len(resp.content)
+        status = resp.status_code
+        # /analyze renvoie 200 avec {"error": ...}
+        if status == 200 and headers.get("Accept") is None and resp.json().get("error"):
+            status = "error"
+    except Exception as e:
+        size = 0
+        status = type(e).__name__
+    return time.perf_counter() - start, status, size
+
+
+# Boucle fermée : chaque worker renvoie une requête dès la précédente terminée, jusqu'au nombre demandé
+def run_level(base_url, case, concurrency, requests_per_level, timeout):
+    _, _, path, payload, headers = case
+    remaining = [requests_per_level]
+    lock = threading.Lock()
+    samples = []
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            samples.append(send(session, base_url, path, payload, headers, timeout))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - start
+
+    statuses = Counter(str(status) for _, status, _ in samples)
+    ok = sorted(lat for lat, status, _ in samples if status == 200)
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "status_counts": dict(statuses),
+        "wall_time": round(wall, 4),
+        "throughput_rps": round(len(ok) / wall, 3) if wall else None,
+        "bytes_per_request": round(statistics.mean(size for _, _, size in samples)) if samples else 0,
+        "latency": {
+            "min": round(ok[0], 6) if ok else None,
+            "mean": round(statistics.mean(ok), 6) if ok else None,
+            **{f"p{int(q * 100)}": round(percentile(ok, q), 6) if ok else None for q in (0.5, 0.9, 0.95, 0.99)},
+            "max": round(ok[-1], 6) if ok else None,
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def dataset_manifest(dataset):
+    path = os.path.join(dataset, "_manifest.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def backend_status(base_url):
+    try:
+        status = requests.get(f"{base_url}/status", timeout=5).json()
+        return {k: status.get(k) for k in ("hostname", "cpu_count", "capacity", "admission")}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def run(args):
+    base_url = args.base_url.rstrip("/")
+    dataset = args.dataset.rstrip("/")
+    glob = f"{dataset}/**/*.parquet"
+    cases = [c for c in build_cases(glob, args.max_rows) if not args.cases or c[1] in args.cases]
+    if args.endpoints:
+        cases = [c for c in cases if c[0] in args.endpoints]
+
+    results = []
+    for case in cases:
+        endpoint, name, path, payload, headers = case
+        # Échauffement : footers / cache fichiers chargés avant la mesure
+        session = requests.Session()
+        for _ in range(args.warmup):
+            send(session, base_url, path, payload, headers, args.timeout)
+        for concurrency in args.concurrency:
+            level = run_level(base_url, case, concurrency, max(args.requests, concurrency), args.timeout)
+            results.append({"endpoint": endpoint, "case": name, "concurrency": concurrency, **level})
+            lat = level["latency"]
+            print(f"⏱️ {name:<18} c={concurrency:<3} ok={level['ok']:<4} err={level['errors']:<3} "
+                  f"p50={fmt(lat['p50'])} p95={fmt(lat['p95'])} rps={level['throughput_rps']}")
+
+    report = {
+        "meta": {
+            "label": args.label,
+            "git_commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "base_url": base_url,
+            "dataset": dataset,
+            "manifest": dataset_manifest(dataset) if not dataset.startswith("s3://") else None,
+            "backend": backend_status(base_url),
+            "concurrency": args.concurrency,
+            "requests_per_level": args.requests,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+
+def fmt(val):
+    return f"{val * 1000:8.1f}ms" if val is not None else "       -  "
+
+
+# Diff de deux fichiers de résultats : latence p50 / p95 et débit par (cas, concurrence)
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    index = {(r["case"], r["concurrency"]): r for r in before["results"]}
+    print(f"{before['meta'].get('label') or before['meta'].get('git_commit')} -> {after['meta'].get('label') or after['meta'].get('git_commit')}")
+    print(f"{'case':<18} {'c':>3} {'p50 before':>11} {'p50 after':>11} {'Δ%':>7} {'p95 before':>11} {'p95 after':>11} {'Δ%':>7} {'rps Δ%':>7}")
+    for r in after["results"]:
+        old = index.get((r["case"], r["concurrency"]))
+        if old is None:
+            continue
+        print(f"{r['case']:<18} {r['concurrency']:>3} "
+              f"{fmt(old['latency']['p50']):>11} {fmt(r['latency']['p50']):>11} {delta(old['latency']['p50'], r['latency']['p50']):>7} "
+              f"{fmt(old['latency']['p95']):>11} {fmt(r['latency']['p95']):>11} {delta(old['latency']['p95'], r['latency']['p95']):>7} "
+              f"{delta(old['throughput_rps'], r['throughput_rps']):>7}")
+
+
+def delta(old, new):
+    if not old or new is None:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend endpoints at several concurrency levels")
+    parser.add_argument("--base-url", default=os.getenv("BACKEND_URL", "http://localhost:8000"))
+    parser.add_argument("--dataset", default="./data/bench", help="dataset written by generate_benchmark_data.py (path as seen by the backend)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50, help="requests per case and concurrency level")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--max-rows", type=int, default=50)
+    parser.add_argument("--endpoints", nargs="*", help="only these endpoints (e.g. /query /analyze)")
+    parser.add_argument("--cases", nargs="*", help="only these cases (e.g. point_lookup suggest)")
+    parser.add_argument("--label", default=None, help="version label stored in the results")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files instead of running")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
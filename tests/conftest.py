@@ -0,0 +1,100 @@
+import os, sys, socket, subprocess, time
+import pytest
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+# Pas d'init.sql (S3 / MinIO) : les tests lisent des fichiers locaux
+os.environ.setdefault("INIT_SQL_PATH", "/nonexistent")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+STORE_PATHS = {
+    "ZONE_MAP_DB_PATH": "zone_maps.db",
+    "PROFILE_DB_PATH": "profiles.db",
+    "THREAD_TUNING_DB_PATH": "thread_tuning.db",
+    "SKETCH_DB_PATH": "sketches.db",
+    "SLOW_QUERY_LOG": "slow_queries.log",
+}
+
+
+# Backend uvicorn lancé comme en production (un process par noeud), bases SQLite et logs dans workdir
+def start_backend(port, workdir, env=None):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend:app", "--app-dir", BACKEND_DIR, "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Backend on port {port} exited with {proc.returncode}")
+        try:
+            if requests.get(f"{url}/status", timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"Backend on port {port} did not start")
+
+
+def wait_for_job(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.1)
+    raise TimeoutError(f"Job {job_id} still running after {timeout}s")
+
+
+# Client in-process sur l'application du backend (lifespan exécuté), bases SQLite dans un répertoire temporaire
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    from fastapi.testclient import TestClient
+    workdir = tmp_path_factory.mktemp("backend")
+    for name, filename in STORE_PATHS.items():
+        os.environ.setdefault(name, str(workdir / filename))
+    import backend
+    with TestClient(backend.app) as c:
+        yield c
+
+
+# Stand-in S3 (moto) : bucket test-bucket, réglages s3_* à appliquer sur une connexion DuckDB
+@pytest.fixture(scope="session")
+def s3():
+    import boto3
+    from moto.server import ThreadedMotoServer
+    port = free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    client = boto3.client(
+        "s3", endpoint_url=f"http://127.0.0.1:{port}", region_name="us-east-1",
+        aws_access_key_id="minioadmin", aws_secret_access_key="minioadmin",
+    )
+    client.create_bucket(Bucket="test-bucket")
+    settings = {
+        "s3_region": "us-east-1",
+        "s3_url_style": "path",
+        "s3_endpoint": f"127.0.0.1:{port}",
+        "s3_access_key_id": "minioadmin",
+        "s3_secret_access_key": "minioadmin",
+        "s3_use_ssl": False,
+    }
+    yield client, settings
+    server.stop()
+
+
+def configure_s3(con, settings):
+    for name, value in settings.items():
+        con.execute(f"SET GLOBAL {name} = ?", [value])
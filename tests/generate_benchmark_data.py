@@ -0,0 +1,124 @@
+import argparse, json, os, time
+import duckdb
+
+# Jeu de données de benchmark à taille configurable, généré par DuckDB (local ou S3 / MinIO)
+# Valeurs dérivées de hash(ligne, seed) : mêmes paramètres => mêmes fichiers, quel que soit le nombre de threads
+#
+#   python tests/generate_benchmark_data.py --rows 50000000 --files 40 --row-group-size 122880 --output ./data/bench
+#   python tests/generate_benchmark_data.py --rows 10000000 --files 10 --partition-by region --output s3://test-bucket/bench \
+#       --s3-endpoint localhost:9000 --s3-access-key minioadmin --s3-secret-key minioadmin
+
+REGIONS = ["eu-west", "eu-central", "us-east", "us-west", "ap-south", "ap-northeast", "sa-east", "af-south"]
+
+# Uniforme [0, 1) déterministe par ligne et par colonne
+def uniform(column):
+    return f"(hash(i, $seed, '{column}') % 1000000) / 1000000.0"
+
+
+# id trié (zone maps), event_date croissante, region faible cardinalité (partition),
+# category biaisée (skew : exposant sur l'uniforme), user_id haute cardinalité, payload texte peu compressible
+def select_rows(first, count, args):
+    return f"""
+        SELECT
+            i AS id,
+            DATE '2024-01-01' + CAST(i * {args.days} // {args.rows} AS INTEGER) AS event_date,
+            (['{"', '".join(REGIONS)}'])[1 + CAST(hash(i, $seed, 'region') % {len(REGIONS)} AS BIGINT)] AS region,
+            'cat_' || CAST(FLOOR({args.categories} * pow({uniform('category')}, {args.skew})) AS INTEGER) AS category,
+            CAST(hash(i, $seed, 'user') % {args.cardinality} AS BIGINT) AS user_id,
+            ROUND({uniform('amount')} * 1000, 2) AS amount,
+            {uniform('flag')} < 0.1 AS flag,
+            md5(CAST(hash(i, $seed, 'payload') AS VARCHAR)) AS payload
+        FROM range({first}, {first + count}) t(i)
+    """
+
+
+def connect(args):
+    con = duckdb.connect()
+    if args.threads:
+        con.execute(f"SET threads TO {args.threads}")
+    if args.output.startswith("s3://"):
+        con.execute("INSTALL httpfs; LOAD httpfs;")
+        settings = {
+            "s3_region": args.s3_region,
+            "s3_endpoint": args.s3_endpoint,
+            "s3_access_key_id": args.s3_access_key,
+            "s3_secret_access_key": args.s3_secret_key,
+            "s3_url_style": "path" if args.s3_endpoint else None,
+            "s3_use_ssl": args.s3_use_ssl if args.s3_endpoint else None,
+        }
+        for name, val in settings.items():
+            if val is not None:
+                con.execute(f"SET {name} = ?", [val])
+    return con
+
+
+def generate(args):
+    con = connect(args)
+    output = args.output.rstrip("/")
+    if not output.startswith("s3://"):
+        os.makedirs(output, exist_ok=True)
+
+    rows_per_file = -(-args.rows // args.files)
+    start = time.time()
+    for k in range(args.files):
+        first = k * rows_per_file
+        count = min(rows_per_file, args.rows - first)
+        if count <= 0:
+            break
+        options = ["FORMAT parquet", f"ROW_GROUP_SIZE {args.row_group_size}", f"COMPRESSION {args.compression}"]
+        if args.partition_by:
+            # Hive : <output>/<col>=<val>/part_<k>_<i>.parquet, un fichier par partition et par fichier source
+            options += [f"PARTITION_BY ({', '.join(args.partition_by)})", f"FILENAME_PATTERN 'part_{k:05d}_{{i}}'", "OVERWRITE_OR_IGNORE"]
+            target = output
+        else:
+            target = f"{output}/part_{k:05d}.parquet"
+        con.execute(f"COPY ({select_rows(first, count, args)}) TO '{target}' ({', '.join(options)})", {"seed": args.seed})
+        print(f"📝 File {k + 1}/{args.files}: {count} rows")
+
+    manifest = {
+        "output": output,
+        "glob": f"{output}/**/*.parquet",
+        "rows": args.rows,
+        "files": args.files,
+        "row_group_size": args.row_group_size,
+        "partition_by": args.partition_by,
+        "compression": args.compression,
+        "categories": args.categories,
+        "skew": args.skew,
+        "cardinality": args.cardinality,
+        "days": args.days,
+        "seed": args.seed,
+        "generation_time": round(time.time() - start, 2),
+    }
+    if not output.startswith("s3://"):
+        with open(os.path.join(output, "_manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+    print(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a reproducible parquet dataset for benchmarks")
+    parser.add_argument("--output", default="./data/bench", help="local directory or s3://bucket/prefix")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--row-group-size", type=int, default=122_880)
+    parser.add_argument("--partition-by", nargs="*", default=[], choices=["region", "event_date", "category", "flag"],
+                        help="hive partitioning columns")
+    parser.add_argument("--compression", default="zstd", choices=["zstd", "snappy", "gzip", "uncompressed"])
+    parser.add_argument("--categories", type=int, default=1000, help="distinct values of the skewed column")
+    parser.add_argument("--skew", type=float, default=3.0, help="1 = uniform, higher = few categories hold most rows")
+    parser.add_argument("--cardinality", type=int, default=5_000_000, help="distinct values of user_id")
+    parser.add_argument("--days", type=int, default=365, help="event_date range")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--s3-endpoint", default=os.getenv("S3_ENDPOINT"))
+    parser.add_argument("--s3-region", default=os.getenv("S3_REGION", "us-east-1"))
+    parser.add_argument("--s3-access-key", default=os.getenv("S3_ACCESS_KEY"))
+    parser.add_argument("--s3-secret-key", default=os.getenv("S3_SECRET_KEY"))
+    parser.add_argument("--s3-use-ssl", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    generate(parse_args())
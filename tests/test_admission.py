@@ -0,0 +1,60 @@
+import threading
+import time
+import pytest
+from admission import AdmissionController, Saturated
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    admission.acquire()
+    with pytest.raises(Saturated) as e:
+        admission.acquire("analysis")
+    assert e.value.retry_after >= 1
+    assert admission.stats()["rejected"]["analysis"] == 1
+
+
+def test_queue_timeout():
+    admission = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.05)
+    admission.acquire()
+    with pytest.raises(Saturated, match="after"):
+        admission.acquire()
+    stats = admission.stats()
+    assert stats["timeouts"]["interactive"] == 1
+    assert stats["queued"] == {"interactive": 0, "analysis": 0}
+
+
+# Slot libéré : les requêtes interactives passent avant les analyses arrivées plus tôt, FIFO dans une classe
+def test_interactive_requests_are_served_first():
+    admission = AdmissionController(max_concurrent=1, max_queue=8)
+    admission.acquire()
+    order = []
+
+    def wait(name, priority):
+        admission.acquire(priority, timeout=10)
+        order.append(name)
+        admission.release()
+
+    threads = []
+    for name, priority in [("analysis-1", "analysis"), ("analysis-2", "analysis"), ("interactive-1", "interactive"), ("interactive-2", "interactive")]:
+        t = threading.Thread(target=wait, args=(name, priority))
+        t.start()
+        threads.append(t)
+        # Ordre d'arrivée fixé
+        while sum(admission.stats()["queued"].values()) < len(threads):
+            time.sleep(0.01)
+    admission.release()
+    for t in threads:
+        t.join(10)
+    assert order == ["interactive-1", "interactive-2", "analysis-1", "analysis-2"]
+    assert admission.stats()["running"] == 0
+
+
+def test_saturated_query_returns_429(client, monkeypatch):
+    admission = AdmissionController(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(client.app.state, "admission", admission)
+    admission.acquire()
+    r = client.post("/query", json={"query": "SELECT 1"})
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    admission.release()
+    assert client.post("/query", json={"query": "SELECT 1"}).status_code == 200
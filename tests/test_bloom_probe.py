@@ -0,0 +1,34 @@
+import duckdb
+import pytest
+
+
+# Deux fichiers de 4 row groups ; u : 500 valeurs par fichier (dictionnaire, bloom filter écrit par DuckDB)
+# toutes dans [min, max] de chaque row group, seul le bloom filter peut écarter une valeur absente
+@pytest.fixture(scope="module")
+def glob(tmp_path_factory):
+    root = tmp_path_factory.mktemp("bloom")
+    for i in range(2):
+        duckdb.sql(f"""
+            COPY (SELECT 'user' || lpad((range % 500 * 2 + {i})::VARCHAR, 4, '0') AS u, range AS id FROM range(20000))
+            TO '{root}/part{i}.parquet' (FORMAT parquet, ROW_GROUP_SIZE 5000, DICTIONARY_SIZE_LIMIT 100000)
+        """)
+    return f"{root}/*.parquet"
+
+
+def test_bloom_filters_skip_absent_values(client, glob):
+    r = client.post("/parquet_bloom_filter_probe", json={"s3_path": glob, "columns": ["u"], "values_per_column": 5, "repetitions": 1, "seed": 1})
+    assert r.status_code == 200, r.text
+    column = r.json()["columns"][0]
+    assert column["bloom_coverage_percent"] == 100.0
+    assert column["absent_lookups"] == 5
+    assert column["row_groups_skipped_by_bloom"] > 0
+    assert column["bytes_saved"] > 0
+    assert column["row_groups_read"] < column["row_groups_minmax"]
+
+
+
+def test_bloom_filter_presence_is_reported(client, glob):
+    r = client.post("/parquet_bloom_filter_check", json={"s3_path": glob})
+    assert r.status_code == 200, r.text
+    u = next(c for c in r.json()["columns"] if c["column"] == "u")
+    assert (u["status"], u["num_row_groups"], u["presence_ratio"]) == ("✅ Fully Present", 4, 100.0)
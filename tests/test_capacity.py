@@ -0,0 +1,80 @@
+import capacity
+import pytest
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text + "\n")
+
+
+# Arborescence cgroup factice : CGROUP_ROOT et /proc/self/cgroup redirigés vers tmp_path
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    root = tmp_path / "cgroup"
+    root.mkdir()
+    monkeypatch.setattr(capacity, "CGROUP_ROOT", str(root))
+    monkeypatch.setattr(capacity, "PROC_CGROUP", str(tmp_path / "proc_self_cgroup"))
+    return root, tmp_path / "proc_self_cgroup"
+
+
+# v2 : la limite effective est la plus basse entre le cgroup du process et ses parents
+def test_v2_limits_use_the_lowest_level(cgroup):
+    root, proc = cgroup
+    write(proc, "0::/kubepods/pod1/app")
+    write(root / "cgroup.controllers", "cpu memory")
+    write(root / "kubepods/cpu.max", "400000 100000")
+    write(root / "kubepods/memory.max", "8589934592")
+    write(root / "kubepods/pod1/app/cpu.max", "150000 100000")
+    write(root / "kubepods/pod1/app/memory.max", "max")
+    write(root / "kubepods/pod1/app/memory.current", "1048576")
+
+    assert capacity.cgroup_cpu_limit() == (1.5, "cgroup v2")
+    assert capacity.cgroup_memory_limit() == (8589934592, "cgroup v2")
+    assert capacity.cgroup_memory_usage() == 1048576
+
+
+def test_v2_without_limits(cgroup):
+    root, proc = cgroup
+    write(proc, "0::/")
+    write(root / "cgroup.controllers", "cpu memory")
+    write(root / "cpu.max", "max 100000")
+    write(root / "memory.max", "max")
+
+    assert capacity.cgroup_cpu_limit() == (None, "cgroup v2")
+    assert capacity.cgroup_memory_limit() == (None, "cgroup v2")
+
+
+# v1 : un contrôleur par hiérarchie (cpu,cpuacct), quota -1 et limite mémoire ~2^63 = illimité
+def test_v1_limits(cgroup):
+    root, proc = cgroup
+    write(proc, "12:memory:/docker/abc\n4:cpu,cpuacct:/docker/abc\n1:name=systemd:/init.scope")
+    write(root / "cpu,cpuacct/cpu.cfs_quota_us", "-1")
+    write(root / "cpu,cpuacct/cpu.cfs_period_us", "100000")
+    write(root / "cpu,cpuacct/docker/abc/cpu.cfs_quota_us", "250000")
+    write(root / "cpu,cpuacct/docker/abc/cpu.cfs_period_us", "100000")
+    write(root / "memory/memory.limit_in_bytes", "9223372036854771712")
+    write(root / "memory/docker/abc/memory.limit_in_bytes", "2147483648")
+    write(root / "memory/docker/abc/memory.usage_in_bytes", "4096")
+
+    assert capacity.cgroup_cpu_limit() == (2.5, "cgroup v1")
+    assert capacity.cgroup_memory_limit() == (2147483648, "cgroup v1")
+    assert capacity.cgroup_memory_usage() == 4096
+
+
+# Sans cgroup namespace, le chemin de /proc/self/cgroup n'existe pas sous le montage : seule la racine compte
+def test_v1_unlimited_with_host_path(cgroup):
+    root, proc = cgroup
+    write(proc, "4:cpu,cpuacct:/system.slice/docker-abc.scope\n12:memory:/system.slice/docker-abc.scope")
+    write(root / "cpu,cpuacct/cpu.cfs_quota_us", "-1")
+    write(root / "cpu,cpuacct/cpu.cfs_period_us", "100000")
+    write(root / "memory/memory.limit_in_bytes", "9223372036854771712")
+
+    assert capacity.cgroup_cpu_limit() == (None, "cgroup v1")
+    assert capacity.cgroup_memory_limit() == (None, "cgroup v1")
+
+
+def test_budget_rounds_cpu_up_and_keeps_memory_headroom(monkeypatch):
+    monkeypatch.delenv("DUCKDB_MEMORY_FRACTION", raising=False)
+    budget = capacity.duckdb_budget({"cpu_limit": 1.5, "memory_limit": 1000})
+    assert budget["threads"] == 2
+    assert budget["memory_limit"] == 800
@@ -0,0 +1,21 @@
+import duckdb
+
+from cursor_store import CursorStore
+
+
+def open_cursor(store, con, query, closed):
+    cur = con.cursor()
+    entry, _ = store.open(cur, query, 1000, lambda: (closed.append(cur), cur.close()))
+    return entry
+
+
+def test_cursors_over_byte_budget_are_evicted_lru():
+    con = duckdb.connect()
+    closed = []
+    store = CursorStore(admission=None, max_open=10, max_bytes=1)
+    first = open_cursor(store, con, "SELECT repeat('x', 1000) FROM range(5000)", closed)
+    second = open_cursor(store, con, "SELECT repeat('y', 1000) FROM range(5000)", closed)
+    assert first.closed and not second.closed
+    stats = store.stats()
+    assert stats["open_cursors"] == 1 and stats["evicted_over_budget"] == 1
+    assert stats["held_bytes"] > stats["max_bytes"]
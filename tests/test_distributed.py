@@ -0,0 +1,87 @@
+import duckdb
+import pytest
+import requests
+from conftest import free_port, start_backend
+from distributed import plan_query, NotDistributable
+
+QUERIES = [
+    "SELECT g, count(*) AS n, sum(id) s, avg(id) a, min(tag) mn, max(tag) mx FROM {src} GROUP BY g ORDER BY g",
+    "SELECT count(*), count(tag), count(*) - count(tag) AS nulls FROM {src}",
+    "SELECT g % 2 AS k, count(*) c FROM {src} GROUP BY k HAVING count(*) > 10 ORDER BY k",
+    "SELECT g, max(id) - min(id) AS spread FROM {src} GROUP BY ALL ORDER BY g",
+    "SELECT count(*) FILTER (WHERE g = 1) AS ones, avg(id) FILTER (WHERE g = 2) AS a2 FROM {src}",
+    "SELECT id, tag FROM {src} WHERE g = 1 ORDER BY id DESC LIMIT 3",
+    "SELECT * FROM {src} ORDER BY id LIMIT 2 OFFSET 3",
+]
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    root = tmp_path_factory.mktemp("ds")
+    con = duckdb.connect()
+    for i in range(4):
+        con.execute(f"""
+            COPY (SELECT range AS id, range % 5 AS g, CASE WHEN range % 7 = 0 THEN NULL ELSE 'n' || (range % 11) END AS tag
+                  FROM range({i * 1000}, {(i + 1) * 1000}))
+            TO '{root}/part{i}.parquet' (FORMAT parquet)
+        """)
+    return f"read_parquet('{root}/*.parquet')"
+
+
+# Deux process backend : le coordinateur répartit les fichiers entre lui-même et l'autre noeud
+@pytest.fixture(scope="module")
+def cluster(tmp_path_factory):
+    ports = [free_port(), free_port()]
+    nodes = ",".join(f"http://127.0.0.1:{p}" for p in ports)
+    procs, urls = [], []
+    try:
+        for port in ports:
+            proc, url = start_backend(port, tmp_path_factory.mktemp("node"), {"DBGRID_NODES": nodes})
+            procs.append(proc)
+            urls.append(url)
+        yield urls
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_distributed_matches_single_node(cluster, dataset, query):
+    sql = query.format(src=dataset)
+    expected = requests.post(f"{cluster[0]}/query", json={"query": sql, "max_rows": 100}, timeout=60)
+    got = requests.post(f"{cluster[0]}/distributed_query", json={"query": sql, "max_rows": 100}, timeout=60)
+    assert expected.ok and got.ok, got.text
+    assert got.json()["columns"] == expected.json()["columns"]
+    assert got.json()["rows"] == expected.json()["rows"]
+    fragments = got.json()["distributed"]["fragments"]
+    assert {f["node"] for f in fragments} == set(cluster)
+
+
+@pytest.mark.parametrize("aggregate", [
+    "histogram(g)", "entropy(g)", "product(g)", "bit_or(g)", "fsum(id)", "list(id)",
+    "string_agg(tag, ',')", "count(DISTINCT g)", "approx_count_distinct(id)", "sum(id) FILTER (WHERE g = 1) + histogram(g)['1']",
+])
+def test_unmergeable_aggregates_are_rejected(aggregate):
+    with pytest.raises(NotDistributable):
+        plan_query(f"SELECT {aggregate} FROM read_parquet('/data/*.parquet')", 100)
+
+
+@pytest.mark.parametrize("clause", [
+    "GROUP BY ROLLUP (g)", "GROUP BY CUBE (g)", "GROUP BY GROUPING SETS ((g), ())", "GROUP BY tag, ROLLUP (g)",
+    "USING SAMPLE 10 ROWS GROUP BY g",
+])
+def test_multi_level_grouping_and_row_samples_are_rejected(clause):
+    with pytest.raises(NotDistributable):
+        plan_query(f"SELECT g, sum(id) FROM read_parquet('/data/*.parquet') {clause}", 100)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT g, sum(id) FROM read_parquet('/data/*.parquet') USING SAMPLE 10 PERCENT (system, 1) GROUP BY g",
+    "SELECT sum(id) FROM read_parquet('/data/*.parquet') TABLESAMPLE (10 PERCENT)",
+    "SELECT id FROM read_parquet('/data/*.parquet') USING SAMPLE 10% ORDER BY id",
+])
+def test_percent_samples_are_drawn_by_fragments(query):
+    plan = plan_query(query, 100)
+    assert "SAMPLE" in plan.fragment_sql(["/data/a.parquet"])
+    assert "SAMPLE" not in plan.final.sql(dialect="duckdb")
@@ -0,0 +1,60 @@
+import re
+import duckdb
+import pytest
+from conftest import configure_s3
+
+PREFIX = "s3://test-bucket/catalog"
+
+
+@pytest.fixture
+def s3_dataset(client, s3, request):
+    s3_client, settings = s3
+    configure_s3(client.app.state.con, settings)
+    prefix = f"{PREFIX}/" + re.sub(r"\W", "_", request.node.name)
+    con = duckdb.connect()
+    configure_s3(con, settings)
+    for i in range(3):
+        con.execute(f"COPY (SELECT range AS id FROM range(10)) TO '{prefix}/part{i}.parquet' (FORMAT parquet)")
+    # Listing mis en cache par le catalogue (TTL 60 s), sans lecture des fichiers par DuckDB
+    assert client.post("/file_catalog/refresh", json={"s3_path": f"{prefix}/*.parquet"}).status_code == 200
+    return s3_client, prefix
+
+
+def delete(s3_client, path):
+    s3_client.delete_object(Bucket="test-bucket", Key=path[len("s3://test-bucket/"):])
+
+
+# Objet supprimé après le listing du catalogue : la liste développée échoue (404), la requête est rejouée sur le glob
+@pytest.mark.parametrize("cursor", [False, True])
+def test_expanded_list_falls_back_to_glob(client, s3_dataset, cursor):
+    s3_client, prefix = s3_dataset
+    delete(s3_client, f"{prefix}/part1.parquet")
+    r = client.post("/query", json={"query": f"SELECT COUNT(*) AS n FROM read_parquet('{prefix}/*.parquet')", "cursor": cursor, "use_file_catalog": True})
+    assert r.status_code == 200, r.text
+    assert r.json()["rows"] == [[20]]
+
+
+# Revalidation du cache de résultats sur un listing relu, pas sur celui du catalogue
+def test_result_cache_sees_deleted_file(client, s3_dataset, monkeypatch):
+    s3_client, prefix = s3_dataset
+    monkeypatch.setattr(client.app.state.result_cache, "validate_seconds", 0)
+    query = {"query": f"SELECT COUNT(*) AS n FROM read_parquet('{prefix}/*.parquet') WHERE id >= 0", "use_cache": True, "use_file_catalog": True}
+    assert client.post("/query", json=query).json()["rows"] == [[30]]
+    assert client.post("/query", json=query).json()["cache"] == "hit"
+
+    delete(s3_client, f"{prefix}/part2.parquet")
+    r = client.post("/query", json=query).json()
+    assert r["cache"] != "hit"
+    assert r["rows"] == [[20]]
+
+
+# Par défaut le glob est lu tel qu'écrit : un fichier ajouté après le listing du catalogue est compté
+def test_query_sees_new_file_by_default(client, s3, s3_dataset):
+    _, settings = s3
+    _, prefix = s3_dataset
+    con = duckdb.connect()
+    configure_s3(con, settings)
+    con.execute(f"COPY (SELECT range AS id FROM range(10)) TO '{prefix}/part3.parquet' (FORMAT parquet)")
+    r = client.post("/query", json={"query": f"SELECT COUNT(*) AS n FROM read_parquet('{prefix}/*.parquet')"})
+    assert r.status_code == 200, r.text
+    assert r.json()["rows"] == [[40]]
@@ -0,0 +1,60 @@
+import duckdb
+from conftest import configure_s3
+from io_stats import IOAccounting, LOG_SETTINGS, TRACE_LOG_SETTINGS
+
+
+def accounting(s3, max_entries, trace_reads=True):
+    client, settings = s3
+    con = duckdb.connect()
+    configure_s3(con, settings)
+    for name, val in (TRACE_LOG_SETTINGS if trace_reads else LOG_SETTINGS).items():
+        con.execute(f"SET GLOBAL {name} = ?", [val])
+    con.execute("COPY (SELECT range AS id FROM range(100000)) TO 's3://test-bucket/io/data.parquet' (FORMAT parquet)")
+    con.execute("PRAGMA truncate_duckdb_logs")
+    return con, IOAccounting(con, max_entries=max_entries, trace_reads=trace_reads)
+
+
+# Une fenêtre qui se ferme ne vide pas le log tant qu'une autre est ouverte, même au-delà de max_entries
+def test_overlapping_windows_keep_their_entries(s3):
+    con, io = accounting(s3, max_entries=0)
+    a, b = con.cursor(), con.cursor()
+    window_a = io.begin(a)
+    a.execute("SELECT SUM(id) FROM 's3://test-bucket/io/data.parquet'").fetchall()
+    window_b = io.begin(b)
+    b.execute("SELECT COUNT(*) FROM 's3://test-bucket/io/data.parquet'").fetchall()
+    assert window_b.close()["requests"] > 0
+
+    metrics = window_a.close()
+    assert metrics["requests"] > 0
+    assert metrics["range_requests"] > 0
+    assert metrics["bytes_read"] > 0
+    assert io.stats()["open_windows"] == 0
+
+
+# Log plein pendant qu'une fenêtre est ouverte : les nouvelles requêtes ne sont pas mesurées jusqu'au vidage
+def test_full_log_drains_before_measuring_again(s3):
+    con, io = accounting(s3, max_entries=0)
+    a, b = con.cursor(), con.cursor()
+    window_a = io.begin(a)
+    window_b = io.begin(b)
+    b.execute("SELECT COUNT(*) FROM 's3://test-bucket/io/data.parquet'").fetchall()
+    window_b.close()
+
+    assert io.begin(con.cursor()) is None
+    assert io.stats()["unmeasured"] == 1
+    a.execute("SELECT SUM(id) FROM 's3://test-bucket/io/data.parquet'").fetchall()
+    assert window_a.close()["requests"] > 0
+    assert con.execute("SELECT COUNT(*) FROM duckdb_logs").fetchone()[0] == 0
+    assert io.begin(con.cursor()) is not None
+
+
+# Par défaut seules les requêtes HTTP sont loguées (DEBUG) : pas d'entrée par lecture, bytes_read non mesuré
+def test_default_logs_http_requests_only(s3):
+    con, io = accounting(s3, max_entries=10000, trace_reads=False)
+    cur = con.cursor()
+    window = io.begin(cur)
+    cur.execute("SELECT SUM(id) FROM 's3://test-bucket/io/data.parquet'").fetchall()
+    metrics = window.close()
+    assert metrics["requests"] > 0 and metrics["bytes_fetched"] > 0
+    assert metrics["bytes_read"] is None
+    assert "bytes_read" not in io.stats()
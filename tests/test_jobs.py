@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import wait_for_job
+
+
+def test_results_keep_duplicate_column_names(client):
+    job_id = client.post("/jobs", json={"query": "SELECT 1 AS a, 2 AS a, 'x' AS b"}).json()["job_id"]
+    assert wait_for_job(client, job_id)["status"] == "succeeded"
+    page = client.get(f"/jobs/{job_id}/results").json()
+    assert page["columns"] == ["a", "a", "b"]
+    assert page["rows"] == [[1, 2, "x"]]
+
+
+@pytest.mark.parametrize("limit", [{"max_finished": 1}, {"max_retained_bytes": 12000}])
+def test_oldest_finished_jobs_are_evicted(client, limit):
+    store = client.app.state.jobs
+    saved = {name: getattr(store, name) for name in limit}
+    for name, value in limit.items():
+        setattr(store, name, value)
+    try:
+        evicted = store.stats()["total_evicted"]
+        # range(1000) en BIGINT : 8000 octets de résultat, un seul tient dans 12000
+        first = client.post("/jobs", json={"query": "SELECT range FROM range(1000)"}).json()["job_id"]
+        assert wait_for_job(client, first)["status"] == "succeeded"
+        second = client.post("/jobs", json={"query": "SELECT range FROM range(1000)"}).json()["job_id"]
+        assert wait_for_job(client, second)["status"] == "succeeded"
+        # Le statut est visible juste avant la fin de _run (et de son expire())
+        store.expire()
+        assert client.get(f"/jobs/{first}").status_code == 404
+        assert client.get(f"/jobs/{second}").status_code == 200
+        assert store.stats()["total_evicted"] > evicted
+    finally:
+        for name, value in saved.items():
+            setattr(store, name, value)
@@ -0,0 +1,54 @@
+import os
+import duckdb
+
+from metadata_cache import MetadataCache
+
+
+def write_parquet(con, path, rows):
+    con.execute(f"COPY (SELECT range AS id FROM range({rows})) TO '{path}' (FORMAT parquet)")
+
+
+# Une ligne par (row group, colonne) : une seule colonne ici
+def row_count(table):
+    return sum(table["row_group_num_rows"].to_pylist())
+
+
+def test_second_lookup_is_served_from_cache(tmp_path):
+    con = duckdb.connect()
+    for i in range(2):
+        write_parquet(con, tmp_path / f"part-{i}.parquet", 100)
+    cache = MetadataCache()
+    pattern = f"{tmp_path}/*.parquet"
+
+    first = cache.metadata(con, pattern)
+    assert cache.stats()["misses"] == 2
+    second = cache.metadata(con, pattern)
+    assert cache.stats()["hits"] == 2
+    assert second.num_rows == first.num_rows
+
+
+def test_rewritten_file_is_read_again(tmp_path):
+    con = duckdb.connect()
+    path = tmp_path / "data.parquet"
+    write_parquet(con, path, 100)
+    cache = MetadataCache()
+    assert row_count(cache.metadata(con, str(path))) == 100
+
+    write_parquet(con, path, 300)
+    # mtime décalé : la clé change même si la taille restait identique
+    os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 5))
+    assert row_count(cache.metadata(con, str(path))) == 300
+    assert cache.stats()["misses"] == 2
+
+
+def test_lru_stays_under_max_bytes(tmp_path):
+    con = duckdb.connect()
+    for i in range(3):
+        write_parquet(con, tmp_path / f"part-{i}.parquet", 100)
+    one = MetadataCache().metadata(con, str(tmp_path / "part-0.parquet")).nbytes
+    cache = MetadataCache(max_bytes=one * 2)
+    cache.metadata(con, f"{tmp_path}/*.parquet")
+    stats = cache.stats()
+    assert stats["files"] == 2
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
@@ -0,0 +1,22 @@
+from prometheus_client.parser import text_string_to_metric_families
+from sql_fingerprint import fingerprint_sql
+
+
+def scrape(client):
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    return {f.name: f for f in text_string_to_metric_families(r.text)}
+
+
+# Latence par empreinte de requête (libellés bornés : littéraux retirés) et état du noeud lu au scrape
+def test_query_latency_and_state_are_exported(client):
+    for value in (1, 2):
+        assert client.post("/query", json={"query": f"SELECT {value} AS metrics_probe"}).status_code == 200
+    families = scrape(client)
+
+    fingerprint, _ = fingerprint_sql("SELECT 1 AS metrics_probe")
+    counts = [s.value for s in families["dbgrid_query_duration_seconds"].samples
+              if s.name.endswith("_count") and s.labels.get("fingerprint") == fingerprint]
+    assert counts and counts[0] >= 2
+    for name in ("dbgrid_admission_max_concurrent", "dbgrid_cursor_pool_in_use", "dbgrid_jobs", "dbgrid_in_flight_requests"):
+        assert name in families
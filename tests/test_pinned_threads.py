@@ -0,0 +1,36 @@
+import duckdb
+
+
+def parquet_file(tmp_path):
+    path = tmp_path / "t.parquet"
+    duckdb.connect().execute(f"COPY (SELECT range AS id FROM range(1000)) TO '{path}' (FORMAT parquet)")
+    return path
+
+
+# Les tables de la base partagée n'existent pas dans les instances dédiées : la requête reste sur la base partagée
+def test_threads_ignored_for_shared_tables(client):
+    assert client.post("/query", json={"query": "CREATE OR REPLACE TABLE pinned_t AS SELECT 1 AS x", "cursor": False}).status_code == 200
+    for cursor in (False, True):
+        r = client.post("/query", json={"query": "SELECT * FROM pinned_t", "cursor": cursor, "num_threads": 2})
+        assert r.status_code == 200, r.text
+        assert r.json()["rows"] == [[1]]
+        assert r.json()["threads"] is None
+
+
+def test_parquet_queries_run_pinned_in_cursor_mode(client, tmp_path):
+    path = parquet_file(tmp_path)
+    r = client.post("/query", json={"query": f"SELECT COUNT(*) FROM '{path}'", "cursor": True, "num_threads": 1})
+    assert r.status_code == 200, r.text
+    assert r.json()["threads"] == 1
+    assert r.json()["rows"] == [[1000]]
+    status = client.get("/status").json()
+    pinned = status["pinned_instances"]["instances"]
+    assert [(i["threads"], i["active"]) for i in pinned] == [(1, 0)]
+
+
+def test_autotune_rejects_shared_tables(client, tmp_path):
+    r = client.post("/query/autotune", json={"query": "SELECT * FROM pinned_t", "thread_counts": [1]})
+    assert r.status_code == 400
+    path = parquet_file(tmp_path)
+    r = client.post("/query/autotune", json={"query": f"SELECT SUM(id) FROM '{path}'", "thread_counts": [1], "repetitions": 1, "remember": False})
+    assert r.status_code == 200, r.text
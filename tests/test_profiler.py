@@ -0,0 +1,46 @@
+import duckdb
+
+from profiler import profile_columns
+
+
+def make_source(con):
+    con.execute("""
+        CREATE TABLE t AS
+        SELECT range AS id, range % 3 AS k, CASE WHEN range % 4 = 0 THEN NULL ELSE 'x' END AS s
+        FROM range(12)
+    """)
+    return "t"
+
+
+def test_batched_scan_matches_per_column_counts():
+    con = duckdb.connect()
+    source = make_source(con)
+    result = profile_columns(con, source, ["id", "k", "s"], batch_size=16)
+    assert result["scans"] == 1
+    assert result["total_rows"] == 12
+    cols = result["columns"]
+    assert cols["id"]["distinct_values"] == 12
+    assert cols["id"]["singletons"] == 12
+    assert (cols["id"]["min"], cols["id"]["max"]) == (0, 11)
+    assert cols["k"]["distinct_values"] == 3
+    assert cols["k"]["top_value_ratio"] == 4 / 12
+    assert cols["s"]["null_ratio"] == 3 / 12
+    assert cols["s"]["distinct_values"] == 1
+    assert cols["s"]["top_value_ratio"] == 9 / 12
+
+
+def test_columns_are_split_into_batches():
+    con = duckdb.connect()
+    source = make_source(con)
+    result = profile_columns(con, source, ["id", "k", "s"], batch_size=2)
+    assert result["scans"] == 2
+    assert set(result["columns"]) == {"id", "k", "s"}
+
+
+# Lot en échec : repli colonne par colonne, seule la colonne fautive porte l'erreur
+def test_failing_column_is_isolated():
+    con = duckdb.connect()
+    source = make_source(con)
+    result = profile_columns(con, source, ["id", "missing"])
+    assert result["columns"]["id"]["distinct_values"] == 12
+    assert "error" in result["columns"]["missing"]
@@ -0,0 +1,10 @@
+def test_profile_tree_is_scoped_to_its_fingerprint(client):
+    first = client.post("/query", json={"query": "SELECT 1 AS a", "profiling": True}).json()
+    other = client.post("/query", json={"query": "SELECT 2 AS b, 3 AS c", "profiling": True}).json()
+    assert first["fingerprint"] != other["fingerprint"]
+    assert "bytes_read" in first["profile_summary"]
+
+    r = client.get(f"/profiles/{first['fingerprint']}/{first['profile_id']}")
+    assert r.status_code == 200, r.text
+    assert r.json()["profiling"] == first["profiling"]
+    assert client.get(f"/profiles/{other['fingerprint']}/{first['profile_id']}").status_code == 404
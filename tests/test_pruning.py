@@ -0,0 +1,27 @@
+import duckdb
+import pytest
+
+
+# 4 fichiers aux plages d'id disjointes (0-99, 100-199, ...)
+@pytest.fixture(scope="module")
+def glob(tmp_path_factory):
+    root = tmp_path_factory.mktemp("pruning")
+    for i in range(4):
+        duckdb.sql(f"COPY (SELECT range AS id, 'x' AS s FROM range({i * 100}, {(i + 1) * 100})) TO '{root}/part{i}.parquet' (FORMAT parquet)")
+    return f"{root}/*.parquet"
+
+
+@pytest.mark.parametrize("where, files_scanned", [
+    ("id = 150", 1),
+    ("id BETWEEN 150 AND 250", 2),
+    ("id IN (5, 305)", 2),
+    ("id > 1000", 0),
+    # Prédicat non traduisible (cast) : aucun row group écarté
+    ("id::varchar = '5'", 4),
+])
+def test_row_groups_kept_by_the_where_clause(client, glob, where, files_scanned):
+    r = client.post("/analyze/pruning", json={"sql": f"SELECT * FROM read_parquet('{glob}') WHERE {where}"})
+    assert r.status_code == 200, r.text
+    scan = r.json()["scans"][0]
+    assert scan["files"] == {"total": 4, "scanned": files_scanned}
+    assert scan["rows"]["scanned"] == files_scanned * 100
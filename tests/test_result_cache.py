@@ -0,0 +1,76 @@
+import os
+import time
+import duckdb
+import pytest
+from result_cache import ResultCache, cache_plan, source_fingerprint
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    for i in range(2):
+        duckdb.sql(f"COPY (SELECT range AS id FROM range({i * 10}, {(i + 1) * 10})) TO '{tmp_path}/part{i}.parquet' (FORMAT parquet)")
+    return tmp_path
+
+
+# Même clé pour les variantes de casse / espaces / commentaires, différente dès que les littéraux ou réglages changent
+def test_cache_key_is_normalized():
+    key, sources = cache_plan("SELECT id FROM read_parquet('/d/*.parquet') WHERE id = 1", None, 50)
+    assert sources == ["/d/*.parquet"]
+    assert cache_plan("select  id  from READ_PARQUET('/d/*.parquet') -- c\n where id = 1", None, 50)[0] == key
+    assert cache_plan("SELECT id FROM read_parquet('/d/*.parquet') WHERE id = 2", None, 50)[0] != key
+    assert cache_plan("SELECT id FROM read_parquet('/d/*.parquet') WHERE id = 1", 4, 50)[0] != key
+    assert cache_plan("SELECT id FROM read_parquet('/d/*.parquet') WHERE id = 1", None, 10)[0] != key
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT random() FROM read_parquet('/d/*.parquet')",
+    "SELECT now(), id FROM read_parquet('/d/*.parquet')",
+    "SELECT * FROM some_table",
+    "CREATE TABLE t AS SELECT 1",
+])
+def test_uncacheable_queries(query):
+    assert cache_plan(query, None, 50) is None
+
+
+def cached(dataset, validate_seconds=0):
+    cache = ResultCache(validate_seconds=validate_seconds)
+    con = duckdb.connect()
+    sources = [f"{dataset}/*.parquet"]
+    cache.put("k", source_fingerprint(con, sources), {"rows": [[20]]})
+    return cache, con, sources
+
+
+def test_added_file_invalidates(dataset):
+    cache, con, sources = cached(dataset)
+    assert cache.get(con, "k", sources) == {"rows": [[20]]}
+    duckdb.sql(f"COPY (SELECT 1 AS id) TO '{dataset}/part2.parquet' (FORMAT parquet)")
+    assert cache.get(con, "k", sources) is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.get(con, "k", sources) is None
+
+
+def test_rewritten_file_invalidates(dataset):
+    cache, con, sources = cached(dataset)
+    path = f"{dataset}/part0.parquet"
+    duckdb.sql(f"COPY (SELECT range AS id FROM range(11)) TO '{path}' (FORMAT parquet)")
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert cache.get(con, "k", sources) is None
+
+
+# Entre deux revalidations, l'entrée est servie sans relister les sources
+def test_validation_interval(dataset):
+    cache, con, sources = cached(dataset, validate_seconds=60)
+    os.remove(f"{dataset}/part1.parquet")
+    assert cache.get(con, "k", sources) == {"rows": [[20]]}
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=40)
+    cache.put("a", (), {"rows": [[1]]})
+    cache.put("b", (), {"rows": [[2]]})
+    cache.put("c", (), {"rows": [[3]]})
+    stats = cache.stats()
+    assert stats["bytes"] <= 40 and stats["evictions"] >= 1
+    assert cache.get(None, "c", []) == {"rows": [[3]]}
+    assert cache.get(None, "a", []) is None
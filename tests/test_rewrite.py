@@ -0,0 +1,130 @@
+import os
+import duckdb
+import pytest
+import rewrite
+from conftest import wait_for_job
+from models.models import CompactionRequest, RepartitionRequest
+from rewrite import compact, repartition, RewriteConflict, RewriteError
+
+
+# Petits fichiers sur deux partitions hive + un fichier annexe à conserver
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / "events"
+    con = duckdb.connect()
+    for day in ("2024-01-01", "2024-01-02"):
+        os.makedirs(root / f"day={day}")
+        for i in range(3):
+            con.execute(f"""
+                COPY (SELECT range AS id, 'zip' || (range % 4) AS zip, range * 0.5 AS amount
+                      FROM range({i * 100}, {(i + 1) * 100}))
+                TO '{root}/day={day}/part{i}.parquet' (FORMAT parquet)
+            """)
+    (root / "_SUCCESS").write_text("")
+    return root
+
+
+def content(path):
+    return duckdb.sql(f"SELECT id, zip, amount FROM read_parquet('{path}/**/*.parquet') ORDER BY ALL").fetchall()
+
+
+def parquet_files(root):
+    return sorted(os.path.relpath(os.path.join(d, n), root) for d, _, names in os.walk(root) for n in names if n.endswith(".parquet"))
+
+
+def test_compaction_in_place_swaps_the_directory(dataset):
+    before = content(dataset)
+    report = compact(duckdb.connect(), None, CompactionRequest(s3_path=f"{dataset}/**/*.parquet"))
+
+    assert report["verified"] == "checksum"
+    assert report["swap"] == {"method": "directory_rename", "replaced_files": 6}
+    assert (report["before"]["files"], report["after"]["files"]) == (6, 2)
+    assert [os.path.dirname(p) for p in parquet_files(dataset)] == ["day=2024-01-01", "day=2024-01-02"]
+    assert (dataset / "_SUCCESS").exists()
+    assert content(dataset) == before
+    # Ni staging ni sauvegarde laissés à côté du dataset
+    assert os.listdir(dataset.parent) == ["events"]
+
+
+def test_repartition_to_output_path(dataset, tmp_path):
+    out = tmp_path / "by_zip"
+    report = repartition(duckdb.connect(), None, RepartitionRequest(s3_path=f"{dataset}/**/*.parquet", output_path=str(out), partition_by=["zip"]))
+
+    assert report["partitions"] == 4
+    assert report["swap"] is None
+    assert sorted(os.listdir(out)) == [f"zip=zip{i}" for i in range(4)]
+    assert content(out) == content(dataset)
+
+
+def test_output_path_must_be_empty(dataset, tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / "notes.txt").write_text("keep me")
+    with pytest.raises(RewriteError, match="not empty"):
+        compact(duckdb.connect(), None, CompactionRequest(s3_path=f"{dataset}/**/*.parquet", output_path=str(out)))
+    assert os.listdir(out) == ["notes.txt"]
+
+
+# Échec après écriture : seuls les fichiers de la réécriture sont retirés, output_path et ce qui y est arrivé restent
+def test_failed_rewrite_keeps_the_output_directory(dataset, tmp_path, monkeypatch):
+    out = tmp_path / "out"
+    write_files = rewrite.write_files
+
+    def write_then_fail(con, paths, target_dir, spec, prefix):
+        write_files(con, paths, target_dir, spec, prefix)
+        (out / "other.txt").write_text("written by someone else")
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(rewrite, "write_files", write_then_fail)
+    with pytest.raises(RuntimeError, match="disk full"):
+        compact(duckdb.connect(), None, CompactionRequest(s3_path=f"{dataset}/**/*.parquet", output_path=str(out)))
+    assert os.listdir(out) == ["other.txt"]
+
+
+# Un fichier ajouté pendant l'écriture : le remplacement est refusé, l'original et le staging restent intacts
+def test_compaction_detects_concurrent_changes(dataset, monkeypatch):
+    before = parquet_files(dataset)
+    write_files = rewrite.write_files
+
+    def write_and_add(con, paths, target_dir, spec, prefix):
+        write_files(con, paths, target_dir, spec, prefix)
+        con.execute(f"COPY (SELECT 1 AS id, 'zip0' AS zip, 0.5 AS amount) TO '{dataset}/day=2024-01-01/late.parquet' (FORMAT parquet)")
+
+    monkeypatch.setattr(rewrite, "write_files", write_and_add)
+    with pytest.raises(RewriteConflict):
+        compact(duckdb.connect(), None, CompactionRequest(s3_path=f"{dataset}/**/*.parquet"))
+
+    assert parquet_files(dataset) == sorted(before + ["day=2024-01-01/late.parquet"])
+    assert os.listdir(dataset.parent) == ["events"]
+
+
+# Une réécriture qui altère une valeur (même nombre de lignes) est rejetée par le checksum
+def test_compaction_checksum_rejects_altered_data(dataset, monkeypatch):
+    before = content(dataset)
+
+    def write_altered(con, paths, target_dir, spec, prefix):
+        rewrite.make_parent_dirs(target_dir)
+        con.execute(f"""
+            COPY (SELECT id, zip, CASE WHEN id = 42 THEN -1 ELSE amount END AS amount FROM {rewrite.read_source(paths)})
+            TO '{target_dir}' (FORMAT parquet, FILE_SIZE_BYTES 1000000000, FILENAME_PATTERN '{prefix}_{{i}}', OVERWRITE_OR_IGNORE)
+        """)
+
+    monkeypatch.setattr(rewrite, "write_files", write_altered)
+    with pytest.raises(RewriteError, match="checksums differ"):
+        compact(duckdb.connect(), None, CompactionRequest(s3_path=f"{dataset}/**/*.parquet"))
+
+    assert content(dataset) == before
+    assert os.listdir(dataset.parent) == ["events"]
+
+
+def test_partial_glob_needs_an_output_path(dataset):
+    with pytest.raises(RewriteError, match="pass an output_path"):
+        compact(duckdb.connect(), None, CompactionRequest(s3_path=f"{dataset}/*/part0.parquet"))
+
+
+def test_compaction_job(client, dataset):
+    r = client.post("/compact_parquet", json={"s3_path": f"{dataset}/**/*.parquet"})
+    assert r.status_code == 202
+    job = wait_for_job(client, r.json()["job_id"])
+    assert job["status"] == "succeeded", job
+    assert len(parquet_files(dataset)) == 2
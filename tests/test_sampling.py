@@ -0,0 +1,58 @@
+import random
+import duckdb
+import pytest
+from sampling import estimate_distinct
+
+
+# 4 fichiers de 10 row groups chacun
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    root = tmp_path_factory.mktemp("sampling")
+    con = duckdb.connect()
+    for i in range(4):
+        con.execute(f"""
+            COPY (SELECT range AS id, range % 7 AS b FROM range({i * 20000}, {(i + 1) * 20000}))
+            TO '{root}/part{i}.parquet' (FORMAT parquet, ROW_GROUP_SIZE 2048)
+        """)
+    return f"{root}/*.parquet"
+
+
+@pytest.mark.parametrize("spec", [
+    {"method": "percent", "value": 5, "seed": 1},
+    {"method": "rows", "value": 500, "seed": 1},
+    {"method": "row_groups", "value": 1, "seed": 1},
+])
+def test_sample_reads_a_subset_of_row_groups(client, dataset, spec):
+    r = client.post("/partition_value_counts", json={"s3_path": dataset, "column": "b", "sample": spec})
+    assert r.status_code == 200, r.text
+    sample = r.json()["sample"]
+    assert sample["total_rows"] == 80000
+    assert 0 < sample["sampled_rows"] < 80000
+    # Au plus 2 row groups tirés : au plus 2 fichiers sur 4 lus
+    assert sample["fraction_bytes_read"] < 0.6
+
+
+def test_gee_estimate_and_bounds():
+    # sqrt(N/n) = 10 : 10 * 50 singletons + 50 valeurs répétées
+    est, (low, high) = estimate_distinct(d=100, f1=50, n=1_000, N=100_000)
+    assert est == 550
+    assert (low, high) == (100, 5500)
+
+
+def test_gee_is_exact_on_the_whole_dataset():
+    assert estimate_distinct(d=42, f1=7, n=1_000, N=1_000) == (42, (42, 42))
+
+
+# Échantillon uniforme d'une population connue : le vrai nombre de valeurs distinctes est dans les bornes
+@pytest.mark.parametrize("distinct", [50, 5_000, 50_000])
+def test_gee_bounds_cover_the_true_distinct_count(distinct):
+    rng = random.Random(7)
+    population = [i % distinct for i in range(100_000)]
+    sample = rng.sample(population, 5_000)
+    counts = {}
+    for v in sample:
+        counts[v] = counts.get(v, 0) + 1
+    f1 = sum(1 for c in counts.values() if c == 1)
+    est, (low, high) = estimate_distinct(len(counts), f1, len(sample), len(population))
+    assert low <= distinct <= high
+    assert low <= est <= high
@@ -0,0 +1,57 @@
+import duckdb
+import pytest
+from sketches import SketchStore, HLL_M, _hll_estimate, _merge_registers
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SketchStore(path=str(tmp_path / "sketches.db"), top_k=8)
+
+
+# 4 fichiers ; v : 20 000 valeurs distinctes, chaque valeur présente dans deux fichiers ; k : 3 valeurs
+@pytest.fixture
+def dataset(tmp_path):
+    con = duckdb.connect()
+    for i in range(4):
+        con.execute(f"""
+            COPY (SELECT (range + {i * 5000}) % 20000 AS v, range % 3 AS k FROM range(10000))
+            TO '{tmp_path}/part{i}.parquet' (FORMAT parquet)
+        """)
+    return f"{tmp_path}/*.parquet"
+
+
+def profile(store, glob, columns):
+    con = duckdb.connect()
+    con.execute(f"CREATE VIEW parquet_meta AS SELECT * FROM parquet_metadata('{glob}')")
+    return store.profile(con, glob, columns)
+
+
+def test_empty_and_merged_registers():
+    assert _hll_estimate(bytes(HLL_M)) == 0
+    a = bytes([1] * 10 + [0] * (HLL_M - 10))
+    b = bytes([0] * 5 + [3] * 10 + [0] * (HLL_M - 15))
+    merged = _merge_registers(a, b)
+    assert merged[:15] == bytes([1] * 5 + [3] * 10)
+    assert merged[15:] == bytes(HLL_M - 15)
+
+
+# Valeurs partagées entre fichiers comptées une fois : estimation à ~1.6% près, dans ses bornes
+def test_merged_hll_estimates_distinct_values(store, dataset):
+    stats = profile(store, dataset, ["v"])["columns"]["v"]
+    low, high = stats["distinct_values_bounds"]
+    assert abs(stats["distinct_values"] - 20000) / 20000 < 0.05
+    assert low <= 20000 <= high
+
+
+# Toutes les valeurs tiennent dans le top-k de chaque fichier : comptes exacts
+def test_low_cardinality_is_exact(store, dataset):
+    stats = profile(store, dataset, ["k"])["columns"]["k"]
+    assert stats["distinct_values"] == 3
+    assert stats["distinct_values_bounds"] == [3, 3]
+
+
+def test_sketches_are_reused(store, dataset):
+    profile(store, dataset, ["v"])
+    assert store.stats()["files_scanned"] == 4
+    profile(store, dataset, ["v"])
+    assert store.stats()["files_reused"] == 4
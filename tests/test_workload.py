@@ -0,0 +1,34 @@
+import json
+from sql_fingerprint import fingerprint_sql
+from workload import WorkloadStore
+
+
+# Littéraux et listes IN ignorés ; chemins parquet et positions GROUP BY / ORDER BY conservés
+def test_fingerprint_ignores_literals():
+    fp, text = fingerprint_sql("SELECT a FROM read_parquet('/d/*.parquet') WHERE b = 3 AND c IN (1, 2, 3) GROUP BY 1")
+    assert fingerprint_sql("select a from READ_PARQUET('/d/*.parquet') where b = 42 and c in (7) group by 1")[0] == fp
+    assert "'/d/*.parquet'" in text and "GROUP BY 1" in text
+    assert fingerprint_sql("SELECT a FROM read_parquet('/e/*.parquet') WHERE b = 3 AND c IN (1) GROUP BY 1")[0] != fp
+    assert fingerprint_sql("SELECT a FROM read_parquet('/d/*.parquet') WHERE b = 3 AND c IN (1) GROUP BY 2")[0] != fp
+
+
+def test_slow_queries_are_aggregated_and_logged(tmp_path):
+    log = tmp_path / "slow.log"
+    store = WorkloadStore(slow_threshold=1.0, slow_log_path=str(log))
+    store.record("SELECT 1", "json", 0.1, 1)
+    store.record("SELECT 2", "json", 2.0, 1, io={"bytes_fetched": 10})
+
+    fp, _ = fingerprint_sql("SELECT 1")
+    agg = store.snapshot()["fingerprints"][fp]
+    assert agg["count"] == 2
+    assert agg["bytes_fetched"] == 10
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(e["fingerprint"], e["query"]) for e in entries] == [(fp, "SELECT 2")]
+
+
+def test_fingerprints_over_the_limit_go_to_other():
+    store = WorkloadStore(max_fingerprints=1, slow_log_path=None)
+    store.record("SELECT 1 FROM t", "json", 0.1, 1)
+    store.record("SELECT x FROM u", "json", 0.1, 1)
+    assert store.stats()["dropped"] == 1
+    assert "other" in store.snapshot()["fingerprints"]
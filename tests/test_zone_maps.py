@@ -0,0 +1,72 @@
+import duckdb
+import pytest
+from conftest import configure_s3
+
+# Chaque requête exécutée avec et sans réécriture par les zone maps : mêmes lignes attendues
+QUERIES = [
+    ("SELECT id FROM read_parquet('{g}') WHERE id = 3 ORDER BY id", True),
+    ("SELECT id FROM read_parquet('{g}') WHERE id IN (1, 250) ORDER BY id", True),
+    ("SELECT id FROM read_parquet('{g}') WHERE k > 7 ORDER BY id", True),
+    ("SELECT x.id FROM read_parquet('{g}') x WHERE x.id BETWEEN 120 AND 130 ORDER BY id", True),
+    ("SELECT id FROM '{g}' WHERE s = 'b' ORDER BY id", True),
+    # k et id permutés par l'alias : les zone maps de k ne décrivent pas la colonne appelée k ici
+    ("SELECT id FROM read_parquet('{g}') t(k, id) WHERE k = 3 ORDER BY id", False),
+    ("SELECT id FROM read_parquet('{g}') WHERE id < random() * 0 + 4 ORDER BY id", False),
+    ("SELECT id FROM read_parquet('{g}') WHERE id::varchar = '5' ORDER BY id", False),
+    ("SELECT id FROM read_parquet('{g}') WHERE id = 3 OR s = 'x' ORDER BY id", True),
+    ("SELECT a.id FROM read_parquet('{g}') a LEFT JOIN read_parquet('{g}') b ON a.id = b.k WHERE b.id = 3 ORDER BY 1", False),
+]
+
+
+# 4 fichiers aux plages d'id disjointes ; k = id / 100 (0..3) et s constant par fichier
+@pytest.fixture(scope="module")
+def indexed_glob(client, tmp_path_factory):
+    root = tmp_path_factory.mktemp("zm")
+    con = duckdb.connect()
+    for i in range(4):
+        con.execute(f"""
+            COPY (SELECT range AS id, range // 100 + {i} * 3 AS k, chr(97 + {i}) AS s FROM range({i * 100}, {(i + 1) * 100}))
+            TO '{root}/part{i}.parquet' (FORMAT parquet)
+        """)
+    glob = f"{root}/*.parquet"
+    r = client.post("/zone_maps", json={"s3_path": glob})
+    assert r.status_code == 200, r.text
+    return glob
+
+
+def run(client, query, use_zone_maps):
+    r = client.post("/query", json={"query": query, "max_rows": 1000, "use_zone_maps": use_zone_maps})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+@pytest.mark.parametrize("query,rewritten", QUERIES)
+def test_rewrite_keeps_results(client, indexed_glob, query, rewritten):
+    sql = query.format(g=indexed_glob)
+    original = run(client, sql, False)
+    pruned = run(client, sql, True)
+    assert pruned["rows"] == original["rows"]
+    assert original["zone_maps"] is None
+    assert bool(pruned["zone_maps"] and pruned["zone_maps"]["rewritten"]) == rewritten
+
+
+def test_alias_list_is_reported_as_skipped(client, indexed_glob):
+    r = client.post("/zone_maps/rewrite", json={"sql": f"SELECT id FROM read_parquet('{indexed_glob}') t(k, id) WHERE k = 3"})
+    assert r.status_code == 200, r.text
+    assert [s.get("skipped") for s in r.json()["zone_maps"]["scans"]] == ["column alias list"]
+
+
+# Fichier ajouté sur S3 après l'indexation, listing du catalogue encore valide : il est indexé et lu
+def test_new_s3_file_is_kept(client, s3):
+    s3_client, settings = s3
+    configure_s3(client.app.state.con, settings)
+    prefix = "s3://test-bucket/zone_maps/new_file"
+    con = duckdb.connect()
+    configure_s3(con, settings)
+    con.execute(f"COPY (SELECT range AS id FROM range(0, 100)) TO '{prefix}/part0.parquet' (FORMAT parquet)")
+    glob = f"{prefix}/*.parquet"
+    assert client.post("/zone_maps", json={"s3_path": glob}).status_code == 200
+
+    con.execute(f"COPY (SELECT range AS id FROM range(100, 200)) TO '{prefix}/part1.parquet' (FORMAT parquet)")
+    rows = run(client, f"SELECT id FROM read_parquet('{glob}') WHERE id = 150", True)["rows"]
+    assert rows == [[150]]